@@ -0,0 +1,201 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+ANIMATION_SPEED = 8.0
+INITIAL_CAPACITY = 64
+
+# Row layout of Animator.fields.
+START_X, START_Y, TARGET_X, TARGET_Y, POS_X, POS_Y, PROGRESS, ARC = range(8)
+HOVER, TARGET_HOVER, SCALE, TARGET_SCALE, ROTATION, TARGET_ROTATION, SHAKE_TIMER, SHAKE_OFFSET = range(8, 16)
+NUM_FIELDS = 16
+
+# Easing rates and snap distances for hover offset, scale and rotation, as in CardSprite.update.
+EASE_SPEEDS = np.array([[15.0], [10.0], [10.0]])
+EASE_EPSILONS = np.array([[0.5], [0.01], [0.1]])
+
+class Animator:
+    """Animates only the cards that are changing, in one vectorized pass per frame.
+
+    Each field (position, target, progress, hover, scale, ...) is a contiguous
+    float64 row of self.fields, and every active card owns one column. Columns are
+    kept packed at the front; when a card settles its column is filled from the
+    last one. CardSprite.update does the same work per card and remains the reference.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.fields = np.zeros((NUM_FIELDS, capacity))
+        self.cards = []
+
+        self.last_count = 0
+        self.frames = 0
+        self.total_animated = 0
+        self.max_animated = 0
+
+    def __len__(self):
+        return len(self.cards)
+
+    def add(self, card):
+        slot = card.animation_slot
+        if slot < 0:
+            slot = len(self.cards)
+            if slot == self.fields.shape[1]:
+                self.fields = np.concatenate([self.fields, np.zeros_like(self.fields)], axis=1)
+            self.cards.append(card)
+            card.animation_slot = slot
+
+        self.fields[:, slot] = (card.start_pos[0], card.start_pos[1], card.target_pos[0], card.target_pos[1],
+                                card.pos[0], card.pos[1], card.animation_progress, card.arc_height,
+                                card.hover_offset, card.target_hover_offset, card.scale, card.target_scale,
+                                card.rotation, card.target_rotation, card.shake_timer, card.shake_offset)
+
+    def remove(self, card):
+        slot = card.animation_slot
+        if slot < 0:
+            return
+        last = len(self.cards) - 1
+        if slot != last:
+            moved = self.cards[last]
+            self.cards[slot] = moved
+            moved.animation_slot = slot
+            self.fields[:, slot] = self.fields[:, last]
+        self.cards.pop()
+        card.animation_slot = -1
+
+    def clear(self):
+        for card in self.cards:
+            card.animation_slot = -1
+        self.cards = []
+
+    def update(self, dt, motion_dt=None):
+        count = len(self.cards)
+        self.last_count = count
+        self.frames += 1
+        self.total_animated += count
+        self.max_animated = max(self.max_animated, count)
+        if not count:
+            return
+
+        f = self.fields[:, :count]
+        start, target, pos = f[START_X:START_Y + 1], f[TARGET_X:TARGET_Y + 1], f[POS_X:POS_Y + 1]
+
+        # Cards at rest have progress 1.0, so they stay put without a separate mask.
+        progress = np.minimum(1.0, f[PROGRESS] + ANIMATION_SPEED * (dt if motion_dt is None else motion_dt))
+        arrived = progress >= 1.0
+        remaining = 1 - progress
+        eased = start + (target - start) * (1 - remaining * remaining * remaining)
+        eased[1] -= f[ARC] * np.sin(progress * np.pi)
+        pos[:] = np.where(arrived, target, eased)
+        f[PROGRESS] = progress
+        f[ARC] *= ~arrived
+
+        # Hover offset, scale and rotation ease towards their targets together.
+        values, targets = f[HOVER:ROTATION + 1:2], f[TARGET_HOVER:TARGET_ROTATION + 1:2]
+        diff = targets - values
+        values[:] = np.where(np.abs(diff) > EASE_EPSILONS, values + diff * (EASE_SPEEDS * dt), targets)
+
+        shaking = f[SHAKE_TIMER] > 0
+        if shaking.any() or f[SHAKE_OFFSET].any():
+            f[SHAKE_TIMER] -= shaking * dt
+            f[SHAKE_OFFSET] = np.where(shaking, np.sin(f[SHAKE_TIMER] * 50) * 10 * f[SHAKE_TIMER], 0.0)
+            settled = arrived & ~shaking & (f[SHAKE_OFFSET] == 0)
+        else:
+            settled = arrived
+        settled &= (values == targets).all(axis=0)
+
+        topleft = np.empty((2, count), dtype=np.int64)
+        np.add(pos[0], f[SHAKE_OFFSET], out=topleft[0], casting="unsafe")
+        np.subtract(pos[1], f[HOVER], out=topleft[1], casting="unsafe")
+
+        rows = f[POS_X:].T.tolist()
+        for card, row, rect_topleft in zip(self.cards, rows, topleft.T.tolist()):
+            card.pos = row[0:2]
+            card.animation_progress = row[PROGRESS - POS_X]
+            card.is_moving = row[PROGRESS - POS_X] < 1.0
+            card.arc_height = row[ARC - POS_X]
+            card.hover_offset = row[HOVER - POS_X]
+            card.scale = row[SCALE - POS_X]
+            card.rotation = row[ROTATION - POS_X]
+            card.shake_timer = row[SHAKE_TIMER - POS_X]
+            card.shake_offset = row[SHAKE_OFFSET - POS_X]
+            card.rect.topleft = rect_topleft
+
+        for slot in reversed(np.flatnonzero(settled).tolist()):
+            self.remove(self.cards[slot])
+
+    def get_stats(self):
+        return {
+            "frames": self.frames,
+            "average_animated": self.total_animated / self.frames if self.frames else 0.0,
+            "max_animated": self.max_animated,
+        }
+
+def retarget(cards, rng):
+    for card in cards:
+        card.set_target(rng.uniform(0, 1300), rng.uniform(0, 700))
+
+def update_cards(cards, animator, dt):
+    if animator is not None:
+        animator.update(dt)
+    else:
+        for card in cards:
+            card.update(dt)
+
+def run_benchmark(num_deals, seed=None, idle_frames=60):
+    # Imported here because app imports this module for the animator.
+    from app import CardSprite, FPS
+    from rules import CARDS, NUM_PLAYERS
+
+    dt = 1.0 / FPS
+    results = {}
+    traces = {}
+    for mode in ("objects", "arrays"):
+        rng = random.Random(seed)
+        animator = Animator() if mode == "arrays" else None
+        cards = [CardSprite(card, animator) for card in CARDS]
+
+        # "deal" moves all 52 cards at once; "hand" moves one hand of 13 while the
+        # rest of the deck sits still, as when a hand is re-spaced after a play.
+        trace = []
+        result = {}
+        for scenario, moving in (("deal", cards), ("hand", cards[:len(cards) // NUM_PLAYERS])):
+            frames = 0
+            seconds = 0.0
+            for _ in range(num_deals):
+                retarget(moving, rng)
+                while any(card.is_moving for card in moving):
+                    start = time.perf_counter()
+                    update_cards(cards, animator, dt)
+                    seconds += time.perf_counter() - start
+                    frames += 1
+                    trace.append([tuple(card.rect.topleft) for card in cards])
+            result[scenario] = seconds / frames * 1e6 if frames else 0.0
+
+        start = time.perf_counter()
+        for _ in range(idle_frames):
+            update_cards(cards, animator, dt)
+        result["idle"] = (time.perf_counter() - start) / idle_frames * 1e6
+
+        traces[mode] = trace
+        results[mode] = result
+
+    results["identical"] = traces["objects"] == traces["arrays"]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-card and vectorized card animation")
+    parser.add_argument("--deals", type=int, default=200, help="number of 52-card deal animations to run")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the card targets")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.deals, args.seed)
+    print(f"{args.deals} deal and hand animations, card positions identical: {results['identical']}")
+    print("  Microseconds per frame   52 moving   13 moving   idle")
+    for mode, label in (("objects", "CardSprite.update loop"), ("arrays", "NumPy animator")):
+        result = results[mode]
+        print(f"  {label:22s} {result['deal']:10.1f} {result['hand']:11.1f} {result['idle']:6.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,40 @@
+import time
+# Taken before the other imports so --startup-profile can include them.
+IMPORT_START = time.perf_counter()
+
+import argparse
 import pygame
 import random
 import math
 import sys
+import weakref
+from collections import OrderedDict
+
+import bidtable
+import record
+import rules
+from assets import AssetCache, LazyFont, CACHE_DIR, content_hash, font_stamp, unpack_sprite
+from profiler import FrameProfiler, StartupProfile
+from scheduler import Scheduler, INSTANT
+from thinker import AIThinker
+
+try:
+    import animation
+except ImportError:
+    animation = None
+try:
+    # Experimental in pygame 2; only the texture renderer needs it.
+    from pygame._sdl2 import video
+except ImportError:
+    video = None
+from rules import (STATE_DEAL, STATE_BID, STATE_PLAY, STATE_TRICK_END, STATE_ROUND_END,
+                   STATE_GAME_OVER, EVENT_DEAL, EVENT_BIDDING, EVENT_BID, EVENT_BIDS_DONE,
+                   EVENT_PLAY, EVENT_TRICK, EVENT_BAG_OUT)
 
 SCREEN_WIDTH = 1400
 SCREEN_HEIGHT = 800
 FPS = 60
+WINDOW_TITLE = "Spades - Professional Edition"
 
 GREEN_FELT = (34, 139, 34)
 DARK_GREEN = (0, 100, 0)
@@ -25,21 +54,39 @@ CARD_HEIGHT = 130
 CORNER_RADIUS = 8
 
 POPUP_HEIGHT = 20
+CARD_SHADOW = 3
+RAISED_SHADOW = CARD_SHADOW + int(POPUP_HEIGHT * 0.3)
 HOVER_SCALE = 1.08
 ANIMATION_SPEED = 8.0
 
-SUITS = ["Spades", "Hearts", "Diamonds", "Clubs"]
-VALUES = list(range(2, 15))
-VALUE_NAMES = {11: "J", 12: "Q", 13: "K", 14: "A"}
+ATLAS_SCALE_STEPS = 4
+CARD_STATE_NORMAL = 0
+CARD_STATE_PLAYABLE = 1
+CARD_STATE_HOVERED = 2
+
+TEXT_CACHE_SIZE = 256
+# Scaled copies a ScaledCanvas keeps, in bytes, as a multiple of its frame's size.
+CANVAS_COPY_FRAMES = 8
 
 STATE_MENU = "menu"
 STATE_NAME_SELECT = "name_select"
-STATE_DEAL = "dealing"
-STATE_BID = "bidding"
-STATE_PLAY = "playing"
-STATE_TRICK_END = "trick_end"
-STATE_ROUND_END = "round_end"
-STATE_GAME_OVER = "game_over"
+
+STATE_DELAYS = {
+    STATE_DEAL: 1000,
+    STATE_BID: 800,
+    STATE_PLAY: 800,
+    STATE_TRICK_END: 1500,
+    STATE_ROUND_END: 3000,
+}
+# How often the deal is re-checked while cards are still flying to the hands.
+DEAL_POLL_DELAY = 16
+# How often a computer player's turn checks whether its decision has come back from the worker.
+AI_POLL_DELAY = 16
+# Longest the frame loop sleeps with nothing to draw before it looks again.
+IDLE_WAIT_LIMIT = 1000
+# A toast is drawn solid until this long before it goes (draw_message fades alpha from 255).
+MESSAGE_FADE = 510
+SPEED_STEPS = [1.0, 2.0, 4.0, 8.0, INSTANT]
 
 INDIAN_NAMES = ["Arjun", "Rohan", "Aditya", "Vikram", "Rahul", "Karan", "Rajesh", "Amit", 
                 "Priya", "Anjali", "Neha", "Pooja", "Kavya", "Sanya", "Riya"]
@@ -63,15 +110,38 @@ def ease_out_bounce(t):
         t -= 2.625 / 2.75
         return 7.5625 * t * t + 0.984375
 
-class Card:
-    def __init__(self, suit, value):
-        self.suit = suit
-        self.value = value
-        self.display_value = VALUE_NAMES.get(value, str(value))
-        self.color = RED if suit in ["Hearts", "Diamonds"] else BLACK
+class CardSprite:
+    """Where one card is on screen and how it is moving.
+
+    The card itself is a shared rules.Card; a sprite only adds the drawing and
+    animation state, and is reset for the next deal instead of being made again.
+    """
+
+    __slots__ = ("card", "suit", "value", "display_value", "color", "rect", "pos", "target_pos", "is_moving",
+                 "face_up", "hovered", "is_playable", "hover_offset", "target_hover_offset", "scale",
+                 "target_scale", "rotation", "target_rotation", "arc_height", "animation_progress", "start_pos",
+                 "shake_offset", "shake_timer", "draw_order", "animator", "animation_slot")
+
+    def __init__(self, card, animator=None):
+        self.card = card
+        self.suit = card.suit
+        self.value = card.value
+        self.display_value = card.display_value
+        self.color = RED if card.suit in ["Hearts", "Diamonds"] else BLACK
         self.rect = pygame.Rect(0, 0, CARD_WIDTH, CARD_HEIGHT)
         self.pos = [0.0, 0.0]
         self.target_pos = [0.0, 0.0]
+        self.start_pos = [0.0, 0.0]
+
+        self.animator = animator
+        self.animation_slot = -1
+        self.reset()
+
+    def reset(self):
+        self.rect.topleft = (0, 0)
+        self.pos[:] = (0.0, 0.0)
+        self.target_pos[:] = (0.0, 0.0)
+        self.start_pos[:] = (0.0, 0.0)
         self.is_moving = False
         self.face_up = False
         self.hovered = False
@@ -85,16 +155,17 @@ class Card:
         self.target_rotation = 0.0
         self.arc_height = 0.0
         self.animation_progress = 1.0
-        self.start_pos = [0.0, 0.0]
         self.shake_offset = 0.0
         self.shake_timer = 0.0
-
-        self.shadow_offset = 3
         self.draw_order = 0
 
-    def update(self, dt):
+    def wake(self):
+        if self.animator is not None:
+            self.animator.add(self)
+
+    def update(self, dt, motion_dt=None):
         if self.is_moving:
-            speed = ANIMATION_SPEED * dt
+            speed = ANIMATION_SPEED * (dt if motion_dt is None else motion_dt)
             self.animation_progress = min(1.0, self.animation_progress + speed)
 
             t = ease_out_cubic(self.animation_progress)
@@ -141,22 +212,39 @@ class Card:
         final_x = int(self.pos[0] + self.shake_offset)
         self.rect.topleft = (final_x, final_y)
 
+    def is_animating(self):
+        return (self.is_moving or self.shake_timer > 0 or self.shake_offset != 0
+                or self.hover_offset != self.target_hover_offset or self.scale != self.target_scale
+                or self.rotation != self.target_rotation)
+
     def set_target(self, x, y, arc_height=0):
         self.start_pos = list(self.pos)
         self.target_pos = [float(x), float(y)]
         self.is_moving = True
         self.animation_progress = 0.0
         self.arc_height = arc_height
+        self.wake()
 
     def shake(self):
         self.shake_timer = 0.3
+        self.wake()
 
     def set_playable(self, playable):
         self.is_playable = playable
-        if playable:
-            self.target_hover_offset = POPUP_HEIGHT
-        else:
-            self.target_hover_offset = 0
+        target_hover_offset = POPUP_HEIGHT if playable else 0
+        if target_hover_offset != self.target_hover_offset:
+            self.target_hover_offset = target_hover_offset
+            self.wake()
+
+    def set_target_scale(self, scale):
+        if scale != self.target_scale:
+            self.target_scale = scale
+            self.wake()
+
+    def set_target_rotation(self, rotation):
+        if rotation != self.target_rotation:
+            self.target_rotation = rotation
+            self.wake()
 
     def get_hover_rect(self):
         scaled_width = int(CARD_WIDTH * self.scale)
@@ -167,74 +255,69 @@ class Card:
         hover_rect.center = (center_x, center_y)
         return hover_rect
 
-    def draw(self, surface, font_large, font_small):
-        scaled_width = int(CARD_WIDTH * self.scale)
-        scaled_height = int(CARD_HEIGHT * self.scale)
-        center_x = self.rect.centerx
-        center_y = self.rect.centery
+    def get_face_state(self):
+        if self.hovered and self.is_playable:
+            return CARD_STATE_HOVERED
+        elif self.is_playable:
+            return CARD_STATE_PLAYABLE
+        return CARD_STATE_NORMAL
 
-        scaled_rect = pygame.Rect(0, 0, scaled_width, scaled_height)
-        scaled_rect.center = (center_x, center_y)
+    def get_shadow_offset(self):
+        return CardAtlas.get_shadow_offset(self.get_face_state() if self.face_up else None)
 
-        shadow_offset = self.shadow_offset + int(self.hover_offset * 0.3)
-        shadow_rect = scaled_rect.copy()
-        shadow_rect.x += shadow_offset
-        shadow_rect.y += shadow_offset
+    def get_sprite_rect(self, atlas):
+        width, height = atlas.get_card_size(self.scale)
+        shadow_offset = self.get_shadow_offset()
+        return pygame.Rect(self.rect.centerx - width // 2, self.rect.centery - height // 2,
+                           width + shadow_offset, height + shadow_offset)
 
-        shadow_surf = pygame.Surface((scaled_width + 10, scaled_height + 10), pygame.SRCALPHA)
-        pygame.draw.rect(shadow_surf, (0, 0, 0, 80), 
-                        pygame.Rect(5, 5, scaled_width, scaled_height), 
-                        border_radius=CORNER_RADIUS)
-        surface.blit(shadow_surf, (shadow_rect.x - 5, shadow_rect.y - 5))
-
-        if not self.face_up:
-            pygame.draw.rect(surface, BLUE, scaled_rect, border_radius=CORNER_RADIUS)
-            pygame.draw.rect(surface, GOLD, scaled_rect, 3, border_radius=CORNER_RADIUS)
-
-            for i in range(3):
-                for j in range(4):
-                    x = scaled_rect.x + 15 + i * 25
-                    y = scaled_rect.y + 15 + j * 28
-                    pygame.draw.circle(surface, GOLD, (x, y), 6, 2)
-                    pygame.draw.circle(surface, WHITE, (x, y), 3, 1)
-        else:
-            if self.hovered and self.is_playable:
-                bg_color = HIGHLIGHT_GREEN
-                border_color = GOLD
-                border_width = 4
-            elif self.is_playable:
-                bg_color = (240, 255, 240)
-                border_color = HIGHLIGHT_GREEN
-                border_width = 3
-            else:
-                bg_color = WHITE
-                border_color = BLACK
-                border_width = 2
+    def draw(self, surface, atlas):
+        surface.blit(atlas.get_sprite(self), self.get_sprite_rect(atlas))
 
-            pygame.draw.rect(surface, bg_color, scaled_rect, border_radius=CORNER_RADIUS)
-            pygame.draw.rect(surface, border_color, scaled_rect, border_width, border_radius=CORNER_RADIUS)
+    def render_back(self, surface, rect):
+        pygame.draw.rect(surface, BLUE, rect, border_radius=CORNER_RADIUS)
+        pygame.draw.rect(surface, GOLD, rect, 3, border_radius=CORNER_RADIUS)
+
+        for i in range(3):
+            for j in range(4):
+                x = rect.x + 15 + i * 25
+                y = rect.y + 15 + j * 28
+                pygame.draw.circle(surface, GOLD, (x, y), 6, 2)
+                pygame.draw.circle(surface, WHITE, (x, y), 3, 1)
+
+    def render_face(self, surface, rect, state, scale_factor, font_large):
+        if state == CARD_STATE_HOVERED:
+            bg_color = HIGHLIGHT_GREEN
+            border_color = GOLD
+            border_width = 4
+        elif state == CARD_STATE_PLAYABLE:
+            bg_color = (240, 255, 240)
+            border_color = HIGHLIGHT_GREEN
+            border_width = 3
+        else:
+            bg_color = WHITE
+            border_color = BLACK
+            border_width = 2
 
-            scale_factor = self.scale
+        pygame.draw.rect(surface, bg_color, rect, border_radius=CORNER_RADIUS)
+        pygame.draw.rect(surface, border_color, rect, border_width, border_radius=CORNER_RADIUS)
 
-            label = font_large.render(self.display_value, True, self.color)
-            label = pygame.transform.scale(label, 
-                (int(label.get_width() * scale_factor), int(label.get_height() * scale_factor)))
-            surface.blit(label, (scaled_rect.x + 8, scaled_rect.y + 5))
+        label = font_large.render(self.display_value, True, self.color)
+        label = pygame.transform.scale(label,
+            (int(label.get_width() * scale_factor), int(label.get_height() * scale_factor)))
+        surface.blit(label, (rect.x + 8, rect.y + 5))
 
-            self.draw_suit(surface, scaled_rect.x + 20, scaled_rect.y + 45, int(12 * scale_factor))
+        self.draw_suit(surface, rect.x + 20, rect.y + 45, int(12 * scale_factor))
 
-            self.draw_suit(surface, scaled_rect.centerx, scaled_rect.centery, int(20 * scale_factor))
+        self.draw_suit(surface, rect.centerx, rect.centery, int(20 * scale_factor))
 
-            bottom_label = font_large.render(self.display_value, True, self.color)
-            bottom_label = pygame.transform.scale(bottom_label,
-                (int(bottom_label.get_width() * scale_factor), int(bottom_label.get_height() * scale_factor)))
-            bottom_label = pygame.transform.rotate(bottom_label, 180)
-            surface.blit(bottom_label, 
-                        (scaled_rect.right - bottom_label.get_width() - 8, 
-                         scaled_rect.bottom - bottom_label.get_height() - 5))
+        bottom_label = pygame.transform.rotate(label, 180)
+        surface.blit(bottom_label,
+                    (rect.right - bottom_label.get_width() - 8,
+                     rect.bottom - bottom_label.get_height() - 5))
 
-            self.draw_suit_rotated(surface, scaled_rect.right - 20, scaled_rect.bottom - 45, 
-                                  int(12 * scale_factor))
+        self.draw_suit_rotated(surface, rect.right - 20, rect.bottom - 45,
+                              int(12 * scale_factor))
 
     def draw_suit(self, surface, x, y, size):
         if self.suit == "Hearts":
@@ -308,116 +391,688 @@ class Card:
         ]
         pygame.draw.polygon(surface, color, stem_points)
 
-class Deck:
-    def __init__(self):
-        self.cards = [Card(suit, value) for suit in SUITS for value in VALUES]
-
-    def shuffle(self):
-        random.shuffle(self.cards)
-
-    def deal(self, num_players):
-        hands = [[] for _ in range(num_players)]
-        for i, card in enumerate(self.cards):
-            hands[i % num_players].append(card)
-        return hands
-
-class Player:
-    def __init__(self, name, position, is_human=False):
-        self.name = name
-        self.position = position
-        self.is_human = is_human
-        self.hand = []
-        self.bid = None
-        self.tricks_won = 0
-        self.score = 0
-        self.bags = 0
-        self.team = 0 if position in [0, 2] else 1
-
-    def sort_hand(self):
-        suit_order = {"Spades": 0, "Hearts": 1, "Clubs": 2, "Diamonds": 3}
-        self.hand.sort(key=lambda c: (suit_order[c.suit], c.value))
-
-    def get_valid_moves(self, lead_suit, spades_broken):
-        if lead_suit is None:
-            if spades_broken:
-                return self.hand[:]
+class SpritePool:
+    """One sprite for each of the 52 cards, made once and looked up by card."""
+
+    def __init__(self, animator=None):
+        self.animator = animator
+        self.sprites = [CardSprite(card, animator) for card in rules.CARDS]
+        self.resets = 0
+
+    def __getitem__(self, card):
+        return self.sprites[card.index]
+
+    def __iter__(self):
+        return iter(self.sprites)
+
+    def reset(self):
+        # A new deal starts every card face down in the corner, as a new deck would.
+        if self.animator is not None:
+            self.animator.clear()
+        for sprite in self.sprites:
+            sprite.reset()
+        self.resets += 1
+
+class CardAtlas:
+    def __init__(self, font_card, scale_steps=ATLAS_SCALE_STEPS):
+        self.font_card = font_card
+        self.scale_steps = scale_steps
+        self.sprites = {}
+        # Sprites loaded from the cache, made into surfaces as they are first drawn.
+        self.packed = {}
+        self.hits = 0
+        self.misses = 0
+        self.unpacked = 0
+
+    def build(self, cards):
+        # Every step a playable card passes through as it eases in and out of HOVER_SCALE, so a
+        # hover never renders on the frame loop. The rest (a played card shrinking back) render on
+        # first use; keys are card, state and step, so the atlas holds 785 sprites at most.
+        for card in cards:
+            self.render_sprite((card.suit, card.value, CARD_STATE_NORMAL, 0), card)
+            for step in range(self.scale_steps + 1):
+                self.render_sprite((card.suit, card.value, CARD_STATE_PLAYABLE, step), card)
+                self.render_sprite((card.suit, card.value, CARD_STATE_HOVERED, step), card)
+        self.render_sprite((None, None, None, 0), cards[0])
+
+    @staticmethod
+    def get_shadow_offset(state):
+        # Raised (playable) cards cast a longer shadow. It goes with the face state rather than
+        # easing with the hover offset, so no sprite is needed per hover height.
+        return RAISED_SHADOW if state in (CARD_STATE_PLAYABLE, CARD_STATE_HOVERED) else CARD_SHADOW
+
+    def quantize_scale(self, scale):
+        step = round((scale - 1.0) / (HOVER_SCALE - 1.0) * self.scale_steps)
+        return max(0, min(self.scale_steps, step))
+
+    def step_to_scale(self, step):
+        return 1.0 + (HOVER_SCALE - 1.0) * step / self.scale_steps
+
+    def get_card_size(self, scale):
+        step_scale = self.step_to_scale(self.quantize_scale(scale))
+        return int(CARD_WIDTH * step_scale), int(CARD_HEIGHT * step_scale)
+
+    def get_sprite_key(self, card):
+        step = self.quantize_scale(card.scale)
+        if card.face_up:
+            return (card.suit, card.value, card.get_face_state(), step)
+        return (None, None, None, step)
+
+    def get_sprite(self, card):
+        key = self.get_sprite_key(card)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            return sprite
+        packed = self.packed.pop(key, None)
+        sprite = unpack_sprite(packed) if packed is not None else None
+        if sprite is not None:
+            self.unpacked += 1
+            self.sprites[key] = sprite
+        else:
+            self.misses += 1
+            sprite = self.render_sprite(key, card)
+        return sprite
+
+    def render_sprite(self, key, card):
+        suit, value, state, step = key
+        shadow_offset = self.get_shadow_offset(state)
+        scale_factor = self.step_to_scale(step)
+        width = int(CARD_WIDTH * scale_factor)
+        height = int(CARD_HEIGHT * scale_factor)
+
+        sprite = pygame.Surface((width + shadow_offset, height + shadow_offset), pygame.SRCALPHA)
+        pygame.draw.rect(sprite, (0, 0, 0, 80),
+                        pygame.Rect(shadow_offset, shadow_offset, width, height),
+                        border_radius=CORNER_RADIUS)
+
+        self.draw_card(sprite, pygame.Rect(0, 0, width, height), card, state, scale_factor)
+        self.sprites[key] = sprite
+        return sprite
+
+    def render_faces(self, cards):
+        # Every card alone, without a shadow, for renderers that scale cards and draw the shadow
+        # themselves: hovered faces at HOVER_SCALE, which they are drawn at, and the rest at rest size.
+        faces = {}
+        for card in cards:
+            for state in (CARD_STATE_NORMAL, CARD_STATE_PLAYABLE, CARD_STATE_HOVERED):
+                step = self.scale_steps if state == CARD_STATE_HOVERED else 0
+                faces[card.suit, card.value, state, step] = self.render_card(card, state, step)
+        faces[None, None, None, 0] = self.render_card(cards[0], None, 0)
+        return faces
+
+    def render_card(self, card, state, step):
+        scale_factor = self.step_to_scale(step)
+        surface = pygame.Surface((int(CARD_WIDTH * scale_factor), int(CARD_HEIGHT * scale_factor)),
+                                 pygame.SRCALPHA)
+        self.draw_card(surface, surface.get_rect(), card, state, scale_factor)
+        return surface
+
+    def draw_card(self, surface, rect, card, state, scale_factor):
+        if state is None:
+            card.render_back(surface, rect)
+        else:
+            card.render_face(surface, rect, state, scale_factor, self.font_card)
+
+    def get_sheet(self):
+        # Everything rendered or loaded, for the cache; packed and drawn sprites never share a key.
+        return {**self.packed, **self.sprites}
+
+    def get_memory_bytes(self):
+        return (sum(s.get_pitch() * s.get_height() for s in self.sprites.values())
+                + sum(len(packed.data) for packed in self.packed.values()))
+
+    @staticmethod
+    def pack_key(key):
+        suit, value, state, step = key
+        return (None if suit is None else rules.SUITS.index(suit), value, state, step)
+
+    @staticmethod
+    def unpack_key(fields):
+        suit, value, state, step = fields
+        return (None if suit is None else rules.SUITS[suit], value, state, step)
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "sprites": len(self.sprites) + len(self.packed),
+            "unpacked": self.unpacked,
+            "memory_bytes": self.get_memory_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class TextCache:
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        text_surf = self.entries.get(key)
+        if text_surf is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return text_surf
+
+        self.misses += 1
+        text_surf = font.render(text, True, color)
+        self.entries[key] = text_surf
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return text_surf
+
+class Widget:
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+        self.inputs = None
+        self.surface = None
+        self.rebuilds = 0
+
+    def get_surface(self, *inputs):
+        if self.surface is None or inputs != self.inputs:
+            self.inputs = inputs
+            self.surface = self.build(*inputs)
+            self.rebuilds += 1
+        return self.surface
+
+    def build(self, *inputs):
+        raise NotImplementedError
+
+    def draw(self, surface, *inputs):
+        surface.blit(self.get_surface(*inputs), self.rect)
+
+class Button(Widget):
+    def __init__(self, rect, font, text_cache, border_radius=10, border_width=3):
+        super().__init__(rect)
+        self.font = font
+        self.text_cache = text_cache
+        self.border_radius = border_radius
+        self.border_width = border_width
+
+    def get_colors(self, is_hover):
+        return (WHITE, GOLD) if is_hover else (GOLD, WHITE)
+
+    def build(self, text, is_hover):
+        button_surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        local_rect = button_surf.get_rect()
+        fill_color, border_color = self.get_colors(is_hover)
+        pygame.draw.rect(button_surf, fill_color, local_rect, border_radius=self.border_radius)
+        pygame.draw.rect(button_surf, border_color, local_rect, self.border_width,
+                         border_radius=self.border_radius)
+
+        text_surf = self.text_cache.render(self.font, text, BLACK)
+        button_surf.blit(text_surf, (local_rect.centerx - text_surf.get_width()//2,
+                                     local_rect.centery - text_surf.get_height()//2))
+        return button_surf
+
+class NameButton(Button):
+    def __init__(self, rect, font, caption_font, caption, text_cache):
+        super().__init__(rect, font, text_cache)
+        self.caption_font = caption_font
+        self.caption = caption
+
+    def get_colors(self, is_hover):
+        return (HIGHLIGHT_GREEN if is_hover else GOLD), WHITE
+
+    def build(self, text, is_hover):
+        button_surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        local_rect = button_surf.get_rect()
+        fill_color, border_color = self.get_colors(is_hover)
+        pygame.draw.rect(button_surf, fill_color, local_rect, border_radius=self.border_radius)
+        pygame.draw.rect(button_surf, border_color, local_rect, self.border_width,
+                         border_radius=self.border_radius)
+
+        caption_surf = self.text_cache.render(self.caption_font, self.caption, WHITE)
+        button_surf.blit(caption_surf, (10, 10))
+
+        text_surf = self.text_cache.render(self.font, text, BLACK)
+        button_surf.blit(text_surf, (local_rect.centerx - text_surf.get_width()//2,
+                                     local_rect.centery - text_surf.get_height()//2 + 5))
+        return button_surf
+
+class ScoreBar(Widget):
+    def __init__(self, font):
+        super().__init__((0, 0, SCREEN_WIDTH, 40))
+        self.font = font
+
+    def build(self, text):
+        bar_surf = pygame.Surface(self.rect.size)
+        bar_surf.fill(DARK_GREEN)
+        bar_surf.blit(self.font.render(text, True, GOLD), (10, 10))
+        return bar_surf
+
+class PlayerPanel(Widget):
+    def __init__(self, center, font, text_cache):
+        super().__init__((center[0] - 80, center[1] - 35, 160, 90))
+        self.font = font
+        self.text_cache = text_cache
+
+    def build(self, name, bid, tricks_won, is_current):
+        panel_surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        info_rect = pygame.Rect(10, 10, 140, 70)
+
+        if is_current:
+            pygame.draw.rect(panel_surf, (*GOLD, 100), panel_surf.get_rect(), border_radius=10)
+
+        color = GOLD if is_current else DARK_GREEN
+        pygame.draw.rect(panel_surf, color, info_rect, border_radius=5)
+        pygame.draw.rect(panel_surf, WHITE, info_rect, 2, border_radius=5)
+
+        name_surf = self.text_cache.render(self.font, name, WHITE)
+        bid_surf = self.text_cache.render(self.font, f"Bid: {bid if bid else '?'}", WHITE)
+        tricks_surf = self.text_cache.render(self.font, f"Won: {tricks_won}", WHITE)
+
+        center_x = self.rect.width // 2
+        panel_surf.blit(name_surf, (center_x - name_surf.get_width()//2, 20))
+        panel_surf.blit(bid_surf, (center_x - bid_surf.get_width()//2, 40))
+        panel_surf.blit(tricks_surf, (center_x - tricks_surf.get_width()//2, 60))
+        return panel_surf
+
+class Panel(Widget):
+    def __init__(self, rect, border_radius=10):
+        super().__init__(rect)
+        self.border_radius = border_radius
+
+    def build(self):
+        panel_surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        local_rect = panel_surf.get_rect()
+        pygame.draw.rect(panel_surf, DARK_GREEN, local_rect, border_radius=self.border_radius)
+        pygame.draw.rect(panel_surf, GOLD, local_rect, 3, border_radius=self.border_radius)
+        return panel_surf
+
+class Toast(Widget):
+    def __init__(self, font):
+        super().__init__((0, 0, 0, 0))
+        self.font = font
+        self.text_surf = None
+
+    def build(self, message):
+        self.text_surf = self.font.render(message, True, WHITE)
+        text_rect = self.text_surf.get_rect(center=(SCREEN_WIDTH // 2, 100))
+        self.rect = text_rect.inflate(40, 20)
+
+        bg_surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        pygame.draw.rect(bg_surf, DARK_GREEN, bg_surf.get_rect(), border_radius=10)
+        return bg_surf
+
+    def draw(self, surface, message, alpha):
+        bg_surf = self.get_surface(message)
+        bg_surf.set_alpha(min(200, alpha))
+        surface.blit(bg_surf, self.rect)
+
+        self.text_surf.set_alpha(alpha)
+        surface.blit(self.text_surf, (self.rect.x + 20, self.rect.y + 10))
+
+class ScaledCanvas:
+    """An offscreen frame at scale times the layout size, shown in the window in one scaling pass.
+
+    The drawing code places everything on the SCREEN_WIDTH x SCREEN_HEIGHT layout.
+    The canvas takes its blit and fill calls in layout coordinates and scales
+    their destinations. Each source surface is drawn from a scaled copy, so the
+    whole frame is composed at the render size and a scale below 1 draws fewer
+    pixels. Card sprites, text and widgets are built once and drawn for many
+    frames, so the copies are kept; past CANVAS_COPY_FRAMES frames' worth of
+    bytes the least recently drawn are dropped. present() scales the frame to
+    the window, which may be larger or smaller than the layout.
+    """
+
+    def __init__(self, window, scale):
+        self.window = window
+        self.scale = scale
+        self.surface = pygame.Surface((round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale))).convert()
+        self.copies = OrderedDict()
+        self.copy_bytes = 0
+        self.max_copy_bytes = CANVAS_COPY_FRAMES * self.surface.get_bytesize() * self.surface.get_width() \
+            * self.surface.get_height()
+        self.copies_made = 0
+
+    def get_copy(self, source):
+        if self.scale == 1.0:
+            return source
+        copy = self.copies.get(source)
+        if copy is None:
+            width, height = source.get_size()
+            size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+            if source.get_bitsize() >= 24:
+                copy = pygame.transform.smoothscale(source, size)
             else:
-                non_spades = [c for c in self.hand if c.suit != "Spades"]
-                return non_spades if non_spades else self.hand
+                copy = pygame.transform.scale(source, size)
+            self.copies[source] = copy
+            self.copy_bytes += copy.get_bytesize() * size[0] * size[1]
+            self.copies_made += 1
+            while self.copy_bytes > self.max_copy_bytes and len(self.copies) > 1:
+                _, dropped = self.copies.popitem(last=False)
+                self.copy_bytes -= dropped.get_bytesize() * dropped.get_width() * dropped.get_height()
         else:
-            follow = [c for c in self.hand if c.suit == lead_suit]
-            return follow if follow else self.hand
-
-    def make_ai_bid(self):
-        spades = [c for c in self.hand if c.suit == "Spades"]
-        high_cards = [c for c in self.hand if c.value >= 12]
-        bid = len([c for c in spades if c.value >= 10])
-        bid += len([c for c in high_cards if c.suit != "Spades"])
-        bid = max(1, min(bid, 7))
-        return bid
-
-    def make_ai_play(self, valid_cards, lead_suit, trick_pile, spades_broken):
-        if not trick_pile:
-            valid_cards.sort(key=lambda c: c.value)
-            return valid_cards[0]
+            self.copies.move_to_end(source)
+        # Toasts fade by changing the alpha of the surfaces they draw.
+        alpha = source.get_alpha()
+        if copy.get_alpha() != alpha:
+            copy.set_alpha(alpha)
+        return copy
+
+    def to_canvas(self, x, y):
+        return round(x * self.scale), round(y * self.scale)
+
+    def blit(self, source, dest):
+        return self.surface.blit(self.get_copy(source), self.to_canvas(dest[0], dest[1]))
+
+    def fill(self, color, rect=None):
+        if rect is not None:
+            rect = pygame.Rect(rect)
+            x, y = self.to_canvas(rect.x, rect.y)
+            right, bottom = self.to_canvas(rect.right, rect.bottom)
+            rect = pygame.Rect(x, y, right - x, bottom - y)
+        return self.surface.fill(color, rect)
+
+    def present(self):
+        if self.surface.get_size() == self.window.get_size():
+            self.window.blit(self.surface, (0, 0))
         else:
-            current_winner = self.get_winning_card(trick_pile, lead_suit)
-            can_beat = [c for c in valid_cards if self.card_beats(c, current_winner, lead_suit)]
-            if can_beat:
-                can_beat.sort(key=lambda c: c.value)
-                return can_beat[0]
+            pygame.transform.scale(self.surface, self.window.get_size(), self.window)
+
+    def to_layout(self, pos):
+        # Window pixels (mouse positions) back to layout coordinates.
+        width, height = self.window.get_size()
+        return round(pos[0] * SCREEN_WIDTH / width), round(pos[1] * SCREEN_HEIGHT / height)
+
+class TextureRenderer:
+    """Draws the scene through SDL's 2D renderer (pygame._sdl2) instead of blitting surfaces.
+
+    It takes the same blit and fill calls in layout coordinates as the display
+    surface. Each source surface is uploaded as a texture the first time it is
+    drawn and kept while the surface lives, and the toast's fade sets the
+    texture's alpha when it is copied. Cards have a texture per face and state,
+    uploaded when a game starts, and one shared shadow: draw_cards() applies
+    the hover scale and rotation as it copies them, so no scaled sprites are
+    made. The renderer scales every copy to the window, which may be larger or
+    smaller than the layout. software picks SDL's software renderer, which
+    also runs headless under the dummy video driver.
+    """
+
+    def __init__(self, window_scale=1.0, software=False):
+        self.scale = window_scale
+        self.window = video.Window(WINDOW_TITLE, (round(SCREEN_WIDTH * window_scale),
+                                                  round(SCREEN_HEIGHT * window_scale)))
+        self.renderer = video.Renderer(self.window, accelerated=0 if software else -1)
+        self.renderer.scale = (window_scale, window_scale)
+        self.textures = weakref.WeakKeyDictionary()
+        self.card_textures = {}
+        self.shadow = None
+        self.uploads = 0
+
+    def get_texture(self, source):
+        texture = self.textures.get(source)
+        if texture is None:
+            texture = video.Texture.from_surface(self.renderer, source)
+            self.textures[source] = texture
+            self.uploads += 1
+        alpha = source.get_alpha()
+        texture.alpha = 255 if alpha is None else alpha
+        return texture
+
+    def upload_cards(self, faces):
+        # faces come from CardAtlas.render_faces; the textures are looked up by suit, value and state.
+        shadow = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
+        pygame.draw.rect(shadow, (0, 0, 0, 80), shadow.get_rect(), border_radius=CORNER_RADIUS)
+        self.shadow = video.Texture.from_surface(self.renderer, shadow)
+        for key, face in faces.items():
+            self.card_textures[key[:3]] = video.Texture.from_surface(self.renderer, face)
+        self.uploads += len(self.card_textures) + 1
+
+    def draw_cards(self, cards):
+        shadow = self.shadow
+        textures = self.card_textures
+        rect = pygame.Rect(0, 0, CARD_WIDTH, CARD_HEIGHT)
+        for card in cards:
+            width = int(CARD_WIDTH * card.scale)
+            height = int(CARD_HEIGHT * card.scale)
+            rect.update(card.rect.centerx - width // 2, card.rect.centery - height // 2, width, height)
+            offset = card.get_shadow_offset()
+            if card.rotation:
+                shadow.draw(dstrect=rect.move(offset, offset), angle=card.rotation)
             else:
-                valid_cards.sort(key=lambda c: c.value)
-                return valid_cards[0]
-
-    def get_winning_card(self, trick_pile, lead_suit):
-        if not trick_pile:
-            return None
-        winner_card = trick_pile[0][1]
-        for player, card in trick_pile[1:]:
-            if self.card_beats(card, winner_card, lead_suit):
-                winner_card = card
-        return winner_card
-
-    def card_beats(self, card, current_best, lead_suit):
-        if current_best is None:
-            return True
-        if card.suit == "Spades" and current_best.suit != "Spades":
-            return True
-        if card.suit != "Spades" and current_best.suit == "Spades":
-            return False
-        if card.suit == current_best.suit:
-            return card.value > current_best.value
-        return False
+                # Only the strips showing right of and below the card (and under its rounded
+                # corners); blending the part the card covers is most of the frame on the
+                # software renderer.
+                strip = offset + CORNER_RADIUS
+                src_x = strip * CARD_WIDTH // width
+                src_y = strip * CARD_HEIGHT // height
+                shadow.draw(srcrect=(CARD_WIDTH - src_x, 0, src_x, CARD_HEIGHT),
+                            dstrect=(rect.right + offset - strip, rect.top + offset, strip, height))
+                shadow.draw(srcrect=(0, CARD_HEIGHT - src_y, CARD_WIDTH - src_x, src_y),
+                            dstrect=(rect.left + offset, rect.bottom + offset - strip, width - strip, strip))
+            if card.face_up:
+                texture = textures[card.suit, card.value, card.get_face_state()]
+            else:
+                texture = textures[None, None, None]
+            texture.draw(dstrect=rect, angle=card.rotation)
+
+    def blit(self, source, dest):
+        rect = source.get_rect(topleft=(dest[0], dest[1]))
+        self.get_texture(source).draw(dstrect=rect)
+        return rect
+
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = pygame.Color(color)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(rect)
+
+    def present(self):
+        self.renderer.present()
+
+    def to_layout(self, pos):
+        return round(pos[0] / self.scale), round(pos[1] / self.scale)
+
+    def get_stats(self):
+        return {"textures": len(self.textures) + len(self.card_textures) + (self.shadow is not None),
+                "uploads": self.uploads}
+
+class DirtyRenderer:
+    def __init__(self, screen, show_regions=False):
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.background_key = None
+        self.card_regions = {}
+        self.overlay_key = None
+        self.message_rect = None
+        self.debug_rects = []
+        self.show_regions = show_regions
+        self.pixels_pushed = 0
+        self.total_pixels_pushed = 0
+        self.frames = 0
+
+    def merge_rects(self, rects):
+        merged = []
+        for rect in rects:
+            rect = pygame.Rect(rect)
+            i = rect.collidelist(merged)
+            while i != -1:
+                rect.union_ip(merged.pop(i))
+                i = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def render(self, game):
+        profiler = game.profiler
+        in_table = game.state not in (STATE_MENU, STATE_NAME_SELECT, STATE_GAME_OVER)
+        screen_rect = self.screen.get_rect()
+        dirty = list(self.debug_rects)
+
+        if in_table:
+            key = game.get_table_key()
+        else:
+            key = (game.state, game.button_hover, tuple(game.selected_names))
+
+        if key != self.background_key:
+            self.background_key = key
+            if in_table:
+                self.background.fill(GREEN_FELT)
+                game.draw_table(self.background)
+            else:
+                game.draw_scene(self.background)
+            dirty.append(screen_rect)
+
+        cards = game.get_draw_cards() if in_table else []
+        card_regions = {}
+        for card in cards:
+            region = (card.get_sprite_rect(game.atlas), game.atlas.get_sprite_key(card))
+            card_regions[card] = region
+            previous = self.card_regions.pop(card, None)
+            if previous != region:
+                dirty.append(region[0])
+                if previous is not None:
+                    dirty.append(previous[0])
+        for rect, sprite_key in self.card_regions.values():
+            dirty.append(rect)
+        self.card_regions = card_regions
+
+        overlay_key = (game.is_bid_panel_visible(), game.button_hover) if in_table else None
+        if overlay_key != self.overlay_key:
+            self.overlay_key = overlay_key
+            dirty.append(game.get_bid_panel_rect())
+
+        message_rect = game.get_message_rect() if game.is_message_visible() else None
+        if message_rect is not None:
+            dirty.append(message_rect)
+        if self.message_rect is not None and self.message_rect != message_rect:
+            dirty.append(self.message_rect)
+        self.message_rect = message_rect
+
+        regions = [r.clip(screen_rect) for r in self.merge_rects(dirty)]
+        bid_panel_rect = game.get_bid_panel_rect()
+        if profiler is not None:
+            profiler.mark("table")
+        for rect in regions:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.background, rect, rect)
+            if profiler is not None:
+                profiler.mark("table")
+            for card in cards:
+                if card_regions[card][0].colliderect(rect):
+                    card.draw(self.screen, game.atlas)
+            if profiler is not None:
+                profiler.mark("cards")
+            if in_table and bid_panel_rect.colliderect(rect):
+                game.draw_bid_panel(self.screen)
+            if message_rect is not None and message_rect.colliderect(rect):
+                game.draw_message(self.screen)
+            if profiler is not None:
+                profiler.mark("overlays")
+        self.screen.set_clip(None)
+
+        self.pixels_pushed = sum(r.width * r.height for r in regions)
+        self.total_pixels_pushed += self.pixels_pushed
+        self.frames += 1
+
+        self.debug_rects = []
+        if self.show_regions:
+            for rect in regions:
+                pygame.draw.rect(self.screen, RED, rect, 1)
+            average = self.total_pixels_pushed // self.frames
+            label = game.font_small.render(f"Dirty: {len(regions)} rects, {self.pixels_pushed} px "
+                                           f"(avg {average} px)", True, WHITE, BLACK)
+            label_rect = label.get_rect(topright=(SCREEN_WIDTH - 10, 45))
+            self.screen.blit(label, label_rect)
+            self.debug_rects = regions + [label_rect]
+
+        if profiler is not None:
+            if profiler.show_overlay:
+                # Like the region outlines, the overlay is erased by the next frame's redraw.
+                self.debug_rects.append(profiler.draw_overlay(self.screen, game.font_small))
+            profiler.mark("profiler")
+
+        pygame.display.update(regions + self.debug_rects)
+        if profiler is not None:
+            profiler.mark("flip")
 
 class Game:
-    def __init__(self):
+    # Fonts open on first use, through the asset cache's font index.
+    font_title = LazyFont("Arial", 60, bold=True)
+    font_large = LazyFont("Arial", 36, bold=True)
+    font_medium = LazyFont("Arial", 24, bold=True)
+    font_small = LazyFont("Arial", 18)
+    font_card = LazyFont("Arial", 28, bold=True)
+
+    def __init__(self, dirty_rects=False, show_dirty_regions=False, speed=1.0, watch=False, profile=False,
+                 seed=None, record_path=None, cache_dir=CACHE_DIR, startup=None, ai_policy=None, threaded_ai=True,
+                 fixed_fps=False, render_scale=1.0, window_scale=1.0, renderer="surface"):
+        self.startup = startup
         pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Spades - Professional Edition")
+        if startup is not None:
+            startup.mark("pygame.init")
+        self.canvas = None
+        self.textures = None
+        if renderer != "surface":
+            # The scene goes to SDL's renderer, which takes the same blit and fill calls as the display surface.
+            self.textures = TextureRenderer(window_scale, software=renderer == "software")
+            self.screen = self.textures
+        else:
+            self.screen = pygame.display.set_mode((round(SCREEN_WIDTH * window_scale),
+                                                   round(SCREEN_HEIGHT * window_scale)))
+            # Drawn straight to the window unless the frame is rendered or shown at another size.
+            if render_scale != 1.0 or window_scale != 1.0:
+                self.canvas = ScaledCanvas(self.screen, render_scale)
+            pygame.display.set_caption(WINDOW_TITLE)
         self.clock = pygame.time.Clock()
-
-        self.font_title = pygame.font.SysFont("Arial", 60, bold=True)
-        self.font_large = pygame.font.SysFont("Arial", 36, bold=True)
-        self.font_medium = pygame.font.SysFont("Arial", 24, bold=True)
-        self.font_small = pygame.font.SysFont("Arial", 18)
-        self.font_card = pygame.font.SysFont("Arial", 28, bold=True)
-
-        self.state = STATE_MENU
-        self.players = []
-        self.deck = None
-        self.current_player_idx = 0
-        self.dealer_idx = 0
-
-        self.trick_pile = []
-        self.lead_suit = None
-        self.spades_broken = False
-        self.trick_winner = None
-
-        self.team_scores = [0, 0]
-        self.team_bags = [0, 0]
-
-        self.timer = 0
+        if startup is not None:
+            startup.mark("display")
+
+        self.assets = AssetCache(cache_dir)
+        # Card sprites are not needed for the menu; load_card_assets runs when a game starts.
+        self.atlas = None
+        self.atlas_hash = None
+        self.atlas_saved = 0
+        self.bid_table = bidtable.load_table()
+        if startup is not None:
+            startup.mark("bid table")
+
+        self.text_cache = TextCache()
+        self.menu_button = Button((SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 200, 60),
+                                  self.font_large, self.text_cache)
+        self.start_button = Button((SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT - 150, 200, 60),
+                                   self.font_large, self.text_cache)
+        self.bid_buttons = [Button((SCREEN_WIDTH // 2 - 250 + (bid - 1) * 75, SCREEN_HEIGHT // 2 + 80, 60, 50),
+                                   self.font_large, self.text_cache, border_radius=5, border_width=2)
+                            for bid in range(1, 8)]
+        self.bid_panel = Panel((SCREEN_WIDTH//2 - 280, SCREEN_HEIGHT//2 + 30, 560, 110))
+        self.score_bar = ScoreBar(self.font_small)
+        self.player_panels = [PlayerPanel(center, self.font_small, self.text_cache) for center in
+                              [(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 180), (80, SCREEN_HEIGHT // 2),
+                               (SCREEN_WIDTH // 2, 150), (SCREEN_WIDTH - 80, SCREEN_HEIGHT // 2)]]
+        self.toast = Toast(self.font_medium)
+        if startup is not None:
+            startup.mark("fonts and widgets")
+
+        self.animator = animation.Animator() if animation is not None else None
+        self.sprites = SpritePool(self.animator)
+
+        self.dirty_renderer = None
+        if dirty_rects:
+            self.dirty_renderer = DirtyRenderer(self.screen, show_dirty_regions)
+        self.profiler = FrameProfiler(FPS) if profile else None
+        self.fixed_fps = fixed_fps
+        self.wake_event = None
+        self.woke_from_idle = False
+        self.idle_seconds = 0.0
+
+        self.menu_state = STATE_MENU
+        self.engine = None
+        self.human_seats = () if watch else (0,)
+        self.seed = seed
+        self.record_writer = record.RecordWriter(record_path) if record_path else None
+        self.recorder = None
+
+        self.scheduler = Scheduler(pygame.time.get_ticks, speed)
+        self.pending_step = None
+        self.ai_policy = ai_policy
+        self.thinker = AIThinker(FPS, threaded=threaded_ai)
         self.message = ""
         self.message_timer = 0
 
@@ -426,363 +1081,475 @@ class Game:
         random_initial_names = self.get_random_names()
         self.selected_names = ["You", random_initial_names[0], random_initial_names[1], random_initial_names[2]]
         self.name_buttons = []
+        if startup is not None:
+            startup.mark("game setup")
+
+    def load_card_assets(self):
+        if self.atlas is not None:
+            return
+        start = time.perf_counter()
+        self.atlas = CardAtlas(self.font_card)
+        # Sprites depend on the drawing code in this file, the card font and the scale steps.
+        card_font_path = self.assets.resolve_font("Arial", 28, bold=True)[0]
+        self.atlas_hash = content_hash([__file__], font_stamp(card_font_path), self.atlas.scale_steps)
+        if self.textures is not None:
+            self.load_card_textures(start)
+            return
+        sprites = self.assets.load_sprites("atlas", self.atlas_hash, CardAtlas.unpack_key)
+        if sprites:
+            self.atlas.packed.update(sprites)
+            self.atlas_saved = len(sprites)
+            source = "loaded from cache"
+        else:
+            self.atlas.build(self.sprites.sprites)
+            self.save_card_assets()
+            source = "built and cached"
+        if self.startup is not None:
+            print(f"Card sprites: {self.atlas.get_stats()['sprites']} {source} in "
+                  f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def load_card_textures(self, start):
+        # The texture renderer scales cards and draws their shadows as it copies them, so it
+        # uploads one plain face per card and state instead of the atlas's sprites.
+        faces = self.assets.load_sprites("faces", self.atlas_hash, CardAtlas.unpack_key)
+        if faces:
+            faces = {key: unpack_sprite(packed) for key, packed in faces.items()}
+        if faces and None not in faces.values():
+            source = "loaded from cache"
+        else:
+            faces = self.atlas.render_faces(self.sprites.sprites)
+            self.assets.save_sprites("faces", self.atlas_hash, faces, CardAtlas.pack_key)
+            source = "built and cached"
+        self.textures.upload_cards(faces)
+        if self.startup is not None:
+            print(f"Card textures: {len(faces)} faces {source} and uploaded in "
+                  f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def save_card_assets(self):
+        # Also keeps sprites first rendered during play (a played card shrinking back).
+        if self.atlas is not None:
+            sheet = self.atlas.get_sheet()
+            if len(sheet) > self.atlas_saved:
+                self.assets.save_sprites("atlas", self.atlas_hash, sheet, CardAtlas.pack_key)
+                self.atlas_saved = len(sheet)
+
+    @property
+    def state(self):
+        return self.engine.state if self.engine is not None else self.menu_state
 
     def get_random_names(self):
         names = random.sample(INDIAN_NAMES, 3)
         return names
 
     def start_game(self):
-        self.state = STATE_NAME_SELECT
+        self.menu_state = STATE_NAME_SELECT
         self.setup_name_buttons()
 
     def setup_name_buttons(self):
         self.name_buttons = []
         y_start = 300
+        positions = ["West", "North", "East"]
         for i in range(3):
             btn_rect = pygame.Rect(SCREEN_WIDTH // 2 - 150, y_start + i * 80, 300, 60)
-            self.name_buttons.append(btn_rect)
+            self.name_buttons.append(NameButton(btn_rect, self.font_medium, self.font_small,
+                                                f"{positions[i]}:", self.text_cache))
 
     def finalize_game_start(self):
-        self.players = [
-            Player(self.selected_names[0], 0, is_human=True),
-            Player(self.selected_names[1], 1),
-            Player(self.selected_names[2], 2),
-            Player(self.selected_names[3], 3)
-        ]
-        self.dealer_idx = 0
-        self.team_scores = [0, 0]
-        self.team_bags = [0, 0]
-        self.start_round()
-
-    def start_round(self):
-        for p in self.players:
-            p.hand = []
-            p.bid = None
-            p.tricks_won = 0
-
-        self.deck = Deck()
-        self.deck.shuffle()
-        hands = self.deck.deal(4)
+        self.load_card_assets()
+        policies = None
+        if self.ai_policy is not None:
+            policies = [self.ai_policy] * rules.NUM_PLAYERS
+        elif self.bid_table is not None:
+            policies = [bidtable.BidTablePolicy(self.bid_table)] * rules.NUM_PLAYERS
+        self.scheduler.clear()
+        self.thinker.cancel()
+        self.engine = rules.Engine(self.selected_names, human_seats=self.human_seats, policies=policies,
+                                   seed=self.seed)
+        self.engine.listeners.append(self.on_engine_event)
+        if self.record_writer is not None:
+            self.close_recorder()
+            self.recorder = record.GameRecorder(self.engine, self.record_writer)
+        self.engine.start_game()
+        self.schedule_step()
+
+    def close_recorder(self):
+        # A game left before the end is still recorded, marked as abandoned.
+        if self.recorder is not None:
+            self.recorder.finish()
+            self.recorder = None
+
+    def on_engine_event(self, event):
+        kind = event[0]
+        if kind == EVENT_DEAL:
+            self.sprites.reset()
+            self.position_cards()
+        elif kind == EVENT_BIDDING:
+            self.show_message("Bidding starts! Bid 1-7 tricks.")
+        elif kind == EVENT_BID:
+            player, bid = event[1], event[2]
+            if player.is_human:
+                self.show_message(f"You bid {bid} tricks")
+            else:
+                self.show_message(f"{player.name} bids {bid}")
+        elif kind == EVENT_BIDS_DONE:
+            self.show_message(f"Total bids: {event[1]}/13 tricks")
+        elif kind == EVENT_PLAY:
+            self.animate_play(event[1], event[2])
+        elif kind == EVENT_TRICK:
+            self.show_message(f"{event[1].name} wins the trick!")
+        elif kind == EVENT_BAG_OUT:
+            self.show_message(f"Team {event[1] + 1} bagged out! -100 points")
+
+    def advance_engine(self, action, *args):
+        action(*args)
+        self.update_valid_cards()
+        self.schedule_step()
+
+    def schedule_step(self):
+        if self.pending_step is not None:
+            self.pending_step.cancel()
+            self.pending_step = None
+        state = self.engine.state
+        if state in STATE_DELAYS and not self.engine.needs_input():
+            # A computer player starts thinking now, while its turn's delay plays out.
+            if state in (STATE_BID, STATE_PLAY):
+                self.thinker.submit(self.engine)
+            else:
+                self.thinker.cancel()
+            self.pending_step = self.scheduler.schedule(STATE_DELAYS[state], self.run_step)
+
+    def run_step(self):
+        self.pending_step = None
+        if self.engine.state == STATE_DEAL and not self.scheduler.is_instant():
+            if self.is_dealing():
+                self.pending_step = self.scheduler.schedule(DEAL_POLL_DELAY, self.run_step)
+                return
+        if self.engine.state in (STATE_BID, STATE_PLAY):
+            self.run_ai_turn()
+            return
+        self.advance_engine(self.engine.step)
+
+    def run_ai_turn(self):
+        if not self.thinker.is_pending():
+            self.thinker.submit(self.engine)
+        # At instant speed nothing is drawn between turns, so the turn waits for its decision.
+        decision = self.thinker.take(block=self.scheduler.is_instant())
+        if decision is None:
+            self.pending_step = self.scheduler.schedule(AI_POLL_DELAY, self.run_step)
+        elif self.engine.state == STATE_BID:
+            self.advance_engine(self.engine.place_bid, decision)
+        else:
+            self.advance_engine(self.engine.play_card, self.engine.players[self.engine.current_player_idx], decision)
 
-        for i, player in enumerate(self.players):
-            player.hand = hands[i]
-            player.sort_hand()
+    def is_dealing(self):
+        sprites = self.sprites
+        return any(sprites[card].is_moving for player in self.engine.players for card in player.hand)
 
-        self.position_cards()
-        self.state = STATE_DEAL
-        self.timer = pygame.time.get_ticks()
+    def set_speed(self, speed):
+        self.scheduler.set_speed(speed)
+        label = "instant" if speed == INSTANT else f"{speed:g}x"
+        self.show_message(f"Game speed: {label}")
 
     def position_cards(self):
-        for player in self.players:
+        for player in self.engine.players:
             self.position_player_hand(player)
 
     def position_player_hand(self, player):
-        hand_len = len(player.hand)
+        hand = [self.sprites[card] for card in player.hand]
+        hand_len = len(hand)
         spacing = min(30, (SCREEN_WIDTH - 200) // max(hand_len, 1))
 
         if player.position == 0:
             start_x = SCREEN_WIDTH // 2 - (hand_len * spacing) // 2
-            for i, card in enumerate(player.hand):
-                card.set_target(start_x + i * spacing, SCREEN_HEIGHT - CARD_HEIGHT - 10)
-                card.face_up = True
-                card.target_rotation = 0
-                card.draw_order = i
+            for i, sprite in enumerate(hand):
+                sprite.set_target(start_x + i * spacing, SCREEN_HEIGHT - CARD_HEIGHT - 10)
+                sprite.face_up = True
+                sprite.set_target_rotation(0)
+                sprite.draw_order = i
         elif player.position == 1:
             start_y = SCREEN_HEIGHT // 2 - (hand_len * 25) // 2
-            for i, card in enumerate(player.hand):
-                card.set_target(10, start_y + i * 25)
-                card.face_up = False
-                card.draw_order = i
+            for i, sprite in enumerate(hand):
+                sprite.set_target(10, start_y + i * 25)
+                sprite.face_up = False
+                sprite.draw_order = i
         elif player.position == 2:
             start_x = SCREEN_WIDTH // 2 - (hand_len * spacing) // 2
-            for i, card in enumerate(player.hand):
-                card.set_target(start_x + i * spacing, 10)
-                card.face_up = False
-                card.draw_order = i
+            for i, sprite in enumerate(hand):
+                sprite.set_target(start_x + i * spacing, 10)
+                sprite.face_up = False
+                sprite.draw_order = i
         elif player.position == 3:
             start_y = SCREEN_HEIGHT // 2 - (hand_len * 25) // 2
-            for i, card in enumerate(player.hand):
-                card.set_target(SCREEN_WIDTH - CARD_WIDTH - 10, start_y + i * 25)
-                card.face_up = False
-                card.draw_order = i
+            for i, sprite in enumerate(hand):
+                sprite.set_target(SCREEN_WIDTH - CARD_WIDTH - 10, start_y + i * 25)
+                sprite.face_up = False
+                sprite.draw_order = i
 
     def show_message(self, msg, duration=2000):
         self.message = msg
         self.message_timer = pygame.time.get_ticks() + duration
 
     def update_valid_cards(self):
-        human = self.players[0]
-        if self.state == STATE_PLAY and self.current_player_idx == 0:
-            valid_moves = human.get_valid_moves(self.lead_suit, self.spades_broken)
+        human = self.engine.players[0]
+        if self.state == STATE_PLAY and self.engine.needs_input():
+            lead_suit, spades_broken = self.engine.lead_suit, self.engine.spades_broken
             for card in human.hand:
-                card.set_playable(card in valid_moves)
+                self.sprites[card].set_playable(human.is_valid_move(card, lead_suit, spades_broken))
         else:
             for card in human.hand:
-                card.set_playable(False)
+                self.sprites[card].set_playable(False)
+
+    def get_button_hover(self, mouse_pos):
+        if self.state == STATE_MENU:
+            if self.menu_button.rect.collidepoint(mouse_pos):
+                return "start"
+        elif self.state == STATE_NAME_SELECT:
+            if self.start_button.rect.collidepoint(mouse_pos):
+                return "start_game"
+            for i, button in enumerate(self.name_buttons):
+                if button.rect.collidepoint(mouse_pos):
+                    return f"name_{i}"
+        elif self.is_bid_panel_visible():
+            for bid, button in enumerate(self.bid_buttons, 1):
+                if button.rect.collidepoint(mouse_pos):
+                    return f"bid_{bid}"
+        return None
+
+    def to_layout(self, pos):
+        if self.canvas is not None:
+            return self.canvas.to_layout(pos)
+        if self.textures is not None:
+            return self.textures.to_layout(pos)
+        return pos
 
     def handle_input(self):
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = self.to_layout(pygame.mouse.get_pos())
+        self.button_hover = self.get_button_hover(mouse_pos)
 
-        if self.state == STATE_PLAY and self.current_player_idx == 0:
-            human = self.players[0]
+        if self.state == STATE_PLAY and self.engine.needs_input():
+            human = self.engine.players[0]
             any_hovered = False
 
             for card in reversed(human.hand):
-                if card.is_playable:
-                    hover_rect = card.get_hover_rect()
+                sprite = self.sprites[card]
+                if sprite.is_playable:
+                    hover_rect = sprite.get_hover_rect()
                     if hover_rect.collidepoint(mouse_pos) and not any_hovered:
-                        card.hovered = True
-                        card.target_scale = HOVER_SCALE
+                        sprite.hovered = True
+                        sprite.set_target_scale(HOVER_SCALE)
                         any_hovered = True
                     else:
-                        card.hovered = False
-                        card.target_scale = 1.0
-
-        for event in pygame.event.get():
+                        sprite.hovered = False
+                        sprite.set_target_scale(1.0)
+
+        events = pygame.event.get()
+        if self.wake_event is not None:
+            events.insert(0, self.wake_event)
+            self.wake_event = None
+        for event in events:
             if event.type == pygame.QUIT:
                 return False
 
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F2 and self.dirty_renderer is not None:
+                    self.dirty_renderer.show_regions = not self.dirty_renderer.show_regions
+                elif event.key == pygame.K_F3 and self.profiler is not None:
+                    self.profiler.show_overlay = not self.profiler.show_overlay
+                elif event.key == pygame.K_F4:
+                    step = SPEED_STEPS.index(self.scheduler.speed) if self.scheduler.speed in SPEED_STEPS else -1
+                    self.set_speed(SPEED_STEPS[(step + 1) % len(SPEED_STEPS)])
+
             if event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = event.pos
+                mx, my = self.to_layout(event.pos)
 
                 if self.state == STATE_MENU:
-                    btn_rect = pygame.Rect(SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 200, 60)
-                    if btn_rect.collidepoint(mx, my):
+                    if self.menu_button.rect.collidepoint(mx, my):
                         self.start_game()
 
                 elif self.state == STATE_NAME_SELECT:
-                    start_btn = pygame.Rect(SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT - 150, 200, 60)
-                    if start_btn.collidepoint(mx, my):
+                    if self.start_button.rect.collidepoint(mx, my):
                         self.finalize_game_start()
 
-                    for i, btn_rect in enumerate(self.name_buttons):
-                        if btn_rect.collidepoint(mx, my):
+                    for i, button in enumerate(self.name_buttons):
+                        if button.rect.collidepoint(mx, my):
                             self.selected_names[i + 1] = random.choice(INDIAN_NAMES)
 
                 elif self.state == STATE_BID:
-                    human = self.players[0]
-                    if self.current_player_idx == 0 and human.bid is None:
-                        for bid in range(1, 8):
-                            btn_x = SCREEN_WIDTH // 2 - 250 + (bid - 1) * 75
-                            btn_rect = pygame.Rect(btn_x, SCREEN_HEIGHT // 2 + 80, 60, 50)
-                            if btn_rect.collidepoint(mx, my):
-                                human.bid = bid
-                                self.show_message(f"You bid {bid} tricks")
-                                self.advance_bidding()
+                    if self.is_bid_panel_visible():
+                        for bid, button in enumerate(self.bid_buttons, 1):
+                            if button.rect.collidepoint(mx, my):
+                                self.advance_engine(self.engine.place_bid, bid)
 
                 elif self.state == STATE_PLAY:
-                    if self.current_player_idx == 0:
-                        human = self.players[0]
-                        valid_moves = human.get_valid_moves(self.lead_suit, self.spades_broken)
+                    if self.engine.needs_input():
+                        human = self.engine.players[0]
 
                         for card in reversed(human.hand):
-                            hover_rect = card.get_hover_rect()
+                            hover_rect = self.sprites[card].get_hover_rect()
                             if hover_rect.collidepoint(mx, my):
-                                if card in valid_moves:
-                                    self.play_card(human, card)
+                                if human.is_valid_move(card, self.engine.lead_suit, self.engine.spades_broken):
+                                    self.advance_engine(self.engine.play_card, human, card)
                                 else:
-                                    card.shake()
+                                    self.sprites[card].shake()
                                 break
 
                 elif self.state == STATE_GAME_OVER:
-                    self.state = STATE_MENU
+                    self.scheduler.clear()
+                    self.thinker.cancel()
+                    self.engine = None
+                    self.menu_state = STATE_MENU
 
         return True
 
-    def advance_bidding(self):
-        self.current_player_idx = (self.current_player_idx + 1) % 4
-
-        if all(p.bid is not None for p in self.players):
-            total_bids = sum(p.bid for p in self.players)
-            self.show_message(f"Total bids: {total_bids}/13 tricks")
-            self.start_play()
-        else:
-            current = self.players[self.current_player_idx]
-            if not current.is_human:
-                self.timer = pygame.time.get_ticks()
-
-    def start_play(self):
-        self.state = STATE_PLAY
-        self.current_player_idx = (self.dealer_idx + 1) % 4
-        self.trick_pile = []
-        self.lead_suit = None
-        self.timer = pygame.time.get_ticks()
-        self.update_valid_cards()
-
-    def play_card(self, player, card):
-        player.hand.remove(card)
-
-        if not self.trick_pile:
-            self.lead_suit = card.suit
-            if card.suit == "Spades":
-                self.spades_broken = True
-
+    def animate_play(self, player, card):
         offsets = [(0, -80), (-100, 0), (0, 80), (100, 0)]
         offset = offsets[player.position]
         target_x = SCREEN_WIDTH // 2 - CARD_WIDTH // 2 + offset[0]
         target_y = SCREEN_HEIGHT // 2 - CARD_HEIGHT // 2 + offset[1]
 
-        card.set_target(target_x, target_y, arc_height=100)
-        card.face_up = True
-        card.set_playable(False)
-        card.target_scale = 1.0
-        card.hovered = False
-        card.draw_order = 1000
-
-        self.trick_pile.append((player, card))
-
-        if len(self.trick_pile) == 4:
-            self.end_trick()
-        else:
-            self.current_player_idx = (self.current_player_idx + 1) % 4
-            self.timer = pygame.time.get_ticks()
-            self.update_valid_cards()
+        sprite = self.sprites[card]
+        sprite.set_target(target_x, target_y, arc_height=100)
+        sprite.face_up = True
+        sprite.set_playable(False)
+        sprite.set_target_scale(1.0)
+        sprite.hovered = False
+        sprite.draw_order = 1000
 
         self.position_player_hand(player)
 
-    def end_trick(self):
-        winner_player = self.trick_pile[0][0]
-        winner_card = self.trick_pile[0][1]
-
-        for player, card in self.trick_pile[1:]:
-            if player.card_beats(card, winner_card, self.lead_suit):
-                winner_player = player
-                winner_card = card
-
-        winner_player.tricks_won += 1
-        self.trick_winner = winner_player
-        self.show_message(f"{winner_player.name} wins the trick!")
-        self.state = STATE_TRICK_END
-        self.timer = pygame.time.get_ticks()
-
     def update(self):
-        dt = self.clock.tick(FPS) / 1000.0
-
-        for player in self.players:
-            for card in player.hand:
-                card.update(dt)
-
-        for player, card in self.trick_pile:
-            card.update(dt)
-
-        if self.state == STATE_DEAL:
-            if pygame.time.get_ticks() - self.timer > 1000:
-                all_dealt = all(not c.is_moving for p in self.players for c in p.hand)
-                if all_dealt:
-                    self.state = STATE_BID
-                    self.current_player_idx = (self.dealer_idx + 1) % 4
-                    self.show_message("Bidding starts! Bid 1-7 tricks.")
-                    self.timer = pygame.time.get_ticks()
-
-        elif self.state == STATE_BID:
-            current = self.players[self.current_player_idx]
-            if not current.is_human and current.bid is None:
-                if pygame.time.get_ticks() - self.timer > 800:
-                    current.bid = current.make_ai_bid()
-                    self.show_message(f"{current.name} bids {current.bid}")
-                    self.advance_bidding()
-
-        elif self.state == STATE_PLAY:
-            current = self.players[self.current_player_idx]
-            if not current.is_human:
-                if pygame.time.get_ticks() - self.timer > 800:
-                    valid_moves = current.get_valid_moves(self.lead_suit, self.spades_broken)
-                    if valid_moves:
-                        card = current.make_ai_play(valid_moves, self.lead_suit,
-                                                   self.trick_pile, self.spades_broken)
-                        self.play_card(current, card)
-
-        elif self.state == STATE_TRICK_END:
-            if pygame.time.get_ticks() - self.timer > 1500:
-                self.trick_pile = []
-                self.lead_suit = None
-
-                if all(len(p.hand) == 0 for p in self.players):
-                    self.end_round()
-                else:
-                    self.current_player_idx = self.players.index(self.trick_winner)
-                    self.state = STATE_PLAY
-                    self.timer = pygame.time.get_ticks()
-                    self.update_valid_cards()
-
-        elif self.state == STATE_ROUND_END:
-            if pygame.time.get_ticks() - self.timer > 3000:
-                if max(self.team_scores) >= 500:
-                    self.state = STATE_GAME_OVER
-                else:
-                    self.dealer_idx = (self.dealer_idx + 1) % 4
-                    self.start_round()
-
-    def end_round(self):
-        for team_idx in range(2):
-            team_players = [p for p in self.players if p.team == team_idx]
-            total_bid = sum(p.bid for p in team_players)
-            total_won = sum(p.tricks_won for p in team_players)
-
-            if total_won >= total_bid:
-                points = total_bid * 10
-                bags = total_won - total_bid
-                self.team_bags[team_idx] += bags
-
-                if self.team_bags[team_idx] >= 10:
-                    points -= 100
-                    self.team_bags[team_idx] -= 10
-                    self.show_message(f"Team {team_idx + 1} bagged out! -100 points")
-
-                self.team_scores[team_idx] += points + bags
-            else:
-                self.team_scores[team_idx] -= total_bid * 10
-
-        self.state = STATE_ROUND_END
-        self.timer = pygame.time.get_ticks()
+        if self.woke_from_idle:
+            # The sleep is not part of any frame: the frame after it starts at once and animates one frame's worth.
+            self.woke_from_idle = False
+            self.clock.tick()
+            tick_ms = 1000.0 / FPS
+        else:
+            tick_ms = self.clock.tick(FPS)
+        if self.profiler is not None:
+            # A frame ends when the clock releases it, so its sleep counts as "wait".
+            self.profiler.mark("wait")
+            self.profiler.end_frame(tick_ms)
+        self.thinker.end_frame(tick_ms)
+        dt = tick_ms / 1000.0
+
+        if self.engine is None:
+            return
+
+        # Card flights follow the game speed; hover and shake stay at real time.
+        motion_dt = None
+        if self.scheduler.is_instant():
+            motion_dt = 1.0
+        elif self.scheduler.speed != 1.0:
+            motion_dt = dt * self.scheduler.speed
+
+        if self.animator is not None:
+            self.animator.update(dt, motion_dt)
+        else:
+            sprites = self.sprites
+            for player in self.engine.players:
+                for card in player.hand:
+                    sprites[card].update(dt, motion_dt)
+
+            for player, card in self.engine.trick_pile:
+                sprites[card].update(dt, motion_dt)
+
+        self.scheduler.run_due()
+
+    def get_idle_timeout(self):
+        """How long, in ms, the next frame would look like the last one unless input arrives; 0 to draw it now."""
+        if self.fixed_fps or (self.profiler is not None and self.profiler.show_overlay):
+            return 0
+        if self.engine is not None:
+            if self.animator is not None:
+                if len(self.animator):
+                    return 0
+            elif any(sprite.is_animating() for sprite in self.get_draw_cards()):
+                return 0
+        timeout = IDLE_WAIT_LIMIT
+        if self.is_message_visible():
+            timeout = self.message_timer - MESSAGE_FADE - pygame.time.get_ticks()
+        next_event = self.scheduler.time_until_next()
+        if next_event is not None:
+            timeout = min(timeout, next_event)
+        return max(0, math.ceil(timeout))
+
+    def wait_idle(self, timeout):
+        # Sleep until input or the timeout; an event that wakes the loop is handled first next frame.
+        start = time.perf_counter()
+        event = pygame.event.wait(timeout)
+        if event.type != pygame.NOEVENT:
+            self.wake_event = event
+        self.woke_from_idle = True
+        self.idle_seconds += time.perf_counter() - start
 
     def draw(self):
-        self.screen.fill(GREEN_FELT)
+        if self.dirty_renderer is not None:
+            self.dirty_renderer.render(self)
+            return
+
+        profiler = self.profiler
+        surface = self.canvas if self.canvas is not None else self.screen
+        self.draw_scene(surface)
+        if profiler is None:
+            self.draw_message(surface)
+            if self.canvas is not None:
+                self.canvas.present()
+            self.flip()
+            return
+
+        profiler.mark("table")
+        self.draw_message(surface)
+        profiler.mark("overlays")
+        if self.canvas is not None:
+            self.canvas.present()
+            profiler.mark("flip")
+        # Over the presented frame, so the overlay stays legible at any render scale.
+        if profiler.show_overlay:
+            profiler.draw_overlay(self.screen, self.font_small)
+        profiler.mark("profiler")
+        self.flip()
+        profiler.mark("flip")
+
+    def flip(self):
+        if self.textures is not None:
+            self.textures.present()
+        else:
+            pygame.display.flip()
+
+    def draw_scene(self, surface):
+        surface.fill(GREEN_FELT)
 
         if self.state == STATE_MENU:
-            self.draw_menu()
+            self.draw_menu(surface)
         elif self.state == STATE_NAME_SELECT:
-            self.draw_name_select()
+            self.draw_name_select(surface)
         elif self.state == STATE_GAME_OVER:
-            self.draw_game_over()
+            self.draw_game_over(surface)
         else:
-            self.draw_game()
-
-        if pygame.time.get_ticks() < self.message_timer and self.message:
-            alpha = min(255, (self.message_timer - pygame.time.get_ticks()) // 2)
-            msg_surf = self.font_medium.render(self.message, True, WHITE)
-            msg_rect = msg_surf.get_rect(center=(SCREEN_WIDTH // 2, 100))
-
-            bg_surf = pygame.Surface((msg_rect.width + 40, msg_rect.height + 20), pygame.SRCALPHA)
-            pygame.draw.rect(bg_surf, (*DARK_GREEN, min(200, alpha)), 
-                           bg_surf.get_rect(), border_radius=10)
-            self.screen.blit(bg_surf, (msg_rect.x - 20, msg_rect.y - 10))
-
-            msg_surf.set_alpha(alpha)
-            self.screen.blit(msg_surf, msg_rect)
+            self.draw_game(surface)
 
-        pygame.display.flip()
+    def is_message_visible(self):
+        return pygame.time.get_ticks() < self.message_timer and self.message
 
-    def draw_menu(self):
-        title = self.font_title.render("SPADES", True, GOLD)
-        shadow = self.font_title.render("SPADES", True, BLACK)
-        self.screen.blit(shadow, (SCREEN_WIDTH//2 - title.get_width()//2 + 3, 153))
-        self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 150))
+    def get_message_rect(self):
+        self.toast.get_surface(self.message)
+        return self.toast.rect
 
-        subtitle = self.font_medium.render("Professional Edition", True, WHITE)
-        self.screen.blit(subtitle, (SCREEN_WIDTH//2 - subtitle.get_width()//2, 230))
+    def draw_message(self, surface):
+        if self.is_message_visible():
+            alpha = min(255, (self.message_timer - pygame.time.get_ticks()) // 2)
+            self.toast.draw(surface, self.message, alpha)
 
-        mouse_pos = pygame.mouse.get_pos()
-        btn_rect = pygame.Rect(SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2, 200, 60)
-        is_hover = btn_rect.collidepoint(mouse_pos)
+    def draw_centered_text(self, surface, font, text, color, y, x_offset=0):
+        text_surf = self.text_cache.render(font, text, color)
+        surface.blit(text_surf, (SCREEN_WIDTH//2 - text_surf.get_width()//2 + x_offset, y))
 
-        btn_color = WHITE if is_hover else GOLD
-        pygame.draw.rect(self.screen, btn_color, btn_rect, border_radius=10)
-        pygame.draw.rect(self.screen, GOLD if is_hover else WHITE, btn_rect, 3, border_radius=10)
+    def draw_menu(self, surface):
+        self.draw_centered_text(surface, self.font_title, "SPADES", BLACK, 153, 3)
+        self.draw_centered_text(surface, self.font_title, "SPADES", GOLD, 150)
+        self.draw_centered_text(surface, self.font_medium, "Professional Edition", WHITE, 230)
 
-        btn_text = self.font_large.render("START", True, BLACK)
-        self.screen.blit(btn_text, (btn_rect.centerx - btn_text.get_width()//2,
-                                    btn_rect.centery - btn_text.get_height()//2))
+        self.menu_button.draw(surface, "START", self.button_hover == "start")
 
         rules = [
             "Rules:",
@@ -794,148 +1561,252 @@ class Game:
         ]
         y = SCREEN_HEIGHT//2 + 120
         for rule in rules:
-            text = self.font_small.render(rule, True, WHITE)
-            self.screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, y))
+            self.draw_centered_text(surface, self.font_small, rule, WHITE, y)
             y += 25
 
-    def draw_name_select(self):
-        title = self.font_title.render("SELECT PLAYER NAMES", True, GOLD)
-        self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 100))
-
-        positions = ["West", "North", "East"]
-        mouse_pos = pygame.mouse.get_pos()
-
-        for i, btn_rect in enumerate(self.name_buttons):
-            is_hover = btn_rect.collidepoint(mouse_pos)
-
-            btn_color = HIGHLIGHT_GREEN if is_hover else GOLD
-            pygame.draw.rect(self.screen, btn_color, btn_rect, border_radius=10)
-            pygame.draw.rect(self.screen, WHITE, btn_rect, 3, border_radius=10)
-
-            label_text = self.font_small.render(f"{positions[i]}:", True, WHITE)
-            self.screen.blit(label_text, (btn_rect.x + 10, btn_rect.y + 10))
+    def draw_name_select(self, surface):
+        self.draw_centered_text(surface, self.font_title, "SELECT PLAYER NAMES", GOLD, 100)
 
-            name_text = self.font_medium.render(self.selected_names[i + 1], True, BLACK)
-            self.screen.blit(name_text, (btn_rect.centerx - name_text.get_width()//2,
-                                        btn_rect.centery - name_text.get_height()//2 + 5))
+        for i, button in enumerate(self.name_buttons):
+            button.draw(surface, self.selected_names[i + 1], self.button_hover == f"name_{i}")
 
-        start_btn = pygame.Rect(SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT - 150, 200, 60)
-        is_hover = start_btn.collidepoint(mouse_pos)
+        self.start_button.draw(surface, "START GAME", self.button_hover == "start_game")
 
-        btn_color = WHITE if is_hover else GOLD
-        pygame.draw.rect(self.screen, btn_color, start_btn, border_radius=10)
-        pygame.draw.rect(self.screen, GOLD if is_hover else WHITE, start_btn, 3, border_radius=10)
+        self.draw_centered_text(surface, self.font_small, "Click on names to randomize", GRAY,
+                                SCREEN_HEIGHT - 80)
 
-        btn_text = self.font_large.render("START GAME", True, BLACK)
-        self.screen.blit(btn_text, (start_btn.centerx - btn_text.get_width()//2,
-                                    start_btn.centery - btn_text.get_height()//2))
+    def draw_game_over(self, surface):
+        self.draw_centered_text(surface, self.font_title, "GAME OVER", BLACK, 203, 3)
+        self.draw_centered_text(surface, self.font_title, "GAME OVER", GOLD, 200)
 
-        hint = self.font_small.render("Click on names to randomize", True, GRAY)
-        self.screen.blit(hint, (SCREEN_WIDTH//2 - hint.get_width()//2, SCREEN_HEIGHT - 80))
+        winner = f"{self.engine.players[0].name} & {self.engine.players[2].name}" if self.engine.team_scores[0] > self.engine.team_scores[1] else f"{self.engine.players[1].name} & {self.engine.players[3].name}"
+        self.draw_centered_text(surface, self.font_large, f"{winner} WIN!", WHITE, 300)
 
-    def draw_game_over(self):
-        title = self.font_title.render("GAME OVER", True, GOLD)
-        shadow = self.font_title.render("GAME OVER", True, BLACK)
-        self.screen.blit(shadow, (SCREEN_WIDTH//2 - title.get_width()//2 + 3, 203))
-        self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 200))
+        score_text = f"{self.engine.players[0].name} & {self.engine.players[2].name}: {self.engine.team_scores[0]} | {self.engine.players[1].name} & {self.engine.players[3].name}: {self.engine.team_scores[1]}"
+        self.draw_centered_text(surface, self.font_medium, score_text, WHITE, 370)
 
-        winner = f"{self.players[0].name} & {self.players[2].name}" if self.team_scores[0] > self.team_scores[1] else f"{self.players[1].name} & {self.players[3].name}"
-        winner_text = self.font_large.render(f"{winner} WIN!", True, WHITE)
-        self.screen.blit(winner_text, (SCREEN_WIDTH//2 - winner_text.get_width()//2, 300))
-
-        score_text = self.font_medium.render(
-            f"{self.players[0].name} & {self.players[2].name}: {self.team_scores[0]} | {self.players[1].name} & {self.players[3].name}: {self.team_scores[1]}",
-            True, WHITE)
-        self.screen.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, 370))
-
-        click_text = self.font_small.render("Click anywhere to return to menu", True, GRAY)
-        self.screen.blit(click_text, (SCREEN_WIDTH//2 - click_text.get_width()//2, 500))
-
-    def draw_game(self):
-        pygame.draw.rect(self.screen, DARK_GREEN, (0, 0, SCREEN_WIDTH, 40))
-        score_text = f"{self.players[0].name} & {self.players[2].name}: {self.team_scores[0]} (Bags: {self.team_bags[0]}) | "                     f"{self.players[1].name} & {self.players[3].name}: {self.team_scores[1]} (Bags: {self.team_bags[1]})"
-        score_surf = self.font_small.render(score_text, True, GOLD)
-        self.screen.blit(score_surf, (10, 10))
-
-        for player in self.players:
-            self.draw_player_info(player)
+        self.draw_centered_text(surface, self.font_small, "Click anywhere to return to menu", GRAY, 500)
 
+    def draw_game(self, surface):
+        profiler = self.profiler
+        self.draw_table(surface)
+        if profiler is not None:
+            profiler.mark("table")
+        if self.textures is not None:
+            self.textures.draw_cards(self.get_draw_cards())
+        else:
+            for card in self.get_draw_cards():
+                card.draw(surface, self.atlas)
+        if profiler is not None:
+            profiler.mark("cards")
+        self.draw_bid_panel(surface)
+        if profiler is not None:
+            profiler.mark("overlays")
+
+    def draw_table(self, surface):
+        score_text = f"{self.engine.players[0].name} & {self.engine.players[2].name}: {self.engine.team_scores[0]} (Bags: {self.engine.team_bags[0]}) | "                     f"{self.engine.players[1].name} & {self.engine.players[3].name}: {self.engine.team_scores[1]} (Bags: {self.engine.team_bags[1]})"
+        self.score_bar.draw(surface, score_text)
+
+        for player in self.engine.players:
+            self.draw_player_info(surface, player)
+
+    def get_table_key(self):
+        return (tuple(self.engine.team_scores), tuple(self.engine.team_bags), self.engine.current_player_idx,
+                tuple((p.name, p.bid, p.tricks_won) for p in self.engine.players))
+
+    def get_draw_cards(self):
+        sprites = self.sprites
         all_cards = []
-        for player in self.players:
-            all_cards.extend(player.hand)
-        for player, card in self.trick_pile:
-            all_cards.append(card)
+        for player in self.engine.players:
+            all_cards.extend(sprites[card] for card in player.hand)
+        for player, card in self.engine.trick_pile:
+            all_cards.append(sprites[card])
 
         all_cards.sort(key=lambda c: (c.draw_order, c.hover_offset))
+        return all_cards
 
-        for card in all_cards:
-            card.draw(self.screen, self.font_card, self.font_small)
-
-        if self.state == STATE_BID:
-            human = self.players[0]
-            if self.current_player_idx == 0 and human.bid is None:
-                mouse_pos = pygame.mouse.get_pos()
-
-                bg_rect = pygame.Rect(SCREEN_WIDTH//2 - 280, SCREEN_HEIGHT//2 + 30, 560, 110)
-                pygame.draw.rect(self.screen, DARK_GREEN, bg_rect, border_radius=10)
-                pygame.draw.rect(self.screen, GOLD, bg_rect, 3, border_radius=10)
-
-                prompt = self.font_medium.render("Choose your bid:", True, WHITE)
-                self.screen.blit(prompt, (SCREEN_WIDTH//2 - prompt.get_width()//2,
-                                         SCREEN_HEIGHT//2 + 45))
-
-                for bid in range(1, 8):
-                    btn_x = SCREEN_WIDTH // 2 - 250 + (bid - 1) * 75
-                    btn_rect = pygame.Rect(btn_x, SCREEN_HEIGHT // 2 + 80, 60, 50)
-                    is_hover = btn_rect.collidepoint(mouse_pos)
-
-                    btn_color = WHITE if is_hover else GOLD
-                    pygame.draw.rect(self.screen, btn_color, btn_rect, border_radius=5)
-                    pygame.draw.rect(self.screen, GOLD if is_hover else WHITE, btn_rect, 2, border_radius=5)
-
-                    bid_text = self.font_large.render(str(bid), True, BLACK)
-                    self.screen.blit(bid_text, (btn_rect.centerx - bid_text.get_width()//2,
-                                               btn_rect.centery - bid_text.get_height()//2))
-
-    def draw_player_info(self, player):
-        positions = {
-            0: (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 180),
-            1: (80, SCREEN_HEIGHT // 2),
-            2: (SCREEN_WIDTH // 2, 150),
-            3: (SCREEN_WIDTH - 80, SCREEN_HEIGHT // 2)
-        }
-
-        x, y = positions[player.position]
+    def is_bid_panel_visible(self):
+        return self.state == STATE_BID and self.engine.needs_input()
 
-        info_rect = pygame.Rect(x - 70, y - 25, 140, 70)
-        is_current = self.current_player_idx == player.position
+    def get_bid_panel_rect(self):
+        return self.bid_panel.rect
 
-        if is_current:
-            glow_surf = pygame.Surface((160, 90), pygame.SRCALPHA)
-            pygame.draw.rect(glow_surf, (*GOLD, 100), glow_surf.get_rect(), border_radius=10)
-            self.screen.blit(glow_surf, (info_rect.x - 10, info_rect.y - 10))
+    def draw_bid_panel(self, surface):
+        if self.is_bid_panel_visible():
+            self.bid_panel.draw(surface)
 
-        color = GOLD if is_current else DARK_GREEN
-        pygame.draw.rect(self.screen, color, info_rect, border_radius=5)
-        pygame.draw.rect(self.screen, WHITE, info_rect, 2, border_radius=5)
+            self.draw_centered_text(surface, self.font_medium, "Choose your bid:", WHITE,
+                                    SCREEN_HEIGHT//2 + 45)
 
-        name_surf = self.font_small.render(player.name, True, WHITE)
-        bid_text = f"Bid: {player.bid if player.bid else '?'}"
-        bid_surf = self.font_small.render(bid_text, True, WHITE)
-        tricks_surf = self.font_small.render(f"Won: {player.tricks_won}", True, WHITE)
+            for bid, button in enumerate(self.bid_buttons, 1):
+                button.draw(surface, str(bid), self.button_hover == f"bid_{bid}")
 
-        self.screen.blit(name_surf, (x - name_surf.get_width()//2, y - 15))
-        self.screen.blit(bid_surf, (x - bid_surf.get_width()//2, y + 5))
-        self.screen.blit(tricks_surf, (x - tricks_surf.get_width()//2, y + 25))
+    def draw_player_info(self, surface, player):
+        is_current = self.engine.current_player_idx == player.position
+        self.player_panels[player.position].draw(surface, player.name, player.bid,
+                                                 player.tricks_won, is_current)
 
     def run(self):
         running = True
+        profiler = self.profiler
+        startup = self.startup
         while running:
+            timeout = self.get_idle_timeout()
+            if timeout:
+                self.wait_idle(timeout)
+                if profiler is not None:
+                    profiler.mark("wait")
             running = self.handle_input()
+            if profiler is not None:
+                profiler.mark("input")
             self.update()
+            if profiler is not None:
+                profiler.mark("update")
             self.draw()
+            if startup is not None:
+                startup.mark("first frame")
+                print(startup.report())
+                startup = None
+                self.assets.save_font_index()
+        self.thinker.close()
+        self.assets.save_font_index()
+        self.save_card_assets()
+        if self.record_writer is not None:
+            self.close_recorder()
+            self.record_writer.close()
         pygame.quit()
 
-if __name__ == "__main__":
-    game = Game()
+def parse_speed(text):
+    if text == "instant":
+        return INSTANT
+    speed = float(text)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive")
+    return speed
+
+def main():
+    startup = StartupProfile(IMPORT_START)
+    startup.mark("imports")
+    parser = argparse.ArgumentParser(description="Spades card game")
+    parser.add_argument("--atlas-stats", action="store_true",
+                        help="print card sprite atlas memory and hit/miss counts on exit")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw and push only the screen regions that changed")
+    parser.add_argument("--show-dirty", action="store_true",
+                        help="outline dirty regions and show pixels pushed per frame (toggle with F2)")
+    parser.add_argument("--animation-stats", action="store_true",
+                        help="print how many cards the animator updated per frame on exit")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="game speed multiplier for AI turns and transitions, or 'instant' (cycle with F4)")
+    parser.add_argument("--watch", action="store_true", help="let the computer play all four seats")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each frame phase; F3 shows percentiles and a frame-time graph")
+    parser.add_argument("--profile-out", default="frame_profile.json", metavar="PATH",
+                        help="where --profile writes the recorded frames on exit")
+    parser.add_argument("--record", metavar="PATH",
+                        help="append every game played to a binary game record (see record.py)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print where the time to the first frame went, and how the card sprites loaded")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="where the font index and pre-rendered card sprites are kept")
+    parser.add_argument("--simulate", type=int, metavar="N",
+                        help="play N all-AI games headless as fast as possible and report throughput")
+    parser.add_argument("--ai", metavar="NAME",
+                        help="computer player to use instead of the bid table AI (any tournament.py variant, "
+                             "e.g. montecarlo)")
+    parser.add_argument("--sync-ai", action="store_true",
+                        help="make the computer players' decisions in the frame loop instead of on a worker thread")
+    parser.add_argument("--ai-stats", action="store_true",
+                        help="print AI thinking time and the frames missed while waiting for it on exit")
+    parser.add_argument("--fixed-fps", action="store_true",
+                        help="draw every frame at 60 FPS even when nothing on screen is changing")
+    parser.add_argument("--cpu-stats", action="store_true",
+                        help="print CPU time used per minute and how much of the time the frame loop slept on exit")
+    parser.add_argument("--render-scale", type=float, default=1.0, metavar="S",
+                        help="draw the scene at S times the 1400x800 layout and scale it to the window (e.g. 0.5)")
+    parser.add_argument("--window-scale", type=float, default=1.0, metavar="S",
+                        help="make the window S times the 1400x800 layout (e.g. 1.5 on a large display)")
+    parser.add_argument("--renderer", choices=("surface", "texture", "software"), default="surface",
+                        help="draw with surface blits, or with textures through SDL's renderer "
+                             "('software' forces SDL's software renderer)")
+    parser.add_argument("--seed", type=int, help="random seed for the deals, in the game or with --simulate")
+    parser.add_argument("--max-rounds", type=int, default=rules.SIMULATION_MAX_ROUNDS,
+                        help="end a simulated game after this many rounds if nobody reached 500")
+    args = parser.parse_args()
+
+    if args.simulate is not None:
+        result = rules.simulate(args.simulate, seed=args.seed, max_rounds=args.max_rounds)
+        print(f"Simulated {result['games']} games ({result['rounds']} rounds) in {result['seconds']:.2f} s: "
+              f"{result['games_per_second']:.0f} games/s, {result['rounds_per_second']:.0f} rounds/s")
+        print(f"Team wins: {result['team_wins'][0]} / {result['team_wins'][1]}, "
+              f"average {result['average_rounds']:.1f} rounds, average margin {result['average_margin']:.0f}, "
+              f"{result['unfinished']} stopped at {args.max_rounds} rounds")
+        return
+
+    if min(args.render_scale, args.window_scale) <= 0:
+        parser.error("--render-scale and --window-scale must be positive")
+    if args.dirty_rects and (args.render_scale != 1.0 or args.window_scale != 1.0):
+        parser.error("--dirty-rects updates the window directly and cannot be combined with "
+                     "--render-scale or --window-scale")
+    if args.renderer != "surface":
+        if video is None:
+            parser.error("--renderer texture needs pygame._sdl2, which this pygame does not have")
+        if args.dirty_rects or args.render_scale != 1.0:
+            parser.error("--renderer texture scales as it draws and cannot be combined with "
+                         "--dirty-rects or --render-scale")
+
+    ai_policy = None
+    if args.ai is not None:
+        # Imported only when asked for, since the search AIs bring in multiprocessing.
+        import tournament
+        if args.ai not in tournament.POLICIES:
+            parser.error(f"--ai must be one of: {', '.join(sorted(tournament.POLICIES))}")
+        ai_policy = tournament.POLICIES[args.ai]()
+
+    game = Game(dirty_rects=args.dirty_rects, show_dirty_regions=args.show_dirty, speed=args.speed,
+                watch=args.watch, profile=args.profile, seed=args.seed,
+                record_path=args.record, cache_dir=args.cache_dir,
+                startup=startup if args.startup_profile else None,
+                ai_policy=ai_policy, threaded_ai=not args.sync_ai, fixed_fps=args.fixed_fps,
+                render_scale=args.render_scale, window_scale=args.window_scale, renderer=args.renderer)
+    run_start = time.perf_counter()
+    cpu_start = time.process_time()
     game.run()
+    cpu_seconds = time.process_time() - cpu_start
+    run_seconds = time.perf_counter() - run_start
+
+    if game.profiler is not None:
+        game.profiler.dump(args.profile_out)
+        summary = game.profiler.get_summary()
+        print(f"Frame profile: {summary['frames']} frames, {summary['missed_frames']} missed, frame time "
+              f"p50 {summary['frame']['p50']:.1f} ms, p99 {summary['frame']['p99']:.1f} ms; "
+              f"wrote {args.profile_out}")
+
+    if args.atlas_stats and game.textures is not None:
+        stats = game.textures.get_stats()
+        print(f"Textures: {stats['textures']} alive, {stats['uploads']} uploaded")
+    elif args.atlas_stats and game.atlas is not None:
+        stats = game.atlas.get_stats()
+        print(f"Card atlas: {stats['sprites']} sprites, {stats['memory_bytes'] / 1024 / 1024:.1f} MiB, "
+              f"{stats['hits']} hits, {stats['unpacked']} unpacked from the cache, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate)")
+
+    if args.cpu_stats:
+        print(f"CPU: {cpu_seconds:.1f} s over {run_seconds / 60:.1f} min "
+              f"({cpu_seconds / run_seconds * 60:.1f} CPU s per minute), "
+              f"frame loop asleep {game.idle_seconds / run_seconds:.0%} of the time")
+
+    if args.ai_stats:
+        stats = game.thinker.get_stats()
+        print(f"AI: {stats['decisions']} decisions ({stats['cancelled']} cancelled), thinking "
+              f"{stats['average_think_ms']:.2f} ms on average, {stats['max_think_ms']:.1f} ms at most; "
+              f"{stats['missed_frames']} frames missed over {stats['frames_waiting']} frames waiting, "
+              f"{stats['blocked_ms']:.0f} ms blocked")
+
+    if args.animation_stats and game.animator is not None:
+        stats = game.animator.get_stats()
+        print(f"Animator: {stats['average_animated']:.1f} cards animated per frame on average, "
+              f"{stats['max_animated']} at most, over {stats['frames']} frames")
+
+if __name__ == "__main__":
+    main()
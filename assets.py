@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+import pygame
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "spades")
+FONT_INDEX_NAME = "fonts.json"
+SPRITES_MAGIC = b"SPS2"
+# Per sprite: key fields (255 for None), width, height and the size of the zlib-compressed RGBA
+# pixels that follow. Card sprites are mostly flat color and compress about 30 times.
+SPRITE_HEADER = struct.Struct("<BBBBHHI")
+NONE_FIELD = 255
+
+class PackedSprite:
+    """A cached sprite's size and compressed pixels, not made into a surface until it is drawn."""
+
+    __slots__ = ("size", "data")
+
+    def __init__(self, size, data):
+        self.size = size
+        self.data = data
+
+def content_hash(paths, *extra):
+    digest = hashlib.sha1(pygame.version.ver.encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    for value in extra:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()[:16]
+
+def font_stamp(path):
+    # Fonts are identified by path, size and modification time rather than hashed in full.
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+class AssetCache:
+    """Font lookups and pre-rendered sprites kept on disk between runs.
+
+    SysFont enumerates every installed font (fc-list on Linux) the first time it is
+    called; the font index remembers which file and synthetic styles it picked, so
+    later runs open the file directly. Sprite sheets are stored under a content
+    hash of their inputs, so editing the drawing code or the font starts a new one.
+    Any cache file that cannot be read or written is treated as missing.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.font_index = None
+        self.font_index_dirty = False
+        self.font_hits = 0
+        self.font_misses = 0
+
+    def get_path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def load_font_index(self):
+        self.font_index = {}
+        try:
+            with open(self.get_path(FONT_INDEX_NAME)) as f:
+                data = json.load(f)
+            if data.get("pygame") == pygame.version.ver:
+                self.font_index = data["fonts"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save_font_index(self):
+        if not self.font_index_dirty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = self.get_path(FONT_INDEX_NAME + ".tmp")
+            with open(temp_path, "w") as f:
+                json.dump({"pygame": pygame.version.ver, "fonts": self.font_index}, f, indent=1)
+            os.replace(temp_path, self.get_path(FONT_INDEX_NAME))
+            self.font_index_dirty = False
+        except OSError:
+            pass
+
+    def resolve_font(self, name, size, bold=False, italic=False):
+        if self.font_index is None:
+            self.load_font_index()
+        key = f"{name}|{size}|{int(bold)}|{int(italic)}"
+        entry = self.font_index.get(key)
+        if entry is not None and (entry[0] is None or os.path.exists(entry[0])):
+            self.font_hits += 1
+            return entry
+        self.font_misses += 1
+        entry = pygame.font.SysFont(name, size, bold, italic,
+                                    constructor=lambda path, size, set_bold, set_italic: [path, set_bold, set_italic])
+        self.font_index[key] = entry
+        self.font_index_dirty = True
+        return entry
+
+    def load_font(self, name, size, bold=False, italic=False):
+        path, set_bold, set_italic = self.resolve_font(name, size, bold, italic)
+        font = pygame.font.Font(path, size)
+        if set_bold:
+            font.set_bold(True)
+        if set_italic:
+            font.set_italic(True)
+        return font
+
+    def load_sprites(self, name, key_hash, decode_key):
+        # Sprites stay compressed until unpack_sprite is called on them, when they are first drawn.
+        try:
+            with open(self.get_path(f"{name}-{key_hash}.bin"), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if data[:len(SPRITES_MAGIC)] != SPRITES_MAGIC:
+            return None
+        sprites = {}
+        offset = len(SPRITES_MAGIC)
+        try:
+            while offset < len(data):
+                *fields, width, height, size = SPRITE_HEADER.unpack_from(data, offset)
+                offset += SPRITE_HEADER.size
+                if offset + size > len(data):
+                    return None
+                key = decode_key([None if field == NONE_FIELD else field for field in fields])
+                sprites[key] = PackedSprite((width, height), data[offset:offset + size])
+                offset += size
+        except (struct.error, ValueError):
+            return None
+        return sprites
+
+    def save_sprites(self, name, key_hash, sprites, encode_key):
+        # sprites may mix surfaces and PackedSprites loaded earlier and never drawn.
+        chunks = [SPRITES_MAGIC]
+        for key, sprite in sprites.items():
+            packed = sprite if isinstance(sprite, PackedSprite) else pack_sprite(sprite)
+            fields = [NONE_FIELD if field is None else field for field in encode_key(key)]
+            chunks.append(SPRITE_HEADER.pack(*fields, *packed.size, len(packed.data)))
+            chunks.append(packed.data)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.get_path(f"{name}-{key_hash}.bin")
+            with open(path + ".tmp", "wb") as f:
+                f.write(b"".join(chunks))
+            os.replace(path + ".tmp", path)
+            # Sheets from older versions of the inputs are never read again.
+            for old in os.listdir(self.cache_dir):
+                if old.startswith(f"{name}-") and old.endswith(".bin") and old != os.path.basename(path):
+                    os.remove(self.get_path(old))
+        except OSError:
+            pass
+
+def pack_sprite(sprite):
+    return PackedSprite(sprite.get_size(), zlib.compress(pygame.image.tobytes(sprite, "RGBA"), 1))
+
+def unpack_sprite(packed):
+    try:
+        sprite = pygame.image.frombytes(zlib.decompress(packed.data), packed.size, "RGBA")
+    except (zlib.error, ValueError):
+        return None
+    if pygame.display.get_surface() is not None:
+        # In the display's pixel format, as freshly drawn sprites are, so blits need no conversion.
+        sprite = sprite.convert_alpha()
+    return sprite
+
+class LazyFont:
+    """A font attribute that is opened through the owner's asset cache on first use."""
+
+    def __init__(self, name, size, bold=False, italic=False):
+        self.name = name
+        self.size = size
+        self.bold = bold
+        self.italic = italic
+
+    def __set_name__(self, owner, attr):
+        self.attr = attr
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        font = instance.assets.load_font(self.name, self.size, self.bold, self.italic)
+        instance.__dict__[self.attr] = font
+        return font
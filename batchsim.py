@@ -0,0 +1,242 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+import rules
+from bitboard import RANKS_PER_SUIT, SPADES, HAND_SUIT_ORDER, BID_MASK, hand_to_mask
+from rules import NUM_PLAYERS, MIN_BID, MAX_BID, BAG_LIMIT, BAG_PENALTY
+
+NUM_CARDS = RANKS_PER_SUIT * len(rules.SUITS)
+
+CARD_SUITS = np.arange(NUM_CARDS) // RANKS_PER_SUIT
+CARD_RANKS = np.arange(NUM_CARDS) % RANKS_PER_SUIT
+SUIT_COLUMNS = CARD_SUITS[None, :] == np.arange(len(rules.SUITS))[:, None]
+SPADE_COLUMNS = SUIT_COLUMNS[SPADES]
+BID_COLUMNS = np.array([bool(BID_MASK >> i & 1) for i in range(NUM_CARDS)])
+
+# Lowest card first, ties broken in sort_hand suit order, matching Player.make_ai_play.
+PLAY_PRIORITY = (CARD_RANKS * len(rules.SUITS) + np.argsort(HAND_SUIT_ORDER)[CARD_SUITS]).astype(np.uint8)
+NOT_PLAYABLE = np.uint8(NUM_CARDS)
+
+# BEATS[winner, card] is True when card takes the trick from the current winning card.
+BEATS = ((CARD_SUITS[None, :] == CARD_SUITS[:, None]) & (CARD_RANKS[None, :] > CARD_RANKS[:, None])) | \
+        ((CARD_SUITS[None, :] == SPADES) & (CARD_SUITS[:, None] != SPADES))
+
+TEAM_SEATS = [(0, 2), (1, 3)]
+
+def random_deals(num_tables, seed=None):
+    rng = np.random.default_rng(seed)
+    order = rng.permuted(np.tile(np.arange(NUM_CARDS), (num_tables, 1)), axis=1)
+    hands = np.zeros((num_tables, NUM_PLAYERS, NUM_CARDS), dtype=bool)
+    seats = np.arange(NUM_CARDS) % NUM_PLAYERS
+    hands[np.arange(num_tables)[:, None], seats[None, :], order] = True
+    return hands
+
+def masks_to_hands(deals):
+    hands = np.zeros((len(deals), NUM_PLAYERS, NUM_CARDS), dtype=bool)
+    for table, masks in enumerate(deals):
+        for seat, mask in enumerate(masks):
+            hands[table, seat] = [bool(mask >> i & 1) for i in range(NUM_CARDS)]
+    return hands
+
+def choose_lowest(candidates):
+    return np.where(candidates, PLAY_PRIORITY, NOT_PLAYABLE).argmin(axis=1)
+
+def make_bids(hands):
+    return np.clip((hands & BID_COLUMNS).sum(axis=2), MIN_BID, MAX_BID)
+
+def play_round(hands, dealer, spades_broken):
+    num_tables = hands.shape[0]
+    tables = np.arange(num_tables)
+    hands = hands.copy()
+    spades_broken = np.array(spades_broken, dtype=bool, copy=True)
+    leader = (np.asarray(dealer) + 1) % NUM_PLAYERS * np.ones(num_tables, dtype=np.int64)
+    tricks = np.zeros((num_tables, NUM_PLAYERS), dtype=np.int64)
+    piles = np.zeros((num_tables, RANKS_PER_SUIT, NUM_PLAYERS), dtype=np.int64)
+
+    for trick in range(RANKS_PER_SUIT):
+        seat = leader
+        hand = hands[tables, seat]
+        non_spades = hand & ~SPADE_COLUMNS
+        lead_any = spades_broken | ~non_spades.any(axis=1)
+        card = choose_lowest(np.where(lead_any[:, None], hand, non_spades))
+
+        lead_suit = CARD_SUITS[card]
+        spades_broken |= lead_suit == SPADES
+        winner_card = card
+        winner_seat = seat
+        hands[tables, seat, card] = False
+        piles[:, trick, 0] = card
+
+        for turn in range(1, NUM_PLAYERS):
+            seat = (leader + turn) % NUM_PLAYERS
+            hand = hands[tables, seat]
+            follow = hand & SUIT_COLUMNS[lead_suit]
+            valid = np.where(follow.any(axis=1)[:, None], follow, hand)
+            beats = valid & BEATS[winner_card]
+            card = choose_lowest(np.where(beats.any(axis=1)[:, None], beats, valid))
+
+            takes = BEATS[winner_card, card]
+            winner_card = np.where(takes, card, winner_card)
+            winner_seat = np.where(takes, seat, winner_seat)
+            hands[tables, seat, card] = False
+            piles[:, trick, turn] = card
+
+        tricks[tables, winner_seat] += 1
+        leader = winner_seat
+
+    return tricks, piles, spades_broken
+
+def score_round(bids, tricks, team_bags):
+    team_bags = np.array(team_bags, dtype=np.int64, copy=True)
+    bags = np.zeros_like(team_bags)
+    deltas = np.zeros_like(team_bags)
+    for team, seats in enumerate(TEAM_SEATS):
+        total_bid = bids[:, seats].sum(axis=1)
+        total_won = tricks[:, seats].sum(axis=1)
+        made = total_won >= total_bid
+
+        bags[:, team] = np.where(made, total_won - total_bid, 0)
+        team_bags[:, team] += bags[:, team]
+        bagged_out = made & (team_bags[:, team] >= BAG_LIMIT)
+        team_bags[:, team] -= np.where(bagged_out, BAG_LIMIT, 0)
+
+        points = np.where(made, total_bid * 10 + bags[:, team], -total_bid * 10)
+        deltas[:, team] = points - np.where(bagged_out, BAG_PENALTY, 0)
+    return bags, deltas, team_bags
+
+def simulate_round(hands, dealer=0, spades_broken=False, team_bags=None):
+    num_tables = hands.shape[0]
+    if team_bags is None:
+        team_bags = np.zeros((num_tables, 2), dtype=np.int64)
+    spades_broken = np.broadcast_to(spades_broken, (num_tables,))
+
+    bids = make_bids(hands)
+    tricks, piles, spades_broken = play_round(hands, dealer, spades_broken)
+    bags, deltas, team_bags = score_round(bids, tricks, team_bags)
+    return {
+        "bids": bids,
+        "tricks": tricks,
+        "piles": piles,
+        "bags": bags,
+        "score_deltas": deltas,
+        "team_bags": team_bags,
+        "spades_broken": spades_broken,
+    }
+
+def simulate(num_tables, num_rounds, seed=None):
+    rng = np.random.default_rng(seed)
+    scores = np.zeros((num_tables, 2), dtype=np.int64)
+    team_bags = np.zeros((num_tables, 2), dtype=np.int64)
+    spades_broken = np.zeros(num_tables, dtype=bool)
+    bid_total = 0
+    made_bids = 0
+    bag_total = 0
+
+    start = time.perf_counter()
+    for round_idx in range(num_rounds):
+        hands = random_deals(num_tables, rng)
+        result = simulate_round(hands, round_idx % NUM_PLAYERS, spades_broken, team_bags)
+        scores += result["score_deltas"]
+        team_bags = result["team_bags"]
+        spades_broken = result["spades_broken"]
+
+        bid_total += int(result["bids"].sum())
+        bag_total += int(result["bags"].sum())
+        for seats in TEAM_SEATS:
+            made_bids += int((result["tricks"][:, seats].sum(axis=1) >= result["bids"][:, seats].sum(axis=1)).sum())
+    elapsed = time.perf_counter() - start
+
+    rounds = num_tables * num_rounds
+    return {
+        "tables": num_tables,
+        "rounds": rounds,
+        "seconds": elapsed,
+        "rounds_per_second": rounds / elapsed if elapsed else 0.0,
+        "average_bid": bid_total / (rounds * NUM_PLAYERS) if rounds else 0.0,
+        "contracts_made": made_bids / (rounds * 2) if rounds else 0.0,
+        "bags_per_team_round": bag_total / (rounds * 2) if rounds else 0.0,
+        "average_score": scores.mean(axis=0).tolist(),
+    }
+
+def play_scalar_round(engine):
+    start = {
+        "hands": [hand_to_mask(p.hand) for p in engine.players],
+        "dealer": engine.dealer_idx,
+        "spades_broken": engine.spades_broken,
+        "team_bags": list(engine.team_bags),
+        "team_scores": list(engine.team_scores),
+    }
+    while engine.state != rules.STATE_ROUND_END:
+        engine.step()
+    return start, {
+        "bids": [p.bid for p in engine.players],
+        "tricks": [p.tricks_won for p in engine.players],
+        # The cards of each trick in play order, as bitboard indices, like play_round's piles.
+        "piles": [[card.index for _, card, _, _ in engine.round_plays[first:first + NUM_PLAYERS]]
+                  for first in range(0, len(engine.round_plays), NUM_PLAYERS)],
+        "score_deltas": [engine.team_scores[t] - start["team_scores"][t] for t in range(2)],
+        "team_bags": list(engine.team_bags),
+        "spades_broken": engine.spades_broken,
+    }
+
+def validate(num_tables, num_rounds, seed=None):
+    seeds = random.Random(seed)
+    rounds = [[] for _ in range(num_rounds)]
+    for _ in range(num_tables):
+        engine = rules.Engine(seed=seeds.getrandbits(64))
+        engine.start_game()
+        for round_idx in range(num_rounds):
+            rounds[round_idx].append(play_scalar_round(engine))
+            engine.finish_round()
+            if engine.state == rules.STATE_GAME_OVER:
+                break
+
+    checked = 0
+    mismatches = 0
+    mismatched_fields = set()
+    for played in rounds:
+        if not played:
+            continue
+        starts = [start for start, expected in played]
+        result = simulate_round(masks_to_hands([s["hands"] for s in starts]),
+                                np.array([s["dealer"] for s in starts]),
+                                np.array([s["spades_broken"] for s in starts]),
+                                np.array([s["team_bags"] for s in starts]))
+        for table, (start, expected) in enumerate(played):
+            actual = {key: result[key][table].tolist() for key in expected}
+            if actual != expected:
+                mismatches += 1
+                mismatched_fields.update(key for key in expected if actual[key] != expected[key])
+        checked += len(played)
+    return {"rounds_checked": checked, "mismatches": mismatches, "mismatched_fields": sorted(mismatched_fields)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many Spades deals in lockstep with NumPy")
+    parser.add_argument("--tables", type=int, default=10000, help="number of tables simulated together")
+    parser.add_argument("--rounds", type=int, default=10, help="rounds played at every table")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--validate", action="store_true",
+                        help="check results against the scalar rules engine on the same seeds")
+    args = parser.parse_args()
+
+    if args.validate:
+        result = validate(args.tables, args.rounds, args.seed)
+        status = "OK" if result["mismatches"] == 0 else "FAILED"
+        print(f"Validated {result['rounds_checked']} rounds against rules.Engine: "
+              f"{result['mismatches']} mismatches ({status})")
+        if result["mismatched_fields"]:
+            print(f"Differing: {', '.join(result['mismatched_fields'])}")
+        raise SystemExit(1 if result["mismatches"] else 0)
+
+    result = simulate(args.tables, args.rounds, args.seed)
+    print(f"Simulated {result['rounds']} rounds on {result['tables']} tables in {result['seconds']:.2f} s "
+          f"({result['rounds_per_second']:.0f} rounds/s)")
+    print(f"Average bid {result['average_bid']:.2f}, contracts made {result['contracts_made']:.1%}, "
+          f"bags per team per round {result['bags_per_team_round']:.2f}, "
+          f"average score {result['average_score'][0]:.0f} / {result['average_score'][1]:.0f}")
+
+if __name__ == "__main__":
+    main()
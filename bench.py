@@ -0,0 +1,408 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks run without a window; a real driver can still be chosen from the environment.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import app
+import gamestate
+import rules
+from scheduler import INSTANT
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 15
+NUM_POSITIONS = 400
+CARD_MEMORY_ROUNDS = 10000
+# The games built for benchmarks write their sprite sheets here rather than to the user's cache;
+# the directory is removed when the script exits.
+CACHE_DIR = tempfile.TemporaryDirectory(prefix="spades-bench-")
+
+class FakeClock:
+    # Stands in for pygame.time.Clock so setup frames do not sleep to hold 60 FPS.
+    def tick(self, framerate=0):
+        return 1000 // app.FPS
+
+def make_game(seed, dirty_rects=False, render_scale=1.0, renderer="surface"):
+    game = app.Game(dirty_rects=dirty_rects, seed=seed, render_scale=render_scale, renderer=renderer,
+                    cache_dir=CACHE_DIR.name)
+    game.clock = FakeClock()
+    game.start_game()
+    game.selected_names = ["You", "Arjun", "Priya", "Rohan"]
+    game.finalize_game_start()
+    game.set_speed(INSTANT)
+    # Deal and let the computer bid until the human's bid panel is up and every card has landed.
+    while not (game.engine.needs_input() and not game.is_dealing()):
+        game.update()
+    game.message_timer = 0
+    return game
+
+def collect_positions(seed, count=NUM_POSITIONS):
+    # Every play decision of seeded AI games: a copy of the player to move, the lead
+    # suit, spades_broken, the trick so far and that player's legal cards.
+    rng = random.Random(seed)
+    positions = []
+    tricks = []
+    while len(positions) < count:
+        engine = rules.Engine(seed=rng.random())
+        engine.start_game()
+        while engine.state != rules.STATE_ROUND_END:
+            if engine.state == rules.STATE_PLAY:
+                current = engine.players[engine.current_player_idx]
+                player = rules.Player(current.name, current.position)
+                player.set_hand(list(current.hand))
+                valid = list(player.get_valid_moves(engine.lead_suit, engine.spades_broken))
+                positions.append((player, engine.lead_suit, engine.spades_broken, list(engine.trick_pile), valid))
+            elif engine.state == rules.STATE_TRICK_END:
+                tricks.append((list(engine.trick_pile), engine.lead_suit))
+            engine.step()
+    return positions[:count], tricks
+
+def bench_card_draw(seed, face_up, scale):
+    game = make_game(seed)
+    card = app.CardSprite(rules.Card("Hearts", 12))
+    card.face_up = face_up
+    card.is_playable = scale > 1.0
+    card.hovered = scale > 1.0
+    card.scale = scale
+    card.rect.topleft = (400, 300)
+    screen, atlas = game.screen, game.atlas
+
+    def run():
+        card.draw(screen, atlas)
+    return run
+
+def bench_game_draw(seed, dirty_rects=False, render_scale=1.0, renderer="surface"):
+    game = make_game(seed, dirty_rects, render_scale, renderer)
+    return game.draw
+
+def bench_card_update(seed):
+    rng = random.Random(seed)
+    cards = list(app.SpritePool())
+    dt = 1.0 / app.FPS
+    state = {"moving": 0}
+
+    def run():
+        # One frame of CardSprite.update for all 52 cards; cards are dealt again once they land.
+        if not state["moving"]:
+            for card in cards:
+                card.pos = [app.SCREEN_WIDTH / 2, app.SCREEN_HEIGHT / 2]
+                card.set_target(rng.uniform(0, app.SCREEN_WIDTH), rng.uniform(0, app.SCREEN_HEIGHT))
+        for card in cards:
+            card.update(dt)
+        state["moving"] = sum(card.is_moving for card in cards)
+    return run
+
+def cycle(items, action):
+    index = [0]
+
+    def run():
+        i = index[0]
+        action(*items[i])
+        index[0] = i + 1 if i + 1 < len(items) else 0
+    return run
+
+def bench_valid_moves(seed):
+    positions, _ = collect_positions(seed)
+    return cycle([(player, lead_suit, spades_broken) for player, lead_suit, spades_broken, _, _ in positions],
+                 lambda player, lead_suit, spades_broken: player.get_valid_moves(lead_suit, spades_broken))
+
+def bench_ai_play(seed):
+    positions, _ = collect_positions(seed)
+    return cycle([(player, valid, lead_suit, trick, spades_broken)
+                  for player, lead_suit, spades_broken, trick, valid in positions],
+                 lambda player, *args: player.make_ai_play(*args))
+
+def bench_end_trick(seed):
+    _, tricks = collect_positions(seed)
+    engine = rules.Engine(seed=seed)
+
+    def end_trick(trick, lead_suit):
+        engine.trick_pile = trick
+        engine.lead_suit = lead_suit
+        engine.end_trick()
+    return cycle(tricks, end_trick)
+
+def bench_deck(seed):
+    rng = random.Random(seed)
+
+    def run():
+        deck = rules.Deck()
+        deck.shuffle(rng)
+        deck.deal(rules.NUM_PLAYERS)
+    return run
+
+def bench_make_unmake(seed):
+    positions = []
+    for hands, bids, played in gamestate.record_playouts(50, seed):
+        state = gamestate.GameState(hands)
+        for bid in bids:
+            state.make_bid(bid)
+        positions.append((state, played))
+
+    def play_and_undo(state, played):
+        # One whole round applied move by move, then undone.
+        for index in played:
+            state.make_move(index)
+        for _ in played:
+            state.unmake_move()
+    return cycle(positions, play_and_undo)
+
+def bench_ai_round(seed):
+    rng = random.Random(seed)
+
+    def run():
+        engine = rules.Engine(seed=rng.random())
+        engine.start_game()
+        while engine.state != rules.STATE_ROUND_END:
+            engine.step()
+    return run
+
+# Name, operations per timed repeat, and the setup that returns one operation.
+BENCHMARKS = [
+    ("card_draw_face_up", 1000, lambda seed: bench_card_draw(seed, True, 1.0)),
+    ("card_draw_face_up_hover", 1000, lambda seed: bench_card_draw(seed, True, app.HOVER_SCALE)),
+    ("card_draw_face_up_mid_scale", 1000, lambda seed: bench_card_draw(seed, True, 1.04)),
+    ("card_draw_face_down", 1000, lambda seed: bench_card_draw(seed, False, 1.0)),
+    ("card_draw_face_down_hover", 1000, lambda seed: bench_card_draw(seed, False, app.HOVER_SCALE)),
+    ("game_draw_full_hands", 25, bench_game_draw),
+    ("game_draw_dirty_idle", 100, lambda seed: bench_game_draw(seed, True)),
+    ("game_draw_render_scale_075", 25, lambda seed: bench_game_draw(seed, render_scale=0.75)),
+    ("game_draw_render_scale_050", 25, lambda seed: bench_game_draw(seed, render_scale=0.5)),
+    ("game_draw_texture", 25, lambda seed: bench_game_draw(seed, renderer="software")),
+    ("card_update_deal", 100, bench_card_update),
+    ("get_valid_moves", NUM_POSITIONS * 5, bench_valid_moves),
+    ("make_ai_play", NUM_POSITIONS * 5, bench_ai_play),
+    ("end_trick", 1000, bench_end_trick),
+    ("deck_shuffle_deal", 250, bench_deck),
+    ("ai_round", 10, bench_ai_round),
+    ("gamestate_round_make_unmake", 100, bench_make_unmake),
+]
+
+class PerRoundCard:
+    # The layout cards had before they were shared, kept to compare against: every
+    # deal made 52 of these, with the card and its animation state in a __dict__.
+    def __init__(self, card):
+        self.suit = card.suit
+        self.value = card.value
+        self.display_value = card.display_value
+        self.color = app.RED if card.suit in ["Hearts", "Diamonds"] else app.BLACK
+        self.rect = pygame.Rect(0, 0, app.CARD_WIDTH, app.CARD_HEIGHT)
+        self.pos = [0.0, 0.0]
+        self.target_pos = [0.0, 0.0]
+        self.is_moving = False
+        self.face_up = False
+        self.hovered = False
+        self.is_playable = False
+        self.hover_offset = 0.0
+        self.target_hover_offset = 0.0
+        self.scale = 1.0
+        self.target_scale = 1.0
+        self.rotation = 0.0
+        self.target_rotation = 0.0
+        self.arc_height = 0.0
+        self.animation_progress = 1.0
+        self.start_pos = [0.0, 0.0]
+        self.shake_offset = 0.0
+        self.shake_timer = 0.0
+        self.shadow_offset = 3
+        self.draw_order = 0
+        self.animator = None
+        self.animation_slot = -1
+
+def play_rounds(rounds, seed, on_deal):
+    # Plays AI games back to back until `rounds` rounds are done; returns the number of deals.
+    engine = rules.Engine(seed=seed)
+    deals = [0]
+
+    def on_event(event):
+        if event[0] == rules.EVENT_DEAL:
+            deals[0] += 1
+            on_deal(engine)
+    engine.listeners.append(on_event)
+    engine.start_game()
+    played = 0
+    while played + engine.rounds_played < rounds:
+        if not engine.step():
+            played += engine.rounds_played
+            engine.start_game()
+    return deals[0]
+
+def measure_card_memory(rounds=CARD_MEMORY_ROUNDS, seed=1):
+    """Plays AI rounds making new card objects for every deal, then resetting one sprite pool.
+
+    Each way runs twice: untraced for the time, then under tracemalloc for the peak
+    memory of play. The engine deals the shared rules cards both
+    times, so the difference is the per-card objects alone.
+    """
+    results = {}
+    for mode in ("per_round", "pooled"):
+        tracemalloc.start()
+        if mode == "pooled":
+            pool = app.SpritePool()
+
+            def on_deal(engine):
+                pool.reset()
+        else:
+            live = [[PerRoundCard(card) for card in rules.CARDS]]
+
+            def on_deal(engine):
+                live[0] = [PerRoundCard(card) for card in engine.deck.cards]
+        deck_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        deals = play_rounds(rounds, seed, on_deal)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        play_rounds(rounds, seed, on_deal)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        decks_made = 1 + (deals if mode == "per_round" else 0)
+        results[mode] = {
+            "rounds": rounds,
+            "deals": deals,
+            "card_objects": decks_made * len(rules.CARDS),
+            "deck_bytes": deck_bytes,
+            "card_bytes_allocated": decks_made * deck_bytes,
+            "peak_traced_bytes": peak_bytes,
+            "seconds": seconds,
+        }
+    return results
+
+def print_card_memory(results):
+    per_round, pooled = results["per_round"], results["pooled"]
+    print(f"Card objects over {per_round['rounds']} AI rounds ({per_round['deals']} deals)")
+    print(f"  {'':28s} {'per round':>14s} {'pooled':>14s}")
+    rows = [
+        ("Card objects made", "card_objects", "{:,}"),
+        ("Bytes per deck", "deck_bytes", "{:,}"),
+        ("Card bytes allocated", "card_bytes_allocated", "{:,}"),
+        ("Peak memory in play (bytes)", "peak_traced_bytes", "{:,}"),
+        ("Seconds", "seconds", "{:.2f}"),
+    ]
+    for label, key, spec in rows:
+        cells = [spec.format(result[key]) for result in (per_round, pooled)]
+        print(f"  {label:28s} {cells[0]:>14s} {cells[1]:>14s}")
+
+def summarize(number, times):
+    return {
+        "ops": number * len(times),
+        "us_per_op": min(times) * 1e6,
+        "median_us": statistics.median(times) * 1e6,
+        "ops_per_second": 1 / min(times),
+    }
+
+def run_benchmarks(names=None, repeat=DEFAULT_REPEAT, seed=1):
+    selected = [(name, number, setup(seed)) for name, number, setup in BENCHMARKS
+                if not names or any(pattern in name for pattern in names)]
+    for name, number, run in selected:
+        run()
+
+    # Repeats are interleaved across benchmarks, so a burst of load on the machine
+    # costs every benchmark one slow repeat instead of ruining one benchmark.
+    times = {name: [] for name, number, run in selected}
+    for _ in range(repeat):
+        for name, number, run in selected:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            times[name].append((time.perf_counter() - start) / number)
+
+    return {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": {name: summarize(number, times[name]) for name, number, run in selected},
+    }
+
+def compare(results, baseline, threshold):
+    # A benchmark regresses when its best time is more than threshold slower than the baseline's.
+    report = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name) if baseline is not None else None
+        if base is None:
+            report.append((name, result["us_per_op"], None, None, False))
+            continue
+        ratio = result["us_per_op"] / base["us_per_op"]
+        report.append((name, result["us_per_op"], base["us_per_op"], ratio, ratio > 1 + threshold))
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths headless")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed repeats per benchmark")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for deals and card targets")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="flag benchmarks slower than the baseline by more than this fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON, or '-' for stdout instead of the table")
+    parser.add_argument("--card-memory", type=int, nargs="?", const=CARD_MEMORY_ROUNDS, metavar="ROUNDS",
+                        help="instead of the benchmarks, compare card allocations per deal against the sprite pool "
+                             f"over this many AI rounds (default {CARD_MEMORY_ROUNDS})")
+    args = parser.parse_args()
+
+    if args.card_memory is not None:
+        results = measure_card_memory(args.card_memory, args.seed)
+        if args.json == "-":
+            json.dump(results, sys.stdout, indent=2)
+            print()
+            return
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        print_card_memory(results)
+        return
+
+    results = run_benchmarks(args.names, args.repeat, args.seed)
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report = compare(results, baseline, args.threshold)
+    regressions = [name for name, _, _, _, regressed in report if regressed]
+    results["threshold"] = args.threshold
+    results["regressions"] = regressions
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        print(f"{'Benchmark':30s} {'us/op':>10s} {'baseline':>10s} {'change':>8s}")
+        for name, us_per_op, base, ratio, regressed in report:
+            base_text = f"{base:10.2f}" if base is not None else f"{'-':>10s}"
+            change_text = f"{ratio - 1:+8.1%}" if ratio is not None else f"{'-':>8s}"
+            print(f"{name:30s} {us_per_op:10.2f} {base_text} {change_text}{'  REGRESSION' if regressed else ''}")
+
+    if args.save_baseline:
+        del results["threshold"], results["regressions"]
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote baseline {args.baseline}", file=sys.stderr)
+    elif regressions:
+        print(f"{len(regressions)} benchmark(s) more than {args.threshold:.0%} slower than the baseline: "
+              f"{', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
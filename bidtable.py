@@ -0,0 +1,205 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from bitboard import RANKS_PER_SUIT, SUIT_BITS, SPADES, popcount
+from rules import SUITS, NUM_PLAYERS, MIN_BID, MAX_BID, HeuristicPolicy
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bidtable.bin")
+MAGIC = b"SPBT"
+VERSION = 1
+# Magic, format version, fixed-point scale of the stored values, number of entries.
+HEADER = struct.Struct("<4sHHI")
+
+# A hand's shape is its spade length and spade honours (10 to A), plus the length
+# (capped) and Q/K/A count of each side suit. The side suits are sorted, so hands
+# that differ only by which side suit is which share one entry.
+SPADE_HONOR_BITS = SUIT_BITS & ~((1 << 8) - 1)
+SIDE_HONOR_BITS = SUIT_BITS & ~((1 << 10) - 1)
+SPADE_HONOR_LEVELS = 6
+SIDE_LENGTH_CAP = 7
+SIDE_HONOR_LEVELS = 4
+SIDE_STATES = (SIDE_LENGTH_CAP + 1) * SIDE_HONOR_LEVELS
+SIDE_COMBOS = (SIDE_STATES + 2) * (SIDE_STATES + 1) * SIDE_STATES // 6
+NUM_SHAPES = (RANKS_PER_SUIT + 1) * SPADE_HONOR_LEVELS * SIDE_COMBOS
+SIDE_SUITS = [suit for suit in range(len(SUITS)) if suit != SPADES]
+
+SCALE = 16
+MISSING = 255
+MIN_SAMPLES = 20
+BATCH_SIZE = 20000
+
+def side_rank(low, middle, high):
+    # Position of a sorted triple among all sorted triples (combinatorial number system).
+    return low + middle * (middle + 1) // 2 + high * (high + 1) * (high + 2) // 6
+
+def shape_index(hand):
+    spades = hand >> SPADES * RANKS_PER_SUIT & SUIT_BITS
+    states = sorted(min(popcount(suit), SIDE_LENGTH_CAP) * SIDE_HONOR_LEVELS + popcount(suit & SIDE_HONOR_BITS)
+                    for suit in (hand >> i * RANKS_PER_SUIT & SUIT_BITS for i in SIDE_SUITS))
+    spade_shape = popcount(spades) * SPADE_HONOR_LEVELS + popcount(spades & SPADE_HONOR_BITS)
+    return spade_shape * SIDE_COMBOS + side_rank(*states)
+
+class BidTable:
+    def __init__(self, path=TABLE_PATH):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, scale, entries = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION or entries != NUM_SHAPES:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} bid table")
+        self.path = path
+        self.scale = scale
+
+    def expected_tricks(self, hand):
+        value = self.data[HEADER.size + shape_index(hand)]
+        return None if value == MISSING else value / self.scale
+
+    def bid(self, hand):
+        expected = self.expected_tricks(hand)
+        if expected is None:
+            return None
+        return max(MIN_BID, min(int(expected + 0.5), MAX_BID))
+
+    def get_size(self):
+        return len(self.data)
+
+    def close(self):
+        self.data.close()
+
+def load_table(path=TABLE_PATH):
+    try:
+        return BidTable(path)
+    except (OSError, ValueError):
+        return None
+
+class BidTablePolicy(HeuristicPolicy):
+    name = "bidtable"
+
+    def __init__(self, table=None):
+        self.table = table if table is not None else load_table()
+
+    def bid(self, engine, player):
+        bid = self.table.bid(player.index.mask) if self.table is not None else None
+        # Shapes too rare to have been sampled fall back to the heuristic bid.
+        return bid if bid is not None else super().bid(engine, player)
+
+# Building and checking the table needs NumPy; playing with it does not.
+
+def shape_indices(hands):
+    import numpy as np
+
+    suits = hands.reshape(len(hands), len(SUITS), RANKS_PER_SUIT)
+    lengths = suits.sum(axis=2, dtype=np.int64)
+    spade_honors = suits[:, SPADES, 8:].sum(axis=1, dtype=np.int64)
+    states = (np.minimum(lengths[:, SIDE_SUITS], SIDE_LENGTH_CAP) * SIDE_HONOR_LEVELS
+              + suits[:, SIDE_SUITS, 10:].sum(axis=2, dtype=np.int64))
+    states.sort(axis=1)
+    spade_shape = lengths[:, SPADES] * SPADE_HONOR_LEVELS + spade_honors
+    return spade_shape * SIDE_COMBOS + side_rank(states[:, 0], states[:, 1], states[:, 2])
+
+def simulate_hands(num_rounds, seed=None, batch_size=BATCH_SIZE):
+    import numpy as np
+    import batchsim
+
+    rng = np.random.default_rng(seed)
+    # Spades stay broken from round to round, as in rules.Engine, so each batch
+    # continues the games of the batch before it.
+    spades_broken = np.zeros(batch_size, dtype=bool)
+    round_idx = 0
+    while num_rounds > 0:
+        tables = min(batch_size, num_rounds)
+        hands = batchsim.random_deals(tables, rng)
+        tricks, _, broken = batchsim.play_round(hands, round_idx % NUM_PLAYERS, spades_broken[:tables])
+        spades_broken[:tables] = broken
+        yield (shape_indices(hands.reshape(-1, len(SUITS) * RANKS_PER_SUIT)), tricks.reshape(-1),
+               batchsim.make_bids(hands).reshape(-1))
+        num_rounds -= tables
+        round_idx += 1
+
+def build_table(num_rounds, seed=None):
+    import numpy as np
+
+    totals = np.zeros(NUM_SHAPES)
+    counts = np.zeros(NUM_SHAPES, dtype=np.int64)
+    for indices, tricks, _ in simulate_hands(num_rounds, seed):
+        totals += np.bincount(indices, weights=tricks, minlength=NUM_SHAPES)
+        counts += np.bincount(indices, minlength=NUM_SHAPES)
+
+    values = np.full(NUM_SHAPES, MISSING, dtype=np.uint8)
+    sampled = counts >= MIN_SAMPLES
+    values[sampled] = np.clip(np.rint(totals[sampled] / counts[sampled] * SCALE), 0, MISSING - 1)
+    return values, counts
+
+def write_table(values, path=TABLE_PATH):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SCALE, len(values)))
+        f.write(values.tobytes())
+    os.replace(temp_path, path)
+
+def check_calibration(table, num_rounds, seed=None):
+    import numpy as np
+
+    values = np.frombuffer(table.data, dtype=np.uint8, offset=HEADER.size)
+    hands = 0
+    covered = 0
+    table_error = 0.0
+    table_bias = 0.0
+    bid_error = 0
+    heuristic_error = 0
+    covered_heuristic_error = 0
+    for indices, tricks, heuristic_bids in simulate_hands(num_rounds, seed):
+        stored = values[indices]
+        have = stored != MISSING
+        expected = stored[have] / table.scale
+        bids = np.clip(np.floor(expected + 0.5), MIN_BID, MAX_BID)
+
+        hands += len(indices)
+        covered += int(have.sum())
+        table_error += float(np.abs(expected - tricks[have]).sum())
+        table_bias += float((expected - tricks[have]).sum())
+        bid_error += int(np.abs(bids - tricks[have]).sum())
+        heuristic_error += int(np.abs(heuristic_bids - tricks).sum())
+        covered_heuristic_error += int(np.abs(heuristic_bids[have] - tricks[have]).sum())
+
+    return {
+        "hands": hands,
+        "coverage": covered / hands if hands else 0.0,
+        "table_mae": table_error / covered if covered else 0.0,
+        "table_bias": table_bias / covered if covered else 0.0,
+        "table_bid_mae": bid_error / covered if covered else 0.0,
+        "heuristic_bid_mae": heuristic_error / hands if hands else 0.0,
+        "covered_heuristic_bid_mae": covered_heuristic_error / covered if covered else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the bid lookup table from simulated deals")
+    parser.add_argument("--rounds", type=int, default=1000000, help="simulated rounds used to build the table")
+    parser.add_argument("--check-rounds", type=int, default=100000, help="held-out rounds for the calibration check")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the build (the check uses seed + 1)")
+    parser.add_argument("--output", default=TABLE_PATH, help="table file to write")
+    parser.add_argument("--check", action="store_true", help="only check the existing table, do not rebuild it")
+    args = parser.parse_args()
+
+    if not args.check:
+        start = time.perf_counter()
+        values, counts = build_table(args.rounds, args.seed)
+        write_table(values, args.output)
+        sampled = int((values != MISSING).sum())
+        print(f"Built {args.output} from {args.rounds} rounds in {time.perf_counter() - start:.1f} s: "
+              f"{sampled} of {NUM_SHAPES} shapes sampled at least {MIN_SAMPLES} times")
+
+    table = BidTable(args.output)
+    print(f"Table size: {table.get_size()} bytes ({NUM_SHAPES} one-byte entries)")
+    result = check_calibration(table, args.check_rounds, args.seed + 1)
+    print(f"Calibration on {result['hands']} held-out hands ({result['coverage']:.1%} covered by the table):")
+    print(f"  Expected tricks: mean absolute error {result['table_mae']:.2f}, bias {result['table_bias']:+.2f}")
+    print(f"  Table bid error {result['table_bid_mae']:.2f} tricks vs heuristic bid error "
+          f"{result['covered_heuristic_bid_mae']:.2f} on the same hands ({result['heuristic_bid_mae']:.2f} on all)")
+    table.close()
+
+if __name__ == "__main__":
+    main()
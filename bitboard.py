@@ -0,0 +1,206 @@
+import argparse
+import random
+import time
+
+import rules
+from rules import SUITS, VALUES, NUM_PLAYERS, MIN_BID, MAX_BID, SUIT_INDEX
+
+RANKS_PER_SUIT = len(VALUES)
+SUIT_BITS = (1 << RANKS_PER_SUIT) - 1
+SUIT_MASKS = [SUIT_BITS << (i * RANKS_PER_SUIT) for i in range(len(SUITS))]
+SPADES = SUIT_INDEX["Spades"]
+SPADES_MASK = SUIT_MASKS[SPADES]
+NON_SPADES_MASK = sum(SUIT_MASKS) & ~SPADES_MASK
+FULL_DECK = sum(SUIT_MASKS)
+
+# Player.sort_hand orders suits Spades, Hearts, Clubs, Diamonds; equal-valued cards
+# are tie-broken in that order by the list-based AI, so the bitboard AI must be too.
+HAND_SUIT_ORDER = [SUIT_INDEX[suit] for suit in ["Spades", "Hearts", "Clubs", "Diamonds"]]
+
+BID_MASK = (sum(1 << (value - 2) for value in VALUES if value >= 10) << (SPADES * RANKS_PER_SUIT) |
+            sum(sum(1 << (value - 2) for value in VALUES if value >= 12) << (i * RANKS_PER_SUIT)
+                for i in range(len(SUITS)) if i != SPADES))
+
+def card_index(card):
+    return card.index
+
+def index_suit(index):
+    return index // RANKS_PER_SUIT
+
+def index_value(index):
+    return index % RANKS_PER_SUIT + 2
+
+def hand_to_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card_index(card)
+    return mask
+
+def index_cards(cards):
+    lookup = [None] * (RANKS_PER_SUIT * len(SUITS))
+    for card in cards:
+        lookup[card_index(card)] = card
+    return lookup
+
+def mask_to_cards(mask, lookup):
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(lookup[low.bit_length() - 1])
+        mask ^= low
+    return cards
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+def highest_index(mask):
+    return mask.bit_length() - 1
+
+def lowest_card(mask):
+    folded = (mask | mask >> RANKS_PER_SUIT | mask >> 2 * RANKS_PER_SUIT | mask >> 3 * RANKS_PER_SUIT) & SUIT_BITS
+    rank = (folded & -folded).bit_length() - 1
+    for suit in HAND_SUIT_ORDER:
+        index = suit * RANKS_PER_SUIT + rank
+        if mask >> index & 1:
+            return index
+    return -1
+
+def valid_moves(hand, lead_suit, spades_broken):
+    if lead_suit is None:
+        if spades_broken:
+            return hand
+        return (hand & NON_SPADES_MASK) or hand
+    return (hand & SUIT_MASKS[lead_suit]) or hand
+
+def beating_cards(mask, winner_index):
+    winner_suit = index_suit(winner_index)
+    higher = SUIT_MASKS[winner_suit] & ~((2 << winner_index) - 1)
+    if winner_suit != SPADES:
+        higher |= SPADES_MASK
+    return mask & higher
+
+def trick_winner(trick_mask, lead_suit):
+    spades = trick_mask & SPADES_MASK
+    if spades:
+        return highest_index(spades)
+    return highest_index(trick_mask & SUIT_MASKS[lead_suit])
+
+def ai_bid(hand):
+    return max(MIN_BID, min(popcount(hand & BID_MASK), MAX_BID))
+
+def ai_play(hand, lead_suit, spades_broken, winner_index):
+    valid = valid_moves(hand, lead_suit, spades_broken)
+    if winner_index >= 0:
+        can_beat = beating_cards(valid, winner_index)
+        if can_beat:
+            return lowest_card(can_beat)
+    return lowest_card(valid)
+
+def deal_masks(rng):
+    order = list(range(RANKS_PER_SUIT * len(SUITS)))
+    rng.shuffle(order)
+    hands = [0] * NUM_PLAYERS
+    for i, index in enumerate(order):
+        hands[i % NUM_PLAYERS] |= 1 << index
+    return hands
+
+def play_round_masks(hands, leader, spades_broken):
+    hands = list(hands)
+    tricks = [0] * NUM_PLAYERS
+    for _ in range(RANKS_PER_SUIT):
+        lead_suit = None
+        winner_index = -1
+        winner_seat = leader
+        for offset in range(NUM_PLAYERS):
+            seat = (leader + offset) % NUM_PLAYERS
+            index = ai_play(hands[seat], lead_suit, spades_broken, winner_index)
+            bit = 1 << index
+            hands[seat] ^= bit
+            if lead_suit is None:
+                lead_suit = index_suit(index)
+                if lead_suit == SPADES:
+                    spades_broken = True
+                winner_index = index
+            elif beating_cards(bit, winner_index):
+                winner_index = index
+                winner_seat = seat
+        tricks[winner_seat] += 1
+        leader = winner_seat
+    return tricks, spades_broken
+
+def play_round_cards(players, leader, spades_broken):
+    tricks = [0] * NUM_PLAYERS
+    for _ in range(RANKS_PER_SUIT):
+        lead_suit = None
+        trick_pile = []
+        for offset in range(NUM_PLAYERS):
+            player = players[(leader + offset) % NUM_PLAYERS]
+            valid = player.get_valid_moves(lead_suit, spades_broken)
+            card = player.make_ai_play(valid, lead_suit, trick_pile, spades_broken)
+            player.remove_card(card)
+            if not trick_pile:
+                lead_suit = card.suit
+                if card.suit == "Spades":
+                    spades_broken = True
+            trick_pile.append((player, card))
+
+        winner_player, winner_card = trick_pile[0]
+        for player, card in trick_pile[1:]:
+            if player.card_beats(card, winner_card, lead_suit):
+                winner_player = player
+                winner_card = card
+        tricks[winner_player.position] += 1
+        leader = winner_player.position
+    return tricks, spades_broken
+
+def run_benchmark(num_deals, seed=None):
+    rng = random.Random(seed)
+    deals = [deal_masks(rng) for _ in range(num_deals)]
+    lookup = rules.CARDS
+
+    card_players = []
+    for hands in deals:
+        players = [rules.Player(name, seat) for seat, name in enumerate(rules.SIMULATION_NAMES)]
+        for player, mask in zip(players, hands):
+            player.set_hand(mask_to_cards(mask, lookup))
+        card_players.append(players)
+
+    start = time.perf_counter()
+    card_results = []
+    for players in card_players:
+        bids = [player.make_ai_bid() for player in players]
+        card_results.append((bids, play_round_cards(players, 1, False)))
+    card_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mask_results = []
+    for hands in deals:
+        bids = [ai_bid(mask) for mask in hands]
+        mask_results.append((bids, play_round_masks(hands, 1, False)))
+    mask_seconds = time.perf_counter() - start
+
+    return {
+        "deals": num_deals,
+        "seed": seed,
+        "identical": card_results == mask_results,
+        "card_seconds": card_seconds,
+        "mask_seconds": mask_seconds,
+        "card_rounds_per_second": num_deals / card_seconds if card_seconds else 0.0,
+        "mask_rounds_per_second": num_deals / mask_seconds if mask_seconds else 0.0,
+        "speedup": card_seconds / mask_seconds if mask_seconds else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-based and bitboard hands on the same deals")
+    parser.add_argument("--deals", type=int, default=2000, help="number of seeded deals to play out")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the deals")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.deals, args.seed)
+    print(f"{result['deals']} deals, seed {result['seed']}: results identical: {result['identical']}")
+    print(f"  Card lists: {result['card_seconds']:.3f} s ({result['card_rounds_per_second']:.0f} rounds/s)")
+    print(f"  Bitboards:  {result['mask_seconds']:.3f} s ({result['mask_rounds_per_second']:.0f} rounds/s)")
+    print(f"  Speedup:    {result['speedup']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+import rules
+from bitboard import RANKS_PER_SUIT, SPADES, beating_cards, deal_masks
+from rules import NUM_PLAYERS, MIN_BID, MAX_BID, SUIT_INDEX, STATE_BID, STATE_PLAY, STATE_DEAL, STATE_GAME_OVER
+
+NUM_CARDS = RANKS_PER_SUIT * len(rules.SUITS)
+PLAYED = -1
+SUIT_OF = [index // RANKS_PER_SUIT for index in range(NUM_CARDS)]
+SUIT_CARDS = [tuple(range(suit * RANKS_PER_SUIT, (suit + 1) * RANKS_PER_SUIT)) for suit in range(len(rules.SUITS))]
+ALL_SUITS = tuple(range(len(rules.SUITS)))
+NON_SPADE_SUITS = tuple(suit for suit in ALL_SUITS if suit != SPADES)
+ONE_SUIT = [(suit,) for suit in ALL_SUITS]
+NEXT_SEAT = [(seat + 1) % NUM_PLAYERS for seat in range(NUM_PLAYERS)]
+PREV_SEAT = [(seat - 1) % NUM_PLAYERS for seat in range(NUM_PLAYERS)]
+# BEATS[winner][index] is whether card index takes the trick from card winner.
+BEATS = [[bool(beating_cards(1 << index, winner)) for index in range(NUM_CARDS)] for winner in range(NUM_CARDS)]
+
+class GameState:
+    """One round of Spades as flat lists of small ints, for search that applies and undoes moves.
+
+    owner[i] is the seat holding card index i (as in bitboard.card_index) or
+    PLAYED, and suit_counts[seat][suit] how many cards of the suit the seat holds.
+    make_move and unmake_move update the turn, lead suit, spades_broken, the card
+    and seat currently winning the trick and the tricks won in O(1). The undo
+    history lives in lists sized for a whole round up front, and every value
+    stored is a seat, suit, card index, count or bool, so neither method
+    allocates. Suits are indices into rules.SUITS and lead_suit is None between
+    tricks; spades_broken follows rules.Engine, which breaks spades when one is led.
+    """
+
+    __slots__ = ("owner", "suit_counts", "bids", "tricks_won", "dealer", "leader", "turn", "lead_suit",
+                 "winner_index", "winner_seat", "trick_count", "tricks_played", "spades_broken", "bid_count",
+                 "ply", "moves", "movers", "saved_lead_suit", "saved_winner_index", "saved_winner_seat",
+                 "saved_spades_broken")
+
+    def __init__(self, hands, dealer=0, spades_broken=False):
+        """Start a round at its first bid; hands are card masks indexed by seat."""
+        self.owner = [PLAYED] * NUM_CARDS
+        self.suit_counts = [[0] * len(ALL_SUITS) for _ in range(NUM_PLAYERS)]
+        for seat, hand in enumerate(hands):
+            for index in range(NUM_CARDS):
+                if hand >> index & 1:
+                    self.owner[index] = seat
+                    self.suit_counts[seat][SUIT_OF[index]] += 1
+        self.bids = [None] * NUM_PLAYERS
+        self.tricks_won = [0] * NUM_PLAYERS
+        self.dealer = dealer
+        self.leader = NEXT_SEAT[dealer]
+        self.turn = self.leader
+        self.lead_suit = None
+        self.winner_index = -1
+        self.winner_seat = -1
+        self.trick_count = 0
+        self.tricks_played = 0
+        self.spades_broken = spades_broken
+        self.bid_count = 0
+
+        self.ply = 0
+        self.moves = [0] * NUM_CARDS
+        self.movers = [0] * NUM_CARDS
+        self.saved_lead_suit = [None] * NUM_CARDS
+        self.saved_winner_index = [0] * NUM_CARDS
+        self.saved_winner_seat = [0] * NUM_CARDS
+        self.saved_spades_broken = [False] * NUM_CARDS
+
+    @classmethod
+    def from_engine(cls, engine):
+        """The position of a rules.Engine that is bidding or playing a round."""
+        players = engine.players
+        hands = [player.index.mask for player in players]
+        spades_broken = engine.spades_broken
+        if engine.trick_pile:
+            # The cards of the trick go back in hand and are played again below.
+            for player, card in engine.trick_pile:
+                hands[player.position] |= 1 << card.index
+            spades_broken = engine.round_plays[-len(engine.trick_pile)][3]
+        state = cls(hands, engine.dealer_idx, spades_broken)
+        seat = state.leader
+        while state.bid_count < NUM_PLAYERS and players[seat].bid is not None:
+            state.make_bid(players[seat].bid)
+            seat = NEXT_SEAT[seat]
+        if engine.state == STATE_BID:
+            return state
+
+        state.tricks_won = [player.tricks_won for player in players]
+        state.tricks_played = sum(state.tricks_won)
+        if engine.trick_pile:
+            state.leader = engine.trick_pile[0][0].position
+            if len(engine.trick_pile) == NUM_PLAYERS:
+                # The trick is over but not yet collected; its winner is already counted.
+                state.tricks_won[engine.trick_winner.position] -= 1
+                state.tricks_played -= 1
+        else:
+            state.leader = engine.current_player_idx
+        state.turn = state.leader
+        for player, card in engine.trick_pile:
+            state.make_move(card.index)
+        return state
+
+    def is_bidding(self):
+        return self.bid_count < NUM_PLAYERS
+
+    def is_round_over(self):
+        return self.tricks_played == RANKS_PER_SUIT
+
+    def hand_mask(self, seat):
+        mask = 0
+        for index in range(NUM_CARDS):
+            if self.owner[index] == seat:
+                mask |= 1 << index
+        return mask
+
+    def make_bid(self, bid):
+        self.bids[self.turn] = bid
+        self.bid_count += 1
+        self.turn = NEXT_SEAT[self.turn]
+
+    def unmake_bid(self):
+        self.bid_count -= 1
+        self.turn = PREV_SEAT[self.turn]
+        self.bids[self.turn] = None
+
+    def generate_moves(self, moves):
+        """Write the legal card indices for the seat to move into moves, lowest first; return the count.
+
+        moves must have room for 13 entries. Like Player.get_valid_moves: follow
+        the lead suit if possible, and lead spades only once broken or when the
+        hand holds nothing else.
+        """
+        seat = self.turn
+        counts = self.suit_counts[seat]
+        lead_suit = self.lead_suit
+        if lead_suit is not None:
+            suits = ONE_SUIT[lead_suit] if counts[lead_suit] else ALL_SUITS
+        elif self.spades_broken or not (counts[NON_SPADE_SUITS[0]] or counts[NON_SPADE_SUITS[1]]
+                                        or counts[NON_SPADE_SUITS[2]]):
+            suits = ALL_SUITS
+        else:
+            suits = NON_SPADE_SUITS
+
+        owner = self.owner
+        count = 0
+        for suit in suits:
+            if counts[suit]:
+                for index in SUIT_CARDS[suit]:
+                    if owner[index] == seat:
+                        moves[count] = index
+                        count += 1
+        return count
+
+    def make_move(self, index):
+        ply = self.ply
+        seat = self.turn
+        suit = SUIT_OF[index]
+        self.moves[ply] = index
+        self.movers[ply] = seat
+        self.saved_lead_suit[ply] = self.lead_suit
+        self.saved_winner_index[ply] = self.winner_index
+        self.saved_winner_seat[ply] = self.winner_seat
+        self.saved_spades_broken[ply] = self.spades_broken
+        self.ply = ply + 1
+
+        self.owner[index] = PLAYED
+        self.suit_counts[seat][suit] -= 1
+        if self.lead_suit is None:
+            self.lead_suit = suit
+            self.winner_index = index
+            self.winner_seat = seat
+            if suit == SPADES:
+                self.spades_broken = True
+        elif BEATS[self.winner_index][index]:
+            self.winner_index = index
+            self.winner_seat = seat
+
+        if self.trick_count == NUM_PLAYERS - 1:
+            winner = self.winner_seat
+            self.tricks_won[winner] += 1
+            self.tricks_played += 1
+            self.trick_count = 0
+            self.lead_suit = None
+            self.winner_index = -1
+            self.winner_seat = -1
+            self.leader = winner
+            self.turn = winner
+        else:
+            self.trick_count += 1
+            self.turn = NEXT_SEAT[seat]
+
+    def unmake_move(self):
+        ply = self.ply - 1
+        self.ply = ply
+        index = self.moves[ply]
+        seat = self.movers[ply]
+
+        if self.trick_count == 0:
+            # This move finished a trick, which now goes back to three cards.
+            self.tricks_won[self.leader] -= 1
+            self.tricks_played -= 1
+            self.trick_count = NUM_PLAYERS - 1
+            self.leader = self.movers[ply - (NUM_PLAYERS - 1)]
+        else:
+            self.trick_count -= 1
+        self.lead_suit = self.saved_lead_suit[ply]
+        self.winner_index = self.saved_winner_index[ply]
+        self.winner_seat = self.saved_winner_seat[ply]
+        self.spades_broken = self.saved_spades_broken[ply]
+
+        self.owner[index] = seat
+        self.suit_counts[seat][SUIT_OF[index]] += 1
+        self.turn = seat
+
+    def snapshot(self):
+        return (tuple(self.owner), tuple(map(tuple, self.suit_counts)), tuple(self.bids), tuple(self.tricks_won),
+                self.leader, self.turn, self.lead_suit, self.winner_index, self.winner_seat, self.trick_count,
+                self.tricks_played, self.spades_broken, self.bid_count, self.ply)
+
+def compare_engine(state, engine):
+    # Differences between a GameState and the engine it follows, as messages.
+    players = engine.players
+    errors = []
+    expected = {
+        "turn": engine.current_player_idx,
+        "lead_suit": SUIT_INDEX[engine.lead_suit] if engine.lead_suit is not None else None,
+        "spades_broken": engine.spades_broken,
+        "trick_count": len(engine.trick_pile),
+        "tricks_won": [player.tricks_won for player in players],
+        "bids": [player.bid for player in players],
+        "hands": [player.index.mask for player in players],
+    }
+    actual = {
+        "turn": state.turn,
+        "lead_suit": state.lead_suit,
+        "spades_broken": state.spades_broken,
+        "trick_count": state.trick_count,
+        "tricks_won": state.tricks_won,
+        "bids": state.bids,
+        "hands": [state.hand_mask(seat) for seat in range(NUM_PLAYERS)],
+    }
+    if engine.trick_pile:
+        winner_card = players[0].get_winning_card(engine.trick_pile, engine.lead_suit)
+        winner_seat = next(player.position for player, card in engine.trick_pile if card is winner_card)
+        expected["winner"] = (winner_card.index, winner_seat)
+        actual["winner"] = (state.winner_index, state.winner_seat)
+    if engine.state == STATE_PLAY:
+        expected["moves"] = sorted(card.index for card in
+                                   players[engine.current_player_idx].get_valid_moves(engine.lead_suit,
+                                                                                      engine.spades_broken))
+        moves = [0] * RANKS_PER_SUIT
+        actual["moves"] = moves[:state.generate_moves(moves)]
+    for name, value in expected.items():
+        if actual[name] != value:
+            errors.append(f"{name}: engine {value}, state {actual[name]}")
+    return errors
+
+def verify(num_games, seed=None, max_rounds=10, undo_chance=0.1):
+    """Play random legal games on rules.Engine and a GameState side by side.
+
+    After every bid and card the two are compared. Now and then a random number of
+    moves is undone, checked against the snapshot taken when the position was
+    first reached, and replayed, and every round ends by undoing all of it back to
+    the deal. Returns (positions compared, error messages).
+    """
+    rng = random.Random(seed)
+    checked = 0
+    errors = []
+    for _ in range(num_games):
+        engine = rules.Engine(human_seats=range(NUM_PLAYERS), seed=rng.getrandbits(64), max_rounds=max_rounds)
+        engine.start_game()
+        state = None
+        snapshots = []
+        while engine.state != STATE_GAME_OVER and not errors:
+            if engine.state == STATE_DEAL:
+                engine.step()
+                state = GameState.from_engine(engine)
+                snapshots = [state.snapshot()]
+            elif engine.state in (STATE_BID, STATE_PLAY):
+                errors += compare_engine(state, engine)
+                checked += 1
+                # The same position rebuilt from the engine must match, apart from its history.
+                if GameState.from_engine(engine).snapshot()[:12] != state.snapshot()[:12]:
+                    errors.append("from_engine differs from the incremental state")
+                if engine.state == STATE_BID:
+                    bid = rng.randint(MIN_BID, MAX_BID)
+                    engine.place_bid(bid)
+                    state.make_bid(bid)
+                else:
+                    player = engine.players[engine.current_player_idx]
+                    card = rng.choice(player.get_valid_moves(engine.lead_suit, engine.spades_broken))
+                    engine.play_card(player, card)
+                    state.make_move(card.index)
+                snapshots.append(state.snapshot())
+                if state.ply and rng.random() < undo_chance:
+                    errors += check_undo(state, snapshots, rng.randint(1, state.ply))
+            else:
+                if engine.state == rules.STATE_ROUND_END:
+                    if state.tricks_won != [player.tricks_won for player in engine.players]:
+                        errors.append("tricks won differ at the end of the round")
+                    errors += check_undo(state, snapshots, state.ply, bids=True)
+                engine.step()
+    return checked, errors
+
+def check_undo(state, snapshots, depth, bids=False):
+    # Undo depth moves (and every bid, if bids) and compare with the snapshot taken
+    # when that position was first reached; unless the bids went too, replay the moves.
+    errors = []
+    moves = state.moves[state.ply - depth:state.ply]
+    for _ in range(depth):
+        state.unmake_move()
+    if bids:
+        while state.bid_count:
+            state.unmake_bid()
+    position = state.bid_count + state.ply
+    if state.snapshot() != snapshots[position]:
+        errors.append(f"undoing {depth} moves did not restore position {position}")
+    if not bids:
+        for index in moves:
+            state.make_move(index)
+        if state.snapshot() != snapshots[-1]:
+            errors.append(f"replaying {depth} moves did not restore the position")
+    return errors
+
+def record_playouts(num_deals, seed=None):
+    # One legal random playout per deal, as the bids and card indices in order.
+    rng = random.Random(seed)
+    playouts = []
+    moves = [0] * RANKS_PER_SUIT
+    for _ in range(num_deals):
+        hands = deal_masks(rng)
+        state = GameState(hands)
+        bids = [rng.randint(MIN_BID, MAX_BID) for _ in range(NUM_PLAYERS)]
+        for bid in bids:
+            state.make_bid(bid)
+        played = []
+        while not state.is_round_over():
+            index = moves[rng.randrange(state.generate_moves(moves))]
+            state.make_move(index)
+            played.append(index)
+        playouts.append((hands, bids, played))
+    return playouts
+
+def run_benchmark(num_deals, seed=None, repeat=5):
+    playouts = record_playouts(num_deals, seed)
+    states = []
+    for hands, bids, played in playouts:
+        state = GameState(hands)
+        for bid in bids:
+            state.make_bid(bid)
+        states.append((state, played))
+
+    # Apply each whole round and undo it again, best of a few passes.
+    make_unmake = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for state, played in states:
+            make_move = state.make_move
+            unmake_move = state.unmake_move
+            for index in played:
+                make_move(index)
+            for _ in played:
+                unmake_move()
+        make_unmake = min(make_unmake, time.perf_counter() - start)
+
+    # Generating the legal moves at every position as well, as a search would.
+    generate = float("inf")
+    moves = [0] * RANKS_PER_SUIT
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for state, played in states:
+            for index in played:
+                state.generate_moves(moves)
+                state.make_move(index)
+            for _ in played:
+                state.unmake_move()
+        generate = min(generate, time.perf_counter() - start)
+
+    # The same card sequences played through rules.Engine, which cannot undo.
+    engine_seconds = float("inf")
+    for _ in range(repeat):
+        engines = []
+        for hands, bids, played in playouts:
+            engine = rules.Engine()
+            for player, hand in zip(engine.players, hands):
+                player.set_hand([rules.CARDS[i] for i in range(NUM_CARDS) if hand >> i & 1])
+                player.bid = bids[player.position]
+            engine.start_play()
+            engines.append((engine, [rules.CARDS[index] for index in played]))
+        start = time.perf_counter()
+        for engine, cards in engines:
+            for card in cards:
+                engine.play_card(engine.players[engine.current_player_idx], card)
+                if engine.state == rules.STATE_TRICK_END:
+                    engine.finish_trick()
+        engine_seconds = min(engine_seconds, time.perf_counter() - start)
+
+    # make_move and unmake_move should not allocate: the peak traced over a round is the proof.
+    state, played = states[0]
+    make_move = state.make_move
+    unmake_move = state.unmake_move
+    count = len(played)
+    tracemalloc.start()
+    # Plain while loops, since a for loop's iterator would be the only allocation traced.
+    ply = 0
+    while ply < count:
+        make_move(played[ply])
+        ply += 1
+    while ply:
+        unmake_move()
+        ply -= 1
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total_moves = sum(len(played) for _, _, played in playouts)
+    return {
+        "deals": num_deals,
+        "moves": total_moves,
+        "make_unmake_per_second": total_moves / make_unmake,
+        "with_generate_per_second": total_moves / generate,
+        "engine_moves_per_second": total_moves / engine_seconds,
+        "bytes_allocated": allocated,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and verify the make/unmake game state")
+    parser.add_argument("--deals", type=int, default=2000, help="number of seeded deals to play through")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the deals and moves")
+    parser.add_argument("--verify", type=int, nargs="?", const=200, metavar="GAMES",
+                        help="instead, check the state against rules.Engine over this many random games "
+                             "(default 200)")
+    parser.add_argument("--max-rounds", type=int, default=10, help="with --verify, rounds per game")
+    args = parser.parse_args()
+
+    if args.verify is not None:
+        checked, errors = verify(args.verify, args.seed, args.max_rounds)
+        for error in errors[:20]:
+            print(error)
+        print(f"Compared {checked} positions over {args.verify} games: {len(errors)} differences")
+        if errors:
+            raise SystemExit(1)
+        return
+
+    result = run_benchmark(args.deals, args.seed)
+    print(f"{result['moves']} moves over {result['deals']} deals (seed {args.seed})")
+    print(f"  make_move + unmake_move:     {result['make_unmake_per_second']:10.0f} moves/s")
+    print(f"  with generate_moves as well: {result['with_generate_per_second']:10.0f} moves/s")
+    print(f"  rules.Engine.play_card:      {result['engine_moves_per_second']:10.0f} moves/s (no undo)")
+    print(f"  Allocated by make/unmake:    {result['bytes_allocated']} bytes over a round")
+
+if __name__ == "__main__":
+    main()
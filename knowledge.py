@@ -0,0 +1,420 @@
+import argparse
+import random
+import time
+
+import rules
+from bitboard import RANKS_PER_SUIT, SPADES, SUIT_MASKS, FULL_DECK, index_suit, hand_to_mask, highest_index
+from rules import (SUITS, NUM_PLAYERS, MIN_BID, MAX_BID, STATE_BID, STATE_PLAY, STATE_GAME_OVER,
+                   EVENT_DEAL, EVENT_PLAY, EVENT_TRICK, PartnerAwarePolicy)
+
+ALL_SUITS_VOID = (1 << len(SUITS)) - 1
+NON_SPADE_VOIDS = ALL_SUITS_VOID & ~(1 << SPADES)
+
+def infer_voids(round_plays):
+    # The voids shown by a round's plays so far, worked out from scratch.
+    voids = [0] * NUM_PLAYERS
+    for position, card, lead_suit, spades_broken in round_plays:
+        if lead_suit is None:
+            # Spades can only be led before they are broken by a player holding nothing else.
+            if card.suit == "Spades" and not spades_broken:
+                voids[position] |= NON_SPADE_VOIDS
+        elif card.suit != lead_suit:
+            voids[position] |= 1 << SUITS.index(lead_suit)
+    return voids
+
+class CardTracker:
+    """What one seat can know about the cards it cannot see, updated play by play.
+
+    Cards are card indices (as in bitboard.card_index) and suits indices into
+    rules.SUITS. remaining is every card not yet played this round, own the
+    seat's hand and unseen the rest of remaining, with unseen_counts[suit] its
+    length per suit. voids[seat] has bit suit set once that seat has shown it
+    holds none of the suit, by not following it or by leading a spade before
+    spades were broken. record_play and end_trick do a constant amount of work,
+    and so does every query, so a policy can consult the tracker on every move
+    and a search can keep one up to date as it plays.
+    """
+
+    __slots__ = ("seat", "own", "remaining", "unseen", "unseen_counts", "voids", "hand_sizes",
+                 "spades_broken", "lead_suit", "trick_count", "engine")
+
+    def __init__(self, seat):
+        self.seat = seat
+        self.engine = None
+        self.start_round(0, False)
+
+    @classmethod
+    def from_engine(cls, engine, seat):
+        """A tracker for seat that has followed the round engine is playing."""
+        tracker = cls(seat)
+        tracker.sync(engine)
+        return tracker
+
+    def copy(self, engine=None):
+        """The same knowledge, following engine from here on if given.
+
+        engine must be at the same point of the round, like a copy from Engine.snapshot().
+        """
+        tracker = CardTracker.__new__(CardTracker)
+        for name in self.__slots__:
+            setattr(tracker, name, getattr(self, name))
+        tracker.unseen_counts = self.unseen_counts[:]
+        tracker.voids = self.voids[:]
+        tracker.hand_sizes = self.hand_sizes[:]
+        tracker.engine = engine
+        if engine is not None:
+            engine.listeners.append(tracker.on_event)
+        return tracker
+
+    def sync(self, engine):
+        # Replay the round so far from the engine's public history and the seat's own hand.
+        plays = engine.round_plays
+        # The hand as dealt, and spades_broken as it was before the first card of the round.
+        own = engine.players[self.seat].index.mask
+        own |= hand_to_mask(card for position, card, _, _ in plays if position == self.seat)
+        self.start_round(own, plays[0][3] if plays else engine.spades_broken)
+        for position, card, _, _ in plays:
+            self.record_play(position, card.index)
+            if self.trick_count == NUM_PLAYERS:
+                self.end_trick()
+
+    def attach(self, engine):
+        """Catch up with engine's round and follow it from here on, through its listeners."""
+        self.detach()
+        self.sync(engine)
+        self.engine = engine
+        engine.listeners.append(self.on_event)
+
+    def detach(self):
+        if self.engine is not None:
+            self.engine.listeners.remove(self.on_event)
+            self.engine = None
+
+    def on_event(self, event):
+        kind = event[0]
+        if kind == EVENT_PLAY:
+            self.record_play(event[1].position, event[2].index)
+        elif kind == EVENT_TRICK:
+            self.end_trick()
+        elif kind == EVENT_DEAL:
+            self.start_round(self.engine.players[self.seat].index.mask, self.engine.spades_broken)
+
+    def start_round(self, own, spades_broken):
+        """Forget the last round; own is the seat's new hand as a card mask."""
+        self.own = own
+        self.remaining = FULL_DECK
+        self.unseen = FULL_DECK & ~own
+        self.unseen_counts = [RANKS_PER_SUIT - bin(own & mask).count("1") for mask in SUIT_MASKS]
+        self.voids = [0] * NUM_PLAYERS
+        self.hand_sizes = [RANKS_PER_SUIT] * NUM_PLAYERS
+        self.spades_broken = spades_broken
+        self.lead_suit = None
+        self.trick_count = 0
+
+    def record_play(self, seat, index):
+        bit = 1 << index
+        suit = index_suit(index)
+        if self.trick_count == 0:
+            if suit == SPADES and not self.spades_broken:
+                self.voids[seat] |= NON_SPADE_VOIDS
+            self.lead_suit = suit
+            if suit == SPADES:
+                self.spades_broken = True
+        elif suit != self.lead_suit:
+            self.voids[seat] |= 1 << self.lead_suit
+        self.remaining &= ~bit
+        if seat == self.seat:
+            self.own &= ~bit
+        else:
+            self.unseen &= ~bit
+            self.unseen_counts[suit] -= 1
+        self.hand_sizes[seat] -= 1
+        self.trick_count += 1
+
+    def end_trick(self):
+        self.lead_suit = None
+        self.trick_count = 0
+
+    def is_void(self, seat, suit):
+        return self.voids[seat] >> suit & 1 == 1
+
+    def unseen_count(self, suit):
+        return self.unseen_counts[suit]
+
+    def highest_left(self, suit):
+        """The highest card of suit not yet played, by anyone; -1 once all are gone."""
+        return highest_index(self.remaining & SUIT_MASKS[suit])
+
+    def is_master(self, index):
+        # Nothing left in its suit can beat it.
+        return index == highest_index(self.remaining & SUIT_MASKS[index_suit(index)])
+
+    def own_masters(self):
+        """The seat's cards that are the highest left in their suits, as a mask."""
+        masters = 0
+        for mask in SUIT_MASKS:
+            top = highest_index(self.remaining & mask)
+            if top >= 0:
+                masters |= self.own & 1 << top
+        return masters
+
+    def holds_probability(self, seat, index):
+        """An estimate of the chance that seat holds card index.
+
+        Exact for the seat's own cards and for cards already played. An unseen
+        card is shared among the other seats not known to be void in its suit,
+        in proportion to how many cards each still holds.
+        """
+        bit = 1 << index
+        if seat == self.seat:
+            return 1.0 if self.own & bit else 0.0
+        if not self.unseen & bit:
+            return 0.0
+        suit = index_suit(index)
+        if self.voids[seat] >> suit & 1:
+            return 0.0
+        total = 0
+        for other in range(NUM_PLAYERS):
+            if other != self.seat and not self.voids[other] >> suit & 1:
+                total += self.hand_sizes[other]
+        return self.hand_sizes[seat] / total
+
+class Trackers:
+    """A CardTracker per seat following one engine, each made when first asked for.
+
+    They belong to the engine (engine.trackers, see get_tracker) rather than to a
+    policy, so the seats of a game share them and a policy can play many games.
+    Engine.snapshot() gives its copy copies of them, so a policy thinking about
+    the copy on another thread starts from what the live game's trackers know
+    instead of replaying the round.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.by_seat = [None] * NUM_PLAYERS
+
+    def get(self, seat):
+        tracker = self.by_seat[seat]
+        if tracker is None:
+            tracker = self.by_seat[seat] = CardTracker(seat)
+            tracker.attach(self.engine)
+        return tracker
+
+    def copy(self, engine):
+        trackers = Trackers(engine)
+        trackers.by_seat = [tracker.copy(engine) if tracker is not None else None for tracker in self.by_seat]
+        return trackers
+
+    def close(self):
+        for tracker in self.by_seat:
+            if tracker is not None:
+                tracker.detach()
+        self.by_seat = [None] * NUM_PLAYERS
+
+def get_tracker(engine, seat):
+    """The tracker for seat following engine, made and attached the first time it is asked for."""
+    if engine.trackers is None:
+        engine.trackers = Trackers(engine)
+    return engine.trackers.get(seat)
+
+class TrackingPolicy(PartnerAwarePolicy):
+    """PartnerAwarePolicy that leads a side-suit card which is the highest left in its suit.
+
+    Of the seat's masters in suits where neither opponent has shown out, it
+    leads the one whose suit has the most cards still unseen, as the least
+    likely to be trumped; with none, it plays as PartnerAwarePolicy does.
+    """
+
+    name = "tracking"
+
+    def prepare(self, engine, player):
+        get_tracker(engine, player.position)
+
+    def play(self, engine, player, valid_moves):
+        if not engine.trick_pile and len(valid_moves) > 1:
+            tracker = get_tracker(engine, player.position)
+            voids = tracker.voids
+            opponents = voids[(player.position + 1) % NUM_PLAYERS] | voids[(player.position + 3) % NUM_PLAYERS]
+            masters = tracker.own_masters()
+            best = None
+            for card in valid_moves:
+                suit = card.suit_index
+                if (suit != SPADES and masters >> card.index & 1 and not opponents >> suit & 1
+                        and (best is None or tracker.unseen_counts[suit] > tracker.unseen_counts[best.suit_index])):
+                    best = card
+            if best is not None:
+                return best
+        return super().play(engine, player, valid_moves)
+
+def compare_engine(tracker, engine):
+    # Differences between a seat's tracker and the same knowledge worked out from the engine, as messages.
+    seat = tracker.seat
+    players = engine.players
+    played = hand_to_mask(card for _, card, _, _ in engine.round_plays)
+    own = players[seat].index.mask
+    errors = []
+    expected = {
+        "own": own,
+        "remaining": FULL_DECK & ~played,
+        "unseen": FULL_DECK & ~played & ~own,
+        "unseen_counts": [bin(FULL_DECK & ~played & ~own & mask).count("1") for mask in SUIT_MASKS],
+        "voids": infer_voids(engine.round_plays),
+        "hand_sizes": [len(player.hand) for player in players],
+        "spades_broken": engine.spades_broken,
+    }
+    for name, value in expected.items():
+        if getattr(tracker, name) != value:
+            errors.append(f"seat {seat} {name}: engine {value}, tracker {getattr(tracker, name)}")
+
+    for suit, mask in enumerate(SUIT_MASKS):
+        left = FULL_DECK & ~played & mask
+        if tracker.highest_left(suit) != (left.bit_length() - 1):
+            errors.append(f"seat {seat} highest left in {SUITS[suit]}")
+        for other in range(NUM_PLAYERS):
+            # A void the tracker has inferred must be real.
+            if tracker.is_void(other, suit) and players[other].index.mask & mask:
+                errors.append(f"seat {seat} thinks seat {other} is void in {SUITS[suit]}")
+
+    for index in range(len(rules.CARDS)):
+        chances = [tracker.holds_probability(other, index) for other in range(NUM_PLAYERS)]
+        holder = next((other for other in range(NUM_PLAYERS) if players[other].index.mask >> index & 1), None)
+        if holder is None:
+            if any(chances):
+                errors.append(f"seat {seat} gives a played card a holder")
+        elif abs(sum(chances) - 1) > 1e-9 or not chances[holder]:
+            errors.append(f"seat {seat} probabilities for {rules.CARDS[index]}: {chances}, held by seat {holder}")
+    return errors
+
+def verify(num_games, seed=None, max_rounds=10):
+    """Play random legal games with a tracker for every seat listening to the engine.
+
+    Before every bid and card each tracker is compared with the same knowledge
+    worked out from the engine's hands and the round's plays, and with a tracker
+    rebuilt with from_engine. A snapshot of the engine must bring copies of the
+    trackers that agree with them, follow a card played on the snapshot and leave
+    the live trackers alone. Returns (positions compared, error messages).
+    """
+    rng = random.Random(seed)
+    checked = 0
+    errors = []
+    for _ in range(num_games):
+        engine = rules.Engine(human_seats=range(NUM_PLAYERS), seed=rng.getrandbits(64), max_rounds=max_rounds)
+        engine.start_game()
+        trackers = [get_tracker(engine, seat) for seat in range(NUM_PLAYERS)]
+        while engine.state != STATE_GAME_OVER and not errors:
+            if engine.state == STATE_BID:
+                engine.place_bid(rng.randint(MIN_BID, MAX_BID))
+            elif engine.state == STATE_PLAY:
+                for tracker in trackers:
+                    errors += compare_engine(tracker, engine)
+                    rebuilt = CardTracker.from_engine(engine, tracker.seat)
+                    if any(getattr(rebuilt, name) != getattr(tracker, name)
+                           for name in CardTracker.__slots__ if name != "engine"):
+                        errors.append(f"seat {tracker.seat}: from_engine differs from the incremental tracker")
+                checked += 1
+                player = engine.players[engine.current_player_idx]
+                card = rng.choice(player.get_valid_moves(engine.lead_suit, engine.spades_broken))
+
+                snapshot = engine.snapshot()
+                for tracker in trackers:
+                    copy = snapshot.trackers.by_seat[tracker.seat]
+                    if copy is tracker or any(getattr(copy, name) != getattr(tracker, name)
+                                              for name in CardTracker.__slots__ if name != "engine"):
+                        errors.append(f"seat {tracker.seat}: the snapshot's tracker is not a copy of the live one")
+                snapshot.play_card(snapshot.players[player.position], card)
+                for tracker in snapshot.trackers.by_seat:
+                    errors += compare_engine(tracker, snapshot)
+                engine.play_card(player, card)
+            else:
+                engine.step()
+    return checked, errors
+
+def run_benchmark(num_games, seed=None, max_rounds=10):
+    # Record the positions of AI games, then time keeping a tracker up to date
+    # through them against working the same knowledge out again at every play.
+    rounds = []
+    seeds = random.Random(seed)
+    for _ in range(num_games):
+        engine = rules.Engine(seed=seeds.getrandbits(64), max_rounds=max_rounds)
+        engine.listeners.append(lambda event: event[0] == rules.EVENT_ROUND_END and rounds.append(
+            list(engine.round_plays)))
+        engine.start_game()
+        engine.play_to_end()
+
+    tracker = CardTracker(0)
+    plays = 0
+    start = time.perf_counter()
+    for round_plays in rounds:
+        tracker.start_round(hand_to_mask(card for position, card, _, _ in round_plays if position == 0), False)
+        for position, card, _, _ in round_plays:
+            tracker.record_play(position, card.index)
+            tracker.own_masters()
+            tracker.holds_probability(1, card.index)
+            if tracker.trick_count == NUM_PLAYERS:
+                tracker.end_trick()
+            plays += 1
+    incremental = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for round_plays in rounds:
+        for count in range(1, len(round_plays) + 1):
+            history = round_plays[:count]
+            hand_to_mask(card for _, card, _, _ in history)
+            infer_voids(history)
+    rebuild = time.perf_counter() - start
+
+    return {
+        "rounds": len(rounds),
+        "plays": plays,
+        "incremental_us": incremental / plays * 1e6,
+        "rebuild_us": rebuild / plays * 1e6,
+    }
+
+def run_match(num_games, seed=None, max_rounds=rules.SIMULATION_MAX_ROUNDS):
+    # The tracking AI against PartnerAwarePolicy, alternating which partnership it plays.
+    policy = TrackingPolicy()
+    partner = PartnerAwarePolicy()
+    seeds = random.Random(seed)
+    wins = 0
+    margin = 0
+    for game in range(num_games):
+        team = game % 2
+        policies = [policy if seat % 2 == team else partner for seat in range(NUM_PLAYERS)]
+        engine = rules.Engine(seed=seeds.getrandbits(64), max_rounds=max_rounds, policies=policies)
+        engine.start_game()
+        engine.play_to_end()
+        wins += engine.get_winning_team() == team
+        margin += engine.team_scores[team] - engine.team_scores[1 - team]
+    return {"games": num_games, "wins": wins, "average_margin": margin / num_games if num_games else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and verify the card-tracking model")
+    parser.add_argument("--games", type=int, default=200, help="number of seeded games")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--max-rounds", type=int, default=10, help="rounds per game")
+    parser.add_argument("--verify", action="store_true",
+                        help="instead, check every seat's tracker against the engine over random games")
+    parser.add_argument("--match", action="store_true",
+                        help="instead, play the tracking AI against the partner-aware AI")
+    args = parser.parse_args()
+
+    if args.verify:
+        checked, errors = verify(args.games, args.seed, args.max_rounds)
+        for error in errors[:20]:
+            print(error)
+        print(f"Compared {checked} positions over {args.games} games: {len(errors)} differences")
+        raise SystemExit(1 if errors else 0)
+
+    if args.match:
+        result = run_match(args.games, args.seed, args.max_rounds)
+        print(f"Tracking vs partner-aware: won {result['wins']} of {result['games']} games, "
+              f"average margin {result['average_margin']:+.1f}")
+        return
+
+    result = run_benchmark(args.games, args.seed, args.max_rounds)
+    print(f"{result['plays']} plays over {result['rounds']} rounds")
+    print(f"  Incremental tracker (update and queries): {result['incremental_us']:.2f} us per play")
+    print(f"  Rebuilt from the round's plays:           {result['rebuild_us']:.2f} us per play")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from array import array
+
+from server import DEFAULT_PORT, MAX_LINE_BYTES, ClientProtocol, TableServer
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LoadStats:
+    def __init__(self):
+        self.round_trips = array("d")
+        self.games = 0
+        self.errors = 0
+
+    def percentile(self, pct):
+        ordered = sorted(self.round_trips)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class BotClient(asyncio.Protocol):
+    """One connection playing a number of tables at once with random legal moves.
+
+    The round trip of a move is the time from sending a bid or card to receiving
+    the next prompt for that table (or its game over), which covers the server
+    playing the three AI seats in between.
+    """
+
+    def __init__(self, num_tables, stats, rng, deadline):
+        self.num_tables = num_tables
+        self.stats = stats
+        self.rng = rng
+        self.deadline = deadline
+        self.transport = None
+        self.buffer = b""
+        self.pending = []
+        self.sent_at = {}
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(b"".join(self.new_table() for _ in range(self.num_tables)))
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def new_table(self):
+        return f"N {self.rng.randrange(1 << 30)}\n".encode("ascii")
+
+    def data_received(self, data):
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()
+        now = time.perf_counter()
+        stats = self.stats
+        pending = self.pending
+        for line in lines:
+            parts = line.decode("ascii").split()
+            kind = parts[0]
+            if kind in ("B", "Y", "O"):
+                table_id = parts[1]
+                sent = self.sent_at.pop(table_id, None)
+                if sent is not None:
+                    stats.round_trips.append(now - sent)
+                if kind == "B":
+                    pending.append(f"B {table_id} {self.rng.randint(1, 4)}\n")
+                    self.sent_at[table_id] = now
+                elif kind == "Y":
+                    pending.append(f"P {table_id} {self.rng.choice(parts[2:])}\n")
+                    self.sent_at[table_id] = now
+                else:
+                    stats.games += 1
+                    if now < self.deadline:
+                        pending.append(self.new_table().decode("ascii"))
+            elif kind == "E":
+                stats.errors += 1
+        if pending:
+            self.transport.write("".join(pending).encode("ascii"))
+            pending.clear()
+
+async def start_server(port, max_rounds):
+    command = [sys.executable, SERVER_PATH, "--port", str(port), "--stats-interval", "0"]
+    if max_rounds is not None:
+        command += ["--max-rounds", str(max_rounds)]
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+    await process.stdout.readline()
+    return process
+
+async def run_load(host, port, num_clients, tables_per_client, duration, seed=None):
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + duration
+    clients = []
+    for _ in range(num_clients):
+        client = BotClient(tables_per_client, stats, random.Random(rng.random()), deadline)
+        await loop.create_connection(lambda: client, host, port)
+        clients.append(client)
+
+    await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.transport.close()
+    await asyncio.gather(*(client.closed for client in clients))
+
+    return {
+        "elapsed": elapsed,
+        "tables": num_clients * tables_per_client,
+        "games": stats.games,
+        "moves": len(stats.round_trips),
+        "errors": stats.errors,
+        "tables_per_second": stats.games / elapsed,
+        "moves_per_second": len(stats.round_trips) / elapsed,
+        "round_trip_ms": {pct: stats.percentile(pct) * 1000 for pct in PERCENTILES},
+    }
+
+async def check_limits(max_tables=5, timeout=5.0):
+    # Misbehaving clients against an in-process server: one opens more tables than allowed,
+    # others send a line that never ends and an overlong line that does. All must be held
+    # to the server's limits.
+    server = TableServer(max_rounds=1, max_tables=max_tables)
+    loop = asyncio.get_running_loop()
+    listener = await loop.create_server(lambda: ClientProtocol(server), "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    result = {}
+    async with listener:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"N\n" * (max_tables + 2))
+        opened = rejected = 0
+        while opened + rejected < max_tables + 2:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line.startswith(b"N "):
+                opened += 1
+            elif line == b"E 0 too many tables\n":
+                rejected += 1
+        result["tables_opened"] = opened
+        result["tables_rejected"] = rejected
+        result["tables_open"] = len(server.tables)
+        writer.close()
+        await writer.wait_closed()
+
+        for name, data in (("unfinished_line_dropped", b"N" * (MAX_LINE_BYTES * 64)),
+                           ("long_line_dropped", b"N" + b" " * (MAX_LINE_BYTES * 20) + b"\n")):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(data)
+            try:
+                # The server closes the connection without answering.
+                result[name] = await asyncio.wait_for(reader.read(), timeout) == b""
+            except (ConnectionError, asyncio.TimeoutError):
+                result[name] = False
+            writer.close()
+        # connection_lost runs on a later turn of the loop.
+        for _ in range(100):
+            if server.connections == 0:
+                break
+            await asyncio.sleep(0.01)
+        result["connections_left"] = server.connections
+
+    result["ok"] = (result["tables_opened"] == max_tables and result["tables_rejected"] == 2
+                    and result["tables_open"] == max_tables and result["unfinished_line_dropped"]
+                    and result["long_line_dropped"]
+                    and result["connections_left"] == 0)
+    return result
+
+async def main_async(args):
+    process = None
+    if args.spawn_server:
+        process = await start_server(args.port, args.max_rounds)
+    try:
+        return await run_load(args.host, args.port, args.clients, args.tables, args.duration, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many bot tables against a Spades server and report latency")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server port")
+    parser.add_argument("--clients", type=int, default=20, help="bot connections")
+    parser.add_argument("--tables", type=int, default=50, help="tables each connection keeps open at once")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the table deals and bot moves")
+    parser.add_argument("--spawn-server", action="store_true", help="start server.py on --port for the run")
+    parser.add_argument("--max-rounds", type=int, help="with --spawn-server, end each game after this many rounds")
+    parser.add_argument("--check-limits", action="store_true",
+                        help="instead of the load, check that an in-process server holds clients to its line "
+                             "length and tables-per-connection limits")
+    args = parser.parse_args()
+
+    if args.check_limits:
+        result = asyncio.run(check_limits())
+        print(f"Tables per connection: {result['tables_opened']} opened, {result['tables_rejected']} rejected; "
+              f"overlong line dropped: {result['long_line_dropped']}, "
+              f"unfinished: {result['unfinished_line_dropped']}; "
+              f"connections left open: {result['connections_left']} ({'OK' if result['ok'] else 'FAILED'})")
+        sys.exit(0 if result["ok"] else 1)
+
+    result = asyncio.run(main_async(args))
+    latency = result["round_trip_ms"]
+    print(f"{result['tables']} concurrent tables over {args.clients} connections for {result['elapsed']:.1f} s")
+    print(f"  {result['games']} games finished ({result['tables_per_second']:.1f} tables/s), "
+          f"{result['moves']} moves ({result['moves_per_second']:.0f} moves/s), {result['errors']} errors")
+    print("  Move round trip: " + ", ".join(f"p{pct:g} {latency[pct]:.2f} ms" for pct in PERCENTILES))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import multiprocessing
+import random
+import time
+
+import rules
+from bitboard import SPADES, card_index, index_suit, beating_cards, ai_play
+from knowledge import get_tracker
+from rules import SUITS, NUM_PLAYERS, BAG_LIMIT, BAG_PENALTY, HeuristicPolicy
+
+DEFAULT_BUDGET_MS = 50
+MAX_DEAL_ATTEMPTS = 20
+# Time reserved for sending work to the pool and collecting the results.
+PARALLEL_MARGIN = 0.005
+
+def make_snapshot(engine, player, tracker):
+    winner_index = -1
+    winner_seat = player.position
+    for position, card in ((p.position, c) for p, c in engine.trick_pile):
+        index = card_index(card)
+        if winner_index < 0 or beating_cards(1 << index, winner_index):
+            winner_index = index
+            winner_seat = position
+
+    return {
+        "seat": player.position,
+        "own": tracker.own,
+        "unseen": tracker.unseen,
+        "counts": list(tracker.hand_sizes),
+        "voids": list(tracker.voids),
+        "lead_suit": SUITS.index(engine.lead_suit) if engine.lead_suit is not None else None,
+        "winner_index": winner_index,
+        "winner_seat": winner_seat,
+        "trick_count": len(engine.trick_pile),
+        "tricks": [p.tricks_won for p in engine.players],
+        "spades_broken": engine.spades_broken,
+        "bids": [p.bid for p in engine.players],
+        "team_bags": list(engine.team_bags),
+    }
+
+def sample_hands(snapshot, rng):
+    seat = snapshot["seat"]
+    voids = snapshot["voids"]
+    others = [s for s in range(NUM_PLAYERS) if s != seat]
+    cards = []
+    mask = snapshot["unseen"]
+    while mask:
+        low = mask & -mask
+        cards.append(low.bit_length() - 1)
+        mask ^= low
+
+    for _ in range(MAX_DEAL_ATTEMPTS):
+        rng.shuffle(cards)
+        # Place the most constrained suits first so voids rarely force a restart.
+        cards.sort(key=lambda i: sum(not voids[s] >> index_suit(i) & 1 for s in others))
+        remaining = list(snapshot["counts"])
+        hands = [0] * NUM_PLAYERS
+        hands[seat] = snapshot["own"]
+        for index in cards:
+            suit = index_suit(index)
+            choices = [s for s in others if remaining[s] and not voids[s] >> suit & 1]
+            if not choices:
+                break
+            pick = rng.randrange(sum(remaining[s] for s in choices))
+            for s in choices:
+                pick -= remaining[s]
+                if pick < 0:
+                    break
+            hands[s] |= 1 << index
+            remaining[s] -= 1
+        else:
+            return hands
+    return None
+
+def playout(hands, seat, first_index, lead_suit, winner_index, winner_seat, trick_count, tricks, spades_broken):
+    hands = list(hands)
+    tricks = list(tricks)
+    index = first_index
+    while True:
+        while trick_count < NUM_PLAYERS:
+            if index < 0:
+                index = ai_play(hands[seat], lead_suit, spades_broken, winner_index)
+            bit = 1 << index
+            hands[seat] ^= bit
+            if lead_suit is None:
+                lead_suit = index_suit(index)
+                if lead_suit == SPADES:
+                    spades_broken = True
+                winner_index = index
+                winner_seat = seat
+            elif beating_cards(bit, winner_index):
+                winner_index = index
+                winner_seat = seat
+            seat = (seat + 1) % NUM_PLAYERS
+            trick_count += 1
+            index = -1
+
+        tricks[winner_seat] += 1
+        if not hands[winner_seat]:
+            return tricks
+        seat = winner_seat
+        lead_suit = None
+        winner_index = -1
+        trick_count = 0
+
+def round_points(tricks, bids, team_bags, team):
+    total_bid = bids[team] + bids[team + 2]
+    total_won = tricks[team] + tricks[team + 2]
+    if total_won < total_bid:
+        return -total_bid * 10
+    bags = total_won - total_bid
+    penalty = BAG_PENALTY if team_bags[team] + bags >= BAG_LIMIT else 0
+    return total_bid * 10 + bags - penalty
+
+def team_outcome(tricks, snapshot):
+    team = snapshot["seat"] % 2
+    bids = snapshot["bids"]
+    team_bags = snapshot["team_bags"]
+    return round_points(tricks, bids, team_bags, team) - round_points(tricks, bids, team_bags, 1 - team)
+
+def evaluate(snapshot, candidates, deadline, rng):
+    totals = [0] * len(candidates)
+    samples = 0
+    args = (snapshot["lead_suit"], snapshot["winner_index"], snapshot["winner_seat"],
+            snapshot["trick_count"], snapshot["tricks"], snapshot["spades_broken"])
+    while time.perf_counter() < deadline:
+        hands = sample_hands(snapshot, rng)
+        if hands is None:
+            break
+        outcomes = []
+        for index in candidates:
+            if time.perf_counter() >= deadline:
+                # A partly evaluated sample would favour the cards tried first.
+                return totals, samples
+            outcomes.append(team_outcome(playout(hands, snapshot["seat"], index, *args), snapshot))
+        for i, outcome in enumerate(outcomes):
+            totals[i] += outcome
+        samples += 1
+    return totals, samples
+
+def evaluate_worker(task):
+    snapshot, candidates, budget, seed = task
+    return evaluate(snapshot, candidates, time.perf_counter() + budget, random.Random(seed))
+
+class MonteCarloPolicy(HeuristicPolicy):
+    name = "montecarlo"
+
+    def __init__(self, budget_ms=DEFAULT_BUDGET_MS, workers=1, seed=None):
+        self.budget = budget_ms / 1000
+        self.workers = workers
+        self.rng = random.Random(seed)
+        # The pool is started up front so its start-up cost never lands inside a move's budget.
+        self.pool = multiprocessing.Pool(workers) if workers > 1 else None
+
+        self.decisions = 0
+        self.samples = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def prepare(self, engine, player):
+        get_tracker(engine, player.position)
+
+    def play(self, engine, player, valid_moves):
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+
+        start = time.perf_counter()
+        snapshot = make_snapshot(engine, player, get_tracker(engine, player.position))
+        candidates = [card_index(card) for card in valid_moves]
+        if self.pool is not None:
+            totals, samples = self.evaluate_parallel(snapshot, candidates, start)
+        else:
+            totals, samples = evaluate(snapshot, candidates, start + self.budget, self.rng)
+        elapsed = time.perf_counter() - start
+
+        self.decisions += 1
+        self.samples += samples
+        self.seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+        if not samples:
+            return super().play(engine, player, valid_moves)
+        best = min(range(len(candidates)), key=lambda i: (-totals[i], valid_moves[i].value))
+        return valid_moves[best]
+
+    def evaluate_parallel(self, snapshot, candidates, start):
+        budget = self.budget - (time.perf_counter() - start) - PARALLEL_MARGIN
+        tasks = [(snapshot, candidates, budget, self.rng.getrandbits(64)) for _ in range(self.workers)]
+        totals = [0] * len(candidates)
+        samples = 0
+        for worker_totals, worker_samples in self.pool.map(evaluate_worker, tasks):
+            totals = [a + b for a, b in zip(totals, worker_totals)]
+            samples += worker_samples
+        return totals, samples
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def get_stats(self):
+        return {
+            "decisions": self.decisions,
+            "samples": self.samples,
+            "seconds": self.seconds,
+            "samples_per_second": self.samples / self.seconds if self.seconds else 0.0,
+            "average_ms": self.seconds / self.decisions * 1000 if self.decisions else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+def run_match(num_games, budget_ms, workers, seed=None, max_rounds=rules.SIMULATION_MAX_ROUNDS):
+    policy = MonteCarloPolicy(budget_ms, workers, seed)
+    heuristic = HeuristicPolicy()
+    seeds = random.Random(seed)
+    wins = 0
+    margin = 0
+    try:
+        for game in range(num_games):
+            # Alternate which partnership the sampling AI plays.
+            team = game % 2
+            policies = [policy if seat % 2 == team else heuristic for seat in range(NUM_PLAYERS)]
+            engine = rules.Engine(seed=seeds.getrandbits(64), max_rounds=max_rounds, policies=policies)
+            engine.start_game()
+            engine.play_to_end()
+            wins += engine.get_winning_team() == team
+            margin += engine.team_scores[team] - engine.team_scores[1 - team]
+    finally:
+        policy.close()
+
+    result = policy.get_stats()
+    result.update({
+        "games": num_games,
+        "wins": wins,
+        "average_margin": margin / num_games if num_games else 0.0,
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the Monte Carlo AI against the heuristic AI")
+    parser.add_argument("--games", type=int, default=2, help="number of games")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="time budget per card played")
+    parser.add_argument("--workers", type=int, default=1, help="processes sampling each decision")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--max-rounds", type=int, default=5, help="rounds per game")
+    args = parser.parse_args()
+
+    result = run_match(args.games, args.budget_ms, args.workers, args.seed, args.max_rounds)
+    print(f"Monte Carlo vs heuristic: won {result['wins']} of {result['games']} games, "
+          f"average margin {result['average_margin']:+.1f}")
+    print(f"  {result['decisions']} decisions, {result['samples']} samples "
+          f"({result['samples_per_second']:.0f} samples/s with {args.workers} workers)")
+    print(f"  Time per decision: {result['average_ms']:.1f} ms average, {result['max_ms']:.1f} ms max "
+          f"(budget {args.budget_ms:g} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import json
+import time
+from array import array
+
+import pygame
+
+PHASES = ("input", "update", "table", "cards", "overlays", "profiler", "flip", "wait")
+FRAME_HISTORY = 600
+OVERLAY_REFRESH_FRAMES = 15
+GRAPH_FRAMES = 180
+GRAPH_HEIGHT = 60
+OVERLAY_WIDTH = 360
+PERCENTILES = (50, 95, 99)
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, len(ordered) * pct // 100)]
+
+class FrameProfiler:
+    """Per-phase frame timings kept in a fixed-size ring buffer.
+
+    The game calls mark(phase) at the end of each phase, which charges the time
+    since the previous mark to that phase, and end_frame() once per clock.tick.
+    Nothing is created unless profiling is switched on, so the game pays only for
+    a few `is not None` checks when it is off.
+    """
+
+    def __init__(self, fps, capacity=FRAME_HISTORY):
+        self.frame_ms = 1000.0 / fps
+        self.capacity = capacity
+        self.phase_index = {phase: i for i, phase in enumerate(PHASES)}
+        self.timings = [array("d", bytes(8 * capacity)) for _ in PHASES]
+        self.frame_times = array("d", bytes(8 * capacity))
+        self.missed = array("H", bytes(2 * capacity))
+        self.current = [0.0] * len(PHASES)
+        self.frames = 0
+        self.missed_total = 0
+        self.last_mark = time.perf_counter()
+
+        self.show_overlay = False
+        self.overlay = None
+        self.overlay_frame = -OVERLAY_REFRESH_FRAMES
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[self.phase_index[phase]] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self, tick_ms):
+        slot = self.frames % self.capacity
+        for timing, value in zip(self.timings, self.current):
+            timing[slot] = value * 1000
+        missed = max(0, round(tick_ms / self.frame_ms) - 1)
+        self.frame_times[slot] = tick_ms
+        self.missed[slot] = min(missed, 0xFFFF)
+        self.missed_total += missed
+        self.frames += 1
+        self.current = [0.0] * len(PHASES)
+
+    def recorded_slots(self):
+        # Ring buffer slots from the oldest to the newest frame.
+        count = min(self.frames, self.capacity)
+        start = self.frames - count
+        return [(start + i) % self.capacity for i in range(count)]
+
+    def get_summary(self):
+        slots = self.recorded_slots()
+        summary = {"frames": self.frames, "recorded": len(slots), "missed_frames": self.missed_total}
+        for name, values in [("frame", self.frame_times)] + list(zip(PHASES, self.timings)):
+            ordered = sorted(values[slot] for slot in slots)
+            summary[name] = {f"p{pct}": percentile(ordered, pct) for pct in PERCENTILES}
+        return summary
+
+    def dump(self, path):
+        slots = self.recorded_slots()
+        first = self.frames - len(slots)
+        frames = [{
+            "frame": first + i,
+            "frame_ms": self.frame_times[slot],
+            "missed": self.missed[slot],
+            "phases_ms": {phase: self.timings[p][slot] for p, phase in enumerate(PHASES)},
+        } for i, slot in enumerate(slots)]
+        with open(path, "w") as f:
+            json.dump({"fps": 1000.0 / self.frame_ms, "summary": self.get_summary(), "frames": frames}, f, indent=1)
+
+    def draw_overlay(self, surface, font):
+        if self.frames - self.overlay_frame >= OVERLAY_REFRESH_FRAMES:
+            self.overlay = self.render_overlay(font)
+            self.overlay_frame = self.frames
+        rect = self.overlay.get_rect(topleft=(10, 45))
+        surface.blit(self.overlay, rect)
+        return rect
+
+    def render_overlay(self, font):
+        summary = self.get_summary()
+        line_height = font.get_linesize()
+        rows = [("phase", "p50", "p95", "p99")]
+        for name in ("frame",) + PHASES:
+            rows.append((name,) + tuple(f"{summary[name][f'p{pct}']:.2f}" for pct in PERCENTILES))
+        height = (len(rows) + 2) * line_height + GRAPH_HEIGHT + 20
+        overlay = pygame.Surface((OVERLAY_WIDTH, height))
+        overlay.fill((0, 0, 0))
+
+        y = 5
+        for row in rows:
+            for column, text in enumerate(row):
+                overlay.blit(font.render(text, True, (255, 255, 255)), (10 + column * 85, y))
+            y += line_height
+        overlay.blit(font.render(f"{summary['missed_frames']} missed frames of {summary['frames']} (ms)",
+                                 True, (255, 215, 0)), (10, y))
+        y += line_height + 10
+
+        # Frame-time graph: one bar per recent frame, red when over budget, budget line in gray.
+        scale = GRAPH_HEIGHT / (self.frame_ms * 2)
+        bottom = y + GRAPH_HEIGHT
+        bar_width = max(1, (OVERLAY_WIDTH - 20) // GRAPH_FRAMES)
+        for i, slot in enumerate(self.recorded_slots()[-GRAPH_FRAMES:]):
+            frame_ms = self.frame_times[slot]
+            bar_height = min(GRAPH_HEIGHT, int(frame_ms * scale))
+            color = (220, 20, 20) if frame_ms > self.frame_ms * 1.5 else (50, 205, 50)
+            overlay.fill(color, (10 + i * bar_width, bottom - bar_height, bar_width, bar_height))
+        budget_y = bottom - int(self.frame_ms * scale)
+        pygame.draw.line(overlay, (180, 180, 180), (10, budget_y), (OVERLAY_WIDTH - 10, budget_y))
+        return overlay
+
+class StartupProfile:
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"Time to first frame: {(self.last - self.start) * 1000:.1f} ms"]
+        lines += [f"  {phase:20s} {seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        return "\n".join(lines)
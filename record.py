@@ -0,0 +1,427 @@
+import argparse
+import mmap
+import os
+import queue
+import random
+import struct
+import threading
+import time
+
+import rules
+from bitboard import RANKS_PER_SUIT, SPADES, card_index
+from rules import (NUM_PLAYERS, STATE_GAME_OVER, EVENT_DEAL, EVENT_BID, EVENT_PLAY, EVENT_TRICK, EVENT_ROUND_END,
+                   EVENT_GAME_OVER)
+
+MAGIC = b"SPGR"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sH")
+# Length of the rest of the game, length of its event stream, rounds, final team scores
+# and the winning team (-1 for a game that was abandoned).
+GAME_HEADER = struct.Struct("<IIHiib")
+# Where a round starts in the event stream, the dealer, team scores and bags going into
+# the round, and whether spades were already broken. A round's records all have fixed
+# sizes (deal, four bids, then four cards and a winner per trick), so the start of any
+# trick is a fixed distance from its round's checkpoint.
+ROUND_CHECKPOINT = struct.Struct("<IBiiBBB")
+ROUND_SCORE = struct.Struct("<iiBB")
+TRICKS_PER_ROUND = 13
+NUM_CARDS = 52
+
+# Event stream. A card is one byte, seat << 6 | card index, which leaves 0xF4 and up free
+# for the other records.
+TAG_TRICK = 0xF4        # + winning seat
+TAG_ROUND = 0xF8        # dealer, then the 52 cards in the order they were dealt
+TAG_BID = 0xF9          # seat << 4 | bid
+TAG_ROUND_END = 0xFC    # ROUND_SCORE
+TAG_GAME_OVER = 0xFD    # winning team
+
+DEAL_SIZE = 2 + NUM_CARDS
+BIDS_SIZE = 2 * NUM_PLAYERS
+TRICK_SIZE = NUM_PLAYERS + 1
+WRITE_BUFFER_SIZE = 1 << 16
+
+class RecordWriter:
+    """Appends finished games to a record file from a background thread.
+
+    write() only puts the encoded game on a queue, so the caller (the frame loop)
+    never waits for the disk. The thread flushes whenever it has drained the queue.
+    """
+
+    def __init__(self, path, buffer_size=WRITE_BUFFER_SIZE):
+        if os.path.exists(path) and os.path.getsize(path):
+            # Drop a partial game left by a crash, so the games appended after it can be found.
+            reader = RecordReader(path)
+            for _ in reader.scan():
+                pass
+            end = reader.end
+            reader.close()
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+        self.file = open(path, "ab", buffering=buffer_size)
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.queue = queue.SimpleQueue()
+        self.games_written = 0
+        self.bytes_written = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, chunk):
+        self.queue.put(chunk)
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            self.file.write(chunk)
+            self.games_written += 1
+            self.bytes_written += len(chunk)
+            if self.queue.empty():
+                self.file.flush()
+        self.file.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+def encode_name(name):
+    # A name gets one length byte, so cut it to 255 bytes, backing off to the last
+    # whole character rather than splitting a multi-byte one.
+    return name.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8")
+
+class GameRecorder:
+    def __init__(self, engine, writer):
+        self.engine = engine
+        self.writer = writer
+        self.events = bytearray()
+        self.rounds = bytearray()
+        self.finished = False
+        engine.listeners.append(self.on_event)
+
+    def on_event(self, event):
+        kind = event[0]
+        engine = self.engine
+        events = self.events
+        if kind == EVENT_PLAY:
+            events.append(event[1].position << 6 | card_index(event[2]))
+        elif kind == EVENT_TRICK:
+            events.append(TAG_TRICK + event[1].position)
+        elif kind == EVENT_BID:
+            events += bytes((TAG_BID, event[1].position << 4 | event[2]))
+        elif kind == EVENT_DEAL:
+            self.rounds += ROUND_CHECKPOINT.pack(len(events), engine.dealer_idx, *engine.team_scores,
+                                                 *engine.team_bags, engine.spades_broken)
+            events += bytes((TAG_ROUND, engine.dealer_idx))
+            events += bytes(card_index(card) for card in engine.deck.cards)
+        elif kind == EVENT_ROUND_END:
+            events.append(TAG_ROUND_END)
+            events += ROUND_SCORE.pack(*engine.team_scores, *engine.team_bags)
+        elif kind == EVENT_GAME_OVER:
+            events += bytes((TAG_GAME_OVER, event[1]))
+            self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.engine.listeners.remove(self.on_event)
+        engine = self.engine
+        winner = engine.get_winning_team() if engine.state == STATE_GAME_OVER else -1
+        names = b"".join(bytes((len(encoded),)) + encoded
+                         for encoded in (encode_name(player.name) for player in engine.players))
+        body = names + self.events + self.rounds
+        self.writer.write(GAME_HEADER.pack(len(body), len(self.events), len(self.rounds) // ROUND_CHECKPOINT.size,
+                                           *engine.team_scores, winner) + body)
+
+class GameRecord:
+    """One recorded game: its header, event stream and round checkpoints."""
+
+    def __init__(self, data, offset):
+        body_length, events_length, self.num_rounds, score0, score1, self.winner = \
+            GAME_HEADER.unpack_from(data, offset)
+        self.team_scores = [score0, score1]
+        position = offset + GAME_HEADER.size
+        end = position + body_length
+        self.names = []
+        for _ in range(NUM_PLAYERS):
+            length = data[position]
+            self.names.append(bytes(data[position + 1:position + 1 + length]).decode("utf-8"))
+            position += 1 + length
+        self.events = bytes(data[position:position + events_length])
+        self.index = bytes(data[position + events_length:end])
+
+    def num_tricks(self, round_idx):
+        # Tricks finished in the round (fewer than 13 only if the game was abandoned).
+        start = ROUND_CHECKPOINT.unpack_from(self.index, round_idx * ROUND_CHECKPOINT.size)[0] + DEAL_SIZE + BIDS_SIZE
+        return max(0, min(TRICKS_PER_ROUND, (len(self.events) - start) // TRICK_SIZE))
+
+    def state_at(self, round_idx, trick_idx=0):
+        """The position at the start of a trick, from its round's checkpoint.
+
+        Hands are bit masks of card indices (see bitboard.card_index) and offset is
+        where the events from that point on begin, for replaying the rest.
+        """
+        offset, dealer, score0, score1, bags0, bags1, broken = ROUND_CHECKPOINT.unpack_from(
+            self.index, round_idx * ROUND_CHECKPOINT.size)
+        events = self.events
+        hands = [0] * NUM_PLAYERS
+        for i, index in enumerate(events[offset + 2:offset + DEAL_SIZE]):
+            hands[i % NUM_PLAYERS] |= 1 << index
+        bids = [None] * NUM_PLAYERS
+        for i in range(offset + DEAL_SIZE, min(offset + DEAL_SIZE + BIDS_SIZE, len(events)), 2):
+            if events[i] != TAG_BID:
+                break
+            bids[events[i + 1] >> 4] = events[i + 1] & 15
+
+        # At most 12 tricks separate the round's checkpoint from the one asked for.
+        tricks_won = [0] * NUM_PLAYERS
+        leader = (dealer + 1) % NUM_PLAYERS
+        start = offset + DEAL_SIZE + BIDS_SIZE
+        for trick in range(trick_idx):
+            position = start + trick * TRICK_SIZE
+            lead = events[position]
+            if (lead & 63) // RANKS_PER_SUIT == SPADES:
+                broken = True
+            for byte in events[position:position + NUM_PLAYERS]:
+                hands[byte >> 6] &= ~(1 << (byte & 63))
+            leader = events[position + NUM_PLAYERS] - TAG_TRICK
+            tricks_won[leader] += 1
+
+        return {
+            "round": round_idx,
+            "trick": trick_idx,
+            "dealer": dealer,
+            "team_scores": [score0, score1],
+            "team_bags": [bags0, bags1],
+            "bids": bids,
+            "hands": hands,
+            "tricks_won": tricks_won,
+            "leader": leader,
+            "spades_broken": bool(broken),
+            "offset": start + trick_idx * TRICK_SIZE if trick_idx else offset + DEAL_SIZE,
+        }
+
+    def replay(self, offset=0):
+        """Decode the event stream from offset, yielding engine-style event tuples.
+
+        Plays are (EVENT_PLAY, seat, card_index) and tricks (EVENT_TRICK, seat).
+        """
+        events = self.events
+        end = len(events)
+        while offset < end:
+            byte = events[offset]
+            if byte < TAG_TRICK:
+                yield (EVENT_PLAY, byte >> 6, byte & 63)
+                offset += 1
+            elif byte < TAG_ROUND:
+                yield (EVENT_TRICK, byte - TAG_TRICK)
+                offset += 1
+            elif byte == TAG_ROUND:
+                yield (EVENT_DEAL, events[offset + 1], events[offset + 2:offset + DEAL_SIZE])
+                offset += DEAL_SIZE
+            elif byte == TAG_BID:
+                yield (EVENT_BID, events[offset + 1] >> 4, events[offset + 1] & 15)
+                offset += 2
+            elif byte == TAG_ROUND_END:
+                score0, score1, bags0, bags1 = ROUND_SCORE.unpack_from(events, offset + 1)
+                yield (EVENT_ROUND_END, [score0, score1], [bags0, bags1])
+                offset += 1 + ROUND_SCORE.size
+            elif byte == TAG_GAME_OVER:
+                yield (EVENT_GAME_OVER, events[offset + 1])
+                offset += 2
+            else:
+                raise ValueError(f"bad event byte {byte:#x} at {offset}")
+
+    def replay_state(self, round_idx, trick_idx=0):
+        """The same position as state_at, worked out by replaying every event before it."""
+        rounds = -1
+        tricks = 0
+        cards_in_trick = 0
+        team_scores, team_bags = [0, 0], [0, 0]
+        spades_broken = False
+        state = None
+        for event in self.replay():
+            kind = event[0]
+            if kind == EVENT_DEAL:
+                rounds += 1
+                if rounds > round_idx:
+                    break
+                dealer = event[1]
+                hands = [0] * NUM_PLAYERS
+                for i, index in enumerate(event[2]):
+                    hands[i % NUM_PLAYERS] |= 1 << index
+                state = {"round": round_idx, "trick": trick_idx, "dealer": dealer,
+                         "team_scores": list(team_scores), "team_bags": list(team_bags),
+                         "bids": [None] * NUM_PLAYERS, "hands": hands, "tricks_won": [0] * NUM_PLAYERS,
+                         "leader": (dealer + 1) % NUM_PLAYERS}
+                tricks = 0
+            elif kind == EVENT_BID:
+                state["bids"][event[1]] = event[2]
+            elif kind == EVENT_PLAY:
+                if rounds == round_idx and tricks == trick_idx:
+                    break
+                index = event[2]
+                state["hands"][event[1]] &= ~(1 << index)
+                if cards_in_trick == 0 and index // RANKS_PER_SUIT == SPADES:
+                    spades_broken = True
+                cards_in_trick += 1
+            elif kind == EVENT_TRICK:
+                tricks += 1
+                cards_in_trick = 0
+                state["tricks_won"][event[1]] += 1
+                state["leader"] = event[1]
+            elif kind == EVENT_ROUND_END:
+                team_scores, team_bags = event[1], event[2]
+        state["spades_broken"] = spades_broken
+        return state
+
+class RecordReader:
+    """Memory-maps a record file and finds games by hopping over their length prefixes."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} game record")
+        self.offsets = None
+        self.end = FILE_HEADER.size
+
+    def scan(self):
+        """Yield (offset, rounds, team scores, winner) for every game, reading only the headers.
+
+        A game cut short at the end of the file (the writer crashed mid-write) is left
+        out; afterwards end is where the last complete game stops.
+        """
+        data = self.data
+        end = len(data)
+        offset = FILE_HEADER.size
+        unpack_from = GAME_HEADER.unpack_from
+        header_size = GAME_HEADER.size
+        while offset + header_size <= end:
+            body_length, _, num_rounds, score0, score1, winner = unpack_from(data, offset)
+            if offset + header_size + body_length > end:
+                break
+            yield offset, num_rounds, score0, score1, winner
+            offset += header_size + body_length
+        self.end = offset
+
+    def __len__(self):
+        return len(self.get_offsets())
+
+    def get_offsets(self):
+        if self.offsets is None:
+            self.offsets = [entry[0] for entry in self.scan()]
+        return self.offsets
+
+    def game(self, game_idx):
+        return GameRecord(self.data, self.get_offsets()[game_idx])
+
+    def __iter__(self):
+        for entry in self.scan():
+            yield GameRecord(self.data, entry[0])
+
+    def close(self):
+        self.data.close()
+
+def record_games(path, num_games, seed=None, max_rounds=rules.SIMULATION_MAX_ROUNDS):
+    seeds = random.Random(seed)
+    writer = RecordWriter(path)
+    start = time.perf_counter()
+    for _ in range(num_games):
+        engine = rules.Engine(seed=seeds.random(), max_rounds=max_rounds)
+        GameRecorder(engine, writer)
+        engine.start_game()
+        engine.play_to_end()
+    queued = time.perf_counter() - start
+    writer.close()
+    return {
+        "games": writer.games_written,
+        "bytes": writer.bytes_written,
+        "seconds": queued,
+        "flush_seconds": time.perf_counter() - start - queued,
+    }
+
+def check_seeks(reader, num_seeks, seed=None):
+    # Random (game, round, trick) positions: time the index lookup, then check it
+    # against a replay of every event up to the same point.
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(num_seeks):
+        game = reader.game(rng.randrange(len(reader)))
+        round_idx = rng.randrange(game.num_rounds)
+        positions.append((game, round_idx, rng.randrange(max(1, game.num_tricks(round_idx)))))
+
+    start = time.perf_counter()
+    states = [game.state_at(round_idx, trick_idx) for game, round_idx, trick_idx in positions]
+    seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for (game, round_idx, trick_idx), state in zip(positions, states):
+        state = dict(state)
+        del state["offset"]
+        mismatches += state != game.replay_state(round_idx, trick_idx)
+    return {"seeks": num_seeks, "seek_us": seconds / num_seeks * 1e6, "mismatches": mismatches}
+
+def scan_file(reader):
+    start = time.perf_counter()
+    games = rounds = 0
+    wins = [0, 0]
+    for _, num_rounds, score0, score1, winner in reader.scan():
+        games += 1
+        rounds += num_rounds
+        if winner >= 0:
+            wins[winner] += 1
+    header_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cards = 0
+    for game in reader:
+        cards += sum(1 for event in game.replay() if event[0] == EVENT_PLAY)
+    replay_seconds = time.perf_counter() - start
+    return {
+        "games": games,
+        "rounds": rounds,
+        "wins": wins,
+        "cards": cards,
+        "scan_games_per_second": games / header_seconds if header_seconds else 0.0,
+        "replay_games_per_second": games / replay_seconds if replay_seconds else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Record AI games to a binary log and replay, seek and scan it")
+    parser.add_argument("path", nargs="?", default="games.spr", help="record file")
+    parser.add_argument("--games", type=int, default=1000, help="AI games to append before reading (0 to only read)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the games and the seek positions")
+    parser.add_argument("--max-rounds", type=int, default=rules.SIMULATION_MAX_ROUNDS,
+                        help="end a game after this many rounds if nobody reached 500")
+    parser.add_argument("--seeks", type=int, default=1000, help="random trick positions to seek to and verify")
+    args = parser.parse_args()
+
+    if args.games:
+        result = record_games(args.path, args.games, args.seed, args.max_rounds)
+        print(f"Recorded {result['games']} games in {result['seconds']:.2f} s "
+              f"(+{result['flush_seconds'] * 1000:.0f} ms to drain the writer), "
+              f"{result['bytes'] / result['games']:.0f} bytes per game")
+
+    reader = RecordReader(args.path)
+    result = scan_file(reader)
+    print(f"{args.path}: {result['games']} games, {result['rounds']} rounds, {result['cards']} cards played, "
+          f"{os.path.getsize(args.path) / max(1, result['rounds']):.0f} bytes per round with the index")
+    print(f"  Header scan: {result['scan_games_per_second']:.0f} games/s, "
+          f"full replay: {result['replay_games_per_second']:.0f} games/s")
+    if reader.end < len(reader.data):
+        print(f"  Skipped a partial game at the end ({len(reader.data) - reader.end} bytes)")
+    mismatches = 0
+    if args.seeks and len(reader):
+        result = check_seeks(reader, args.seeks, args.seed)
+        mismatches = result["mismatches"]
+        print(f"  Seek to a trick: {result['seek_us']:.1f} us, {mismatches} of {result['seeks']} "
+              f"differ from a full replay")
+    reader.close()
+    raise SystemExit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
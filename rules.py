@@ -0,0 +1,561 @@
+import random
+import time
+from operator import attrgetter
+
+SUITS = ["Spades", "Hearts", "Diamonds", "Clubs"]
+VALUES = list(range(2, 15))
+VALUE_NAMES = {11: "J", 12: "Q", 13: "K", 14: "A"}
+
+NUM_PLAYERS = 4
+MIN_BID = 1
+MAX_BID = 7
+WINNING_SCORE = 500
+BAG_LIMIT = 10
+BAG_PENALTY = 100
+
+STATE_DEAL = "dealing"
+STATE_BID = "bidding"
+STATE_PLAY = "playing"
+STATE_TRICK_END = "trick_end"
+STATE_ROUND_END = "round_end"
+STATE_GAME_OVER = "game_over"
+
+EVENT_DEAL = "deal"
+EVENT_BIDDING = "bidding"
+EVENT_BID = "bid"
+EVENT_BIDS_DONE = "bids_done"
+EVENT_PLAY = "play"
+EVENT_TRICK = "trick"
+EVENT_BAG_OUT = "bag_out"
+EVENT_ROUND_END = "round_end"
+EVENT_GAME_OVER = "game_over"
+
+SIMULATION_NAMES = ["South", "West", "North", "East"]
+SIMULATION_MAX_ROUNDS = 200
+
+class Card:
+    """One of the 52 cards: immutable, and created once per process in CARDS.
+
+    Card(suit, value) returns the shared instance, so every deck, hand and engine
+    holds references to the same 52 objects and two cards are equal only when they
+    are the same object. index is the card's bit in a bitboard mask (suit in SUITS
+    order, then rank), and hand_order its position in a sorted hand.
+    """
+
+    __slots__ = ("suit", "value", "display_value", "suit_index", "index", "hand_order")
+
+    def __new__(cls, suit, value):
+        return CARDS_BY_KEY[suit, value]
+
+    @classmethod
+    def create(cls, suit, value):
+        card = object.__new__(cls)
+        suit_order = {"Spades": 0, "Hearts": 1, "Clubs": 2, "Diamonds": 3}
+        suit_index = SUITS.index(suit)
+        fields = {
+            "suit": suit,
+            "value": value,
+            "display_value": VALUE_NAMES.get(value, str(value)),
+            "suit_index": suit_index,
+            "index": suit_index * len(VALUES) + value - 2,
+            "hand_order": suit_order[suit] * len(VALUES) + value - 2,
+        }
+        for name, field in fields.items():
+            object.__setattr__(card, name, field)
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("cards are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("cards are immutable")
+
+    def __hash__(self):
+        return self.index
+
+    def __reduce__(self):
+        # Unpickles to the receiving process's own shared card.
+        return (Card, (self.suit, self.value))
+
+    def __repr__(self):
+        return f"Card({self.suit!r}, {self.value})"
+
+CARDS = tuple(Card.create(suit, value) for suit in SUITS for value in VALUES)
+CARDS_BY_KEY = {(card.suit, card.value): card for card in CARDS}
+
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+SPADES_INDEX = SUIT_INDEX["Spades"]
+# Suit indices in the order Player.sort_hand shows them.
+HAND_SUITS = tuple(SUIT_INDEX[suit] for suit in ["Spades", "Hearts", "Clubs", "Diamonds"])
+NON_SPADE_SUITS = tuple(suit for suit in HAND_SUITS if suit != SPADES_INDEX)
+SPADE_BITS = ((1 << len(VALUES)) - 1) << (SPADES_INDEX * len(VALUES))
+
+class HandIndex:
+    """The cards of one hand by suit, kept up to date as the hand is dealt and played.
+
+    suits[i] holds the cards of SUITS[i] in ascending value, so a suit's length,
+    lowest and highest card are len, [0] and [-1]. mask has bit card.index set
+    for every card held, for membership tests and the bitboard code.
+    """
+
+    __slots__ = ("suits", "mask")
+
+    def __init__(self, cards=()):
+        self.suits = [[] for _ in SUITS]
+        self.mask = 0
+        self.reset(cards)
+
+    def reset(self, cards):
+        for holding in self.suits:
+            holding.clear()
+        self.mask = 0
+        for card in sorted(cards, key=attrgetter("index")):
+            self.suits[card.suit_index].append(card)
+            self.mask |= 1 << card.index
+
+    def remove(self, card):
+        self.suits[card.suit_index].remove(card)
+        self.mask &= ~(1 << card.index)
+
+    def copy(self):
+        index = HandIndex.__new__(HandIndex)
+        index.suits = [holding[:] for holding in self.suits]
+        index.mask = self.mask
+        return index
+
+    def __contains__(self, card):
+        return self.mask >> card.index & 1 == 1
+
+    def __len__(self):
+        return sum(len(holding) for holding in self.suits)
+
+    def count(self, suit_index):
+        return len(self.suits[suit_index])
+
+    def count_from(self, suit_index, value):
+        # Cards of the suit worth value or more.
+        count = 0
+        for card in reversed(self.suits[suit_index]):
+            if card.value < value:
+                break
+            count += 1
+        return count
+
+    def valid_suits(self, lead_suit, spades_broken):
+        # The suits that may be played, in hand order: the lead suit if the hand has
+        # it, otherwise anything, except that spades may not be led until broken.
+        if lead_suit is not None:
+            lead = SUIT_INDEX[lead_suit]
+            return (lead,) if self.suits[lead] else HAND_SUITS
+        if spades_broken or not self.mask & ~SPADE_BITS:
+            return HAND_SUITS
+        return NON_SPADE_SUITS
+
+    def cards_of(self, suit_indices):
+        if len(suit_indices) == 1:
+            return self.suits[suit_indices[0]][:]
+        return [card for suit in suit_indices for card in self.suits[suit]]
+
+    def lowest(self, suit_indices):
+        # Equal values go to the suit that comes first in hand order.
+        best = None
+        for suit in suit_indices:
+            holding = self.suits[suit]
+            if holding and (best is None or holding[0].value < best.value):
+                best = holding[0]
+        return best
+
+    def lowest_beating(self, suit_indices, winner):
+        # The lowest card of these suits that beats winner: a higher card of its
+        # suit, or any spade if winner is not one.
+        best = None
+        for suit in suit_indices:
+            card = None
+            if suit == winner.suit_index:
+                for candidate in self.suits[suit]:
+                    if candidate.value > winner.value:
+                        card = candidate
+                        break
+            elif suit == SPADES_INDEX and self.suits[suit]:
+                card = self.suits[suit][0]
+            if card is not None and (best is None or card.value < best.value):
+                best = card
+        return best
+
+class Deck:
+    def __init__(self):
+        self.cards = list(CARDS)
+
+    def shuffle(self, rng=random):
+        rng.shuffle(self.cards)
+
+    def deal(self, num_players):
+        hands = [[] for _ in range(num_players)]
+        for i, card in enumerate(self.cards):
+            hands[i % num_players].append(card)
+        return hands
+
+class Player:
+    def __init__(self, name, position, is_human=False):
+        self.name = name
+        self.position = position
+        self.is_human = is_human
+        # hand stays in sort_hand order; set_hand and remove_card keep index in step with it.
+        self.hand = []
+        self.index = HandIndex()
+        self.bid = None
+        self.tricks_won = 0
+        self.score = 0
+        self.bags = 0
+        self.team = 0 if position in [0, 2] else 1
+
+    def set_hand(self, cards):
+        self.hand = cards
+        self.sort_hand()
+        self.index.reset(cards)
+
+    def remove_card(self, card):
+        self.hand.remove(card)
+        self.index.remove(card)
+
+    def copy(self):
+        player = Player.__new__(Player)
+        player.__dict__.update(self.__dict__)
+        player.hand = self.hand[:]
+        player.index = self.index.copy()
+        return player
+
+    def sort_hand(self):
+        self.hand.sort(key=attrgetter("hand_order"))
+
+    def get_valid_moves(self, lead_suit, spades_broken):
+        suits = self.index.valid_suits(lead_suit, spades_broken)
+        if suits is HAND_SUITS:
+            return self.hand[:] if lead_suit is None and spades_broken else self.hand
+        return self.index.cards_of(suits)
+
+    def is_valid_move(self, card, lead_suit, spades_broken):
+        return card in self.index and card.suit_index in self.index.valid_suits(lead_suit, spades_broken)
+
+    def make_ai_bid(self):
+        index = self.index
+        bid = index.count_from(SPADES_INDEX, 10)
+        bid += sum(index.count_from(suit, 12) for suit in NON_SPADE_SUITS)
+        bid = max(MIN_BID, min(bid, MAX_BID))
+        return bid
+
+    def make_ai_play(self, valid_cards, lead_suit, trick_pile, spades_broken):
+        # valid_cards is what get_valid_moves returned: whole suits of the hand, which
+        # the index already holds in order, so the choice is read from there.
+        index = self.index
+        suits = index.valid_suits(lead_suit, spades_broken)
+        if trick_pile:
+            current_winner = self.get_winning_card(trick_pile, lead_suit)
+            card = index.lowest_beating(suits, current_winner)
+            if card is not None:
+                return card
+        return index.lowest(suits)
+
+    def get_winning_card(self, trick_pile, lead_suit):
+        if not trick_pile:
+            return None
+        winner_card = trick_pile[0][1]
+        for player, card in trick_pile[1:]:
+            if self.card_beats(card, winner_card, lead_suit):
+                winner_card = card
+        return winner_card
+
+    def card_beats(self, card, current_best, lead_suit):
+        if current_best is None:
+            return True
+        if card.suit == "Spades" and current_best.suit != "Spades":
+            return True
+        if card.suit != "Spades" and current_best.suit == "Spades":
+            return False
+        if card.suit == current_best.suit:
+            return card.value > current_best.value
+        return False
+
+class HeuristicPolicy:
+    name = "heuristic"
+
+    def bid(self, engine, player):
+        return player.make_ai_bid()
+
+    def prepare(self, engine, player):
+        """Called on the game's own thread just before engine is copied for player's decision."""
+
+    def play(self, engine, player, valid_moves):
+        return player.make_ai_play(valid_moves, engine.lead_suit, engine.trick_pile, engine.spades_broken)
+
+class PartnerAwarePolicy(HeuristicPolicy):
+    name = "partner"
+
+    def play(self, engine, player, valid_moves):
+        if len(engine.trick_pile) >= 2:
+            winner_card = player.get_winning_card(engine.trick_pile, engine.lead_suit)
+            partner, partner_card = engine.trick_pile[-2]
+            if partner_card is winner_card:
+                return min(valid_moves, key=lambda c: c.value)
+        return super().play(engine, player, valid_moves)
+
+POLICIES = {
+    HeuristicPolicy.name: HeuristicPolicy,
+    PartnerAwarePolicy.name: PartnerAwarePolicy,
+}
+
+class Engine:
+    def __init__(self, names=SIMULATION_NAMES, human_seats=(), seed=None, max_rounds=None, policies=None):
+        self.rng = random.Random(seed)
+        self.max_rounds = max_rounds
+        self.players = [Player(name, i, is_human=i in human_seats) for i, name in enumerate(names)]
+        self.policies = policies or [HeuristicPolicy()] * NUM_PLAYERS
+        self.listeners = []
+        # knowledge.Trackers following this game, once a policy has asked for them.
+        self.trackers = None
+
+        self.state = STATE_DEAL
+        self.deck = None
+        self.current_player_idx = 0
+        self.dealer_idx = 0
+
+        self.trick_pile = []
+        self.lead_suit = None
+        self.spades_broken = False
+        self.trick_winner = None
+        self.round_plays = []
+
+        self.team_scores = [0, 0]
+        self.team_bags = [0, 0]
+        self.rounds_played = 0
+
+    def snapshot(self):
+        """A copy of the game as it stands, for an AI to think about on another thread.
+
+        It shares the interned cards and the policies with this engine but none of
+        the state that play goes on to change. Its only listeners are copies of this
+        engine's trackers, which the policy to move can set up in prepare().
+        """
+        current = self.players[self.current_player_idx]
+        self.policies[current.position].prepare(self, current)
+        engine = Engine.__new__(Engine)
+        engine.__dict__.update(self.__dict__)
+        engine.rng = random.Random()
+        engine.rng.setstate(self.rng.getstate())
+        engine.listeners = []
+        engine.deck = None
+        engine.players = [player.copy() for player in self.players]
+        engine.trick_pile = [(engine.players[player.position], card) for player, card in self.trick_pile]
+        if self.trick_winner is not None:
+            engine.trick_winner = engine.players[self.trick_winner.position]
+        engine.round_plays = self.round_plays[:]
+        engine.team_scores = self.team_scores[:]
+        engine.team_bags = self.team_bags[:]
+        if self.trackers is not None:
+            engine.trackers = self.trackers.copy(engine)
+        return engine
+
+    def emit(self, *event):
+        for listener in self.listeners:
+            listener(event)
+
+    def start_game(self):
+        self.dealer_idx = 0
+        self.team_scores = [0, 0]
+        self.team_bags = [0, 0]
+        self.rounds_played = 0
+        self.start_round()
+
+    def start_round(self):
+        for p in self.players:
+            p.bid = None
+            p.tricks_won = 0
+        self.round_plays = []
+
+        self.deck = Deck()
+        self.deck.shuffle(self.rng)
+        hands = self.deck.deal(NUM_PLAYERS)
+
+        for i, player in enumerate(self.players):
+            player.set_hand(hands[i])
+
+        self.state = STATE_DEAL
+        self.emit(EVENT_DEAL)
+
+    def start_bidding(self):
+        self.state = STATE_BID
+        self.current_player_idx = (self.dealer_idx + 1) % NUM_PLAYERS
+        self.emit(EVENT_BIDDING)
+
+    def place_bid(self, bid):
+        player = self.players[self.current_player_idx]
+        player.bid = bid
+        self.emit(EVENT_BID, player, bid)
+        self.advance_bidding()
+
+    def advance_bidding(self):
+        self.current_player_idx = (self.current_player_idx + 1) % NUM_PLAYERS
+
+        if all(p.bid is not None for p in self.players):
+            total_bids = sum(p.bid for p in self.players)
+            self.emit(EVENT_BIDS_DONE, total_bids)
+            self.start_play()
+
+    def start_play(self):
+        self.state = STATE_PLAY
+        self.current_player_idx = (self.dealer_idx + 1) % NUM_PLAYERS
+        self.trick_pile = []
+        self.lead_suit = None
+
+    def play_card(self, player, card):
+        player.remove_card(card)
+        # Public history of the round: who played what, and the lead suit and
+        # spades_broken flag they were facing when they played it.
+        self.round_plays.append((player.position, card, self.lead_suit, self.spades_broken))
+
+        if not self.trick_pile:
+            self.lead_suit = card.suit
+            if card.suit == "Spades":
+                self.spades_broken = True
+
+        self.trick_pile.append((player, card))
+        if self.listeners:
+            self.emit(EVENT_PLAY, player, card)
+
+        if len(self.trick_pile) == NUM_PLAYERS:
+            self.end_trick()
+        else:
+            self.current_player_idx = (self.current_player_idx + 1) % NUM_PLAYERS
+
+    def end_trick(self):
+        winner_player = self.trick_pile[0][0]
+        winner_card = self.trick_pile[0][1]
+
+        for player, card in self.trick_pile[1:]:
+            if player.card_beats(card, winner_card, self.lead_suit):
+                winner_player = player
+                winner_card = card
+
+        winner_player.tricks_won += 1
+        self.trick_winner = winner_player
+        self.state = STATE_TRICK_END
+        self.emit(EVENT_TRICK, winner_player, winner_card)
+
+    def finish_trick(self):
+        self.trick_pile = []
+        self.lead_suit = None
+
+        if all(len(p.hand) == 0 for p in self.players):
+            self.end_round()
+        else:
+            self.current_player_idx = self.trick_winner.position
+            self.state = STATE_PLAY
+
+    def end_round(self):
+        for team_idx in range(2):
+            team_players = [p for p in self.players if p.team == team_idx]
+            total_bid = sum(p.bid for p in team_players)
+            total_won = sum(p.tricks_won for p in team_players)
+
+            if total_won >= total_bid:
+                points = total_bid * 10
+                bags = total_won - total_bid
+                self.team_bags[team_idx] += bags
+
+                if self.team_bags[team_idx] >= BAG_LIMIT:
+                    points -= BAG_PENALTY
+                    self.team_bags[team_idx] -= BAG_LIMIT
+                    self.emit(EVENT_BAG_OUT, team_idx)
+
+                self.team_scores[team_idx] += points + bags
+            else:
+                self.team_scores[team_idx] -= total_bid * 10
+
+        self.rounds_played += 1
+        self.state = STATE_ROUND_END
+        self.emit(EVENT_ROUND_END)
+
+    def is_round_limit_reached(self):
+        return self.max_rounds is not None and self.rounds_played >= self.max_rounds
+
+    def finish_round(self):
+        if max(self.team_scores) >= WINNING_SCORE or self.is_round_limit_reached():
+            self.state = STATE_GAME_OVER
+            self.emit(EVENT_GAME_OVER, self.get_winning_team())
+        else:
+            self.dealer_idx = (self.dealer_idx + 1) % NUM_PLAYERS
+            self.start_round()
+
+    def get_winning_team(self):
+        return 0 if self.team_scores[0] > self.team_scores[1] else 1
+
+    def needs_input(self):
+        return (self.state in (STATE_BID, STATE_PLAY)
+                and self.players[self.current_player_idx].is_human)
+
+    def decide(self):
+        """The bid or card the policy of the seat to move chooses, without making it."""
+        current = self.players[self.current_player_idx]
+        policy = self.policies[current.position]
+        if self.state == STATE_BID:
+            return policy.bid(self, current)
+        return policy.play(self, current, current.get_valid_moves(self.lead_suit, self.spades_broken))
+
+    def step(self):
+        state = self.state
+        if state == STATE_DEAL:
+            self.start_bidding()
+        elif state == STATE_BID:
+            current = self.players[self.current_player_idx]
+            if current.is_human:
+                return False
+            self.place_bid(self.decide())
+        elif state == STATE_PLAY:
+            current = self.players[self.current_player_idx]
+            if current.is_human:
+                return False
+            self.play_card(current, self.decide())
+        elif state == STATE_TRICK_END:
+            self.finish_trick()
+        elif state == STATE_ROUND_END:
+            self.finish_round()
+        else:
+            return False
+        return True
+
+    def play_to_end(self):
+        while self.step():
+            pass
+
+def simulate(num_games, seed=None, max_rounds=SIMULATION_MAX_ROUNDS):
+    seeds = random.Random(seed)
+    wins = [0, 0]
+    rounds = 0
+    margin = 0
+    unfinished = 0
+
+    start = time.perf_counter()
+    for _ in range(num_games):
+        engine = Engine(seed=seeds.getrandbits(64), max_rounds=max_rounds)
+        engine.start_game()
+        engine.play_to_end()
+
+        wins[engine.get_winning_team()] += 1
+        rounds += engine.rounds_played
+        margin += abs(engine.team_scores[0] - engine.team_scores[1])
+        if max(engine.team_scores) < WINNING_SCORE:
+            unfinished += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "games": num_games,
+        "seed": seed,
+        "team_wins": wins,
+        "unfinished": unfinished,
+        "rounds": rounds,
+        "average_rounds": rounds / num_games if num_games else 0.0,
+        "average_margin": margin / num_games if num_games else 0.0,
+        "seconds": elapsed,
+        "games_per_second": num_games / elapsed if elapsed else 0.0,
+        "rounds_per_second": rounds / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,87 @@
+import heapq
+import itertools
+import math
+import time
+
+INSTANT = math.inf
+MAX_EVENTS_PER_RUN = 1000
+
+def monotonic_ms():
+    return time.monotonic() * 1000
+
+class ScheduledEvent:
+    __slots__ = ("due", "seq", "callback", "args", "cancelled")
+
+    def __init__(self, due, seq, callback, args):
+        self.due = due
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.due, self.seq) < (other.due, other.seq)
+
+    def cancel(self):
+        self.cancelled = True
+
+class Scheduler:
+    """Runs callbacks after game-time delays, scaled by a speed multiplier.
+
+    clock is any callable returning milliseconds (pygame.time.get_ticks in the
+    game, a fake in tools). A speed of 2 halves every delay; INSTANT makes them all
+    zero, so chains of events run back to back within one run_due call.
+    """
+
+    def __init__(self, clock=monotonic_ms, speed=1.0):
+        self.clock = clock
+        self.speed = speed
+        self.queue = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return sum(not event.cancelled for event in self.queue)
+
+    def is_instant(self):
+        return self.speed == INSTANT
+
+    def scale(self, delay):
+        return 0 if self.is_instant() else delay / self.speed
+
+    def schedule(self, delay, callback, *args):
+        event = ScheduledEvent(self.clock() + self.scale(delay), next(self.counter), callback, args)
+        heapq.heappush(self.queue, event)
+        return event
+
+    def set_speed(self, speed):
+        # Pending events keep the share of their delay that has not yet elapsed.
+        now = self.clock()
+        for event in self.queue:
+            remaining = max(0, event.due - now)
+            if speed == INSTANT:
+                event.due = now
+            elif not self.is_instant():
+                event.due = now + remaining * self.speed / speed
+        heapq.heapify(self.queue)
+        self.speed = speed
+
+    def clear(self):
+        self.queue = []
+
+    def time_until_next(self):
+        while self.queue and self.queue[0].cancelled:
+            heapq.heappop(self.queue)
+        if not self.queue:
+            return None
+        return max(0, self.queue[0].due - self.clock())
+
+    def run_due(self, max_events=MAX_EVENTS_PER_RUN):
+        now = self.clock()
+        ran = 0
+        while self.queue and self.queue[0].due <= now and ran < max_events:
+            event = heapq.heappop(self.queue)
+            if event.cancelled:
+                continue
+            event.callback(*event.args)
+            ran += 1
+        return ran
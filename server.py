@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import time
+
+import rules
+from rules import (STATE_BID, STATE_PLAY, STATE_GAME_OVER, MIN_BID, MAX_BID, EVENT_DEAL, EVENT_PLAY, EVENT_TRICK,
+                   EVENT_ROUND_END, EVENT_GAME_OVER)
+
+DEFAULT_PORT = 7355
+STATS_INTERVAL = 5.0
+# No client message comes close to this; a longer line is a misbehaving peer, which is dropped
+# instead of having its bytes buffered without limit.
+MAX_LINE_BYTES = 256
+MAX_TABLES_PER_CONNECTION = 100
+SEAT_NAMES = ["Remote", "West", "North", "East"]
+
+# Line protocol, one ASCII message per line; cards are rank and suit, e.g. "TS" or "4H".
+#
+#   client -> server                     server -> client
+#   N [seed]     open a table            N <table>                 table opened, you sit at seat 0
+#   B <table> <bid>                      D <table> <card>...       your hand for the round
+#   P <table> <card>                     B <table>                 your turn to bid
+#   Q <table>    leave the table         Y <table> <card>...       your turn to play one of these cards
+#                                        P <table> <seat> <card>   a card was played
+#                                        T <table> <seat>          seat won the trick
+#                                        R <table> <score> <score> <bags> <bags>   round scored
+#                                        O <table> <team>          game over, team won
+#                                        E <table> <reason>        request rejected
+#
+# A connection may have MAX_TABLES_PER_CONNECTION tables open at once; N beyond that gets
+# "E 0 too many tables". A line longer than MAX_LINE_BYTES closes the connection.
+RANK_CODES = "23456789TJQKA"
+CARD_CODES = [RANK_CODES[card.value - 2] + card.suit[0] for card in rules.CARDS]
+CARDS_BY_CODE = {code: card for code, card in zip(CARD_CODES, rules.CARDS)}
+
+def card_code(card):
+    return CARD_CODES[card.index]
+
+class Table:
+    __slots__ = ("table_id", "engine", "send")
+
+    def __init__(self, table_id, send, seed=None, max_rounds=None):
+        self.table_id = table_id
+        self.send = send
+        self.engine = rules.Engine(SEAT_NAMES, human_seats=(0,), seed=seed, max_rounds=max_rounds)
+        self.engine.listeners.append(self.on_event)
+
+    def on_event(self, event):
+        kind = event[0]
+        engine = self.engine
+        if kind == EVENT_DEAL:
+            self.send(f"D {self.table_id} {' '.join(map(card_code, engine.players[0].hand))}")
+        elif kind == EVENT_PLAY:
+            self.send(f"P {self.table_id} {event[1].position} {card_code(event[2])}")
+        elif kind == EVENT_TRICK:
+            self.send(f"T {self.table_id} {event[1].position}")
+        elif kind == EVENT_ROUND_END:
+            self.send(f"R {self.table_id} {engine.team_scores[0]} {engine.team_scores[1]} "
+                      f"{engine.team_bags[0]} {engine.team_bags[1]}")
+        elif kind == EVENT_GAME_OVER:
+            self.send(f"O {self.table_id} {event[1]}")
+
+    def start(self):
+        self.engine.start_game()
+        self.advance()
+
+    def advance(self):
+        # The AI seats move straight away; stop at the remote player's turn or the end.
+        engine = self.engine
+        while engine.step():
+            pass
+        if engine.needs_input():
+            if engine.state == STATE_BID:
+                self.send(f"B {self.table_id}")
+            else:
+                valid_moves = engine.players[0].get_valid_moves(engine.lead_suit, engine.spades_broken)
+                self.send(f"Y {self.table_id} {' '.join(map(card_code, valid_moves))}")
+
+    def bid(self, bid):
+        engine = self.engine
+        if engine.state != STATE_BID or not engine.needs_input():
+            return "not your bid"
+        if not MIN_BID <= bid <= MAX_BID:
+            return "bid out of range"
+        engine.place_bid(bid)
+        self.advance()
+        return None
+
+    def play(self, card):
+        engine = self.engine
+        if engine.state != STATE_PLAY or not engine.needs_input():
+            return "not your turn"
+        player = engine.players[0]
+        if card is None or not player.is_valid_move(card, engine.lead_suit, engine.spades_broken):
+            return "invalid card"
+        engine.play_card(player, card)
+        self.advance()
+        return None
+
+    def is_over(self):
+        return self.engine.state == STATE_GAME_OVER
+
+class TableServer:
+    """Hosts any number of independent tables, each with one remote player and three AI seats.
+
+    All tables run on the event loop's thread. A table only does work when its
+    player sends a move, and then plays the AI seats up to the player's next turn
+    before returning, so no table holds a task or timer while it waits.
+    """
+
+    def __init__(self, max_rounds=None, max_tables=MAX_TABLES_PER_CONNECTION):
+        self.max_rounds = max_rounds
+        self.max_tables = max_tables
+        self.tables = {}
+        self.next_table_id = 1
+        self.connections = 0
+        self.games_finished = 0
+        self.moves = 0
+
+    def open_table(self, send, seed=None):
+        table = Table(self.next_table_id, send, seed, self.max_rounds)
+        self.next_table_id += 1
+        self.tables[table.table_id] = table
+        send(f"N {table.table_id}")
+        table.start()
+        return table
+
+    def close_table(self, table_id):
+        self.tables.pop(table_id, None)
+
+    def handle(self, line, send, owned):
+        parts = line.split()
+        if not parts:
+            return
+        command = parts[0]
+        if command == "N":
+            if len(parts) > 1 and not parts[1].isdigit():
+                send("E 0 bad seed")
+                return
+            if len(owned) >= self.max_tables:
+                send("E 0 too many tables")
+                return
+            seed = int(parts[1]) if len(parts) > 1 else None
+            owned.add(self.open_table(send, seed).table_id)
+            return
+
+        try:
+            table_id = int(parts[1])
+        except (IndexError, ValueError):
+            send("E 0 bad message")
+            return
+        table = self.tables.get(table_id) if table_id in owned else None
+        if table is None:
+            send(f"E {table_id} no such table")
+            return
+
+        if command == "Q":
+            owned.discard(table_id)
+            self.close_table(table_id)
+            return
+        if command == "B" and len(parts) == 3 and parts[2].isdigit():
+            error = table.bid(int(parts[2]))
+        elif command == "P" and len(parts) == 3:
+            error = table.play(CARDS_BY_CODE.get(parts[2]))
+        else:
+            error = "bad message"
+
+        if error is not None:
+            send(f"E {table_id} {error}")
+            return
+        self.moves += 1
+        if table.is_over():
+            self.games_finished += 1
+            owned.discard(table_id)
+            self.close_table(table_id)
+
+    def get_stats(self):
+        return {
+            "connections": self.connections,
+            "tables": len(self.tables),
+            "games_finished": self.games_finished,
+            "moves": self.moves,
+        }
+
+class ClientProtocol(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = b""
+        self.pending = []
+        self.tables = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def connection_lost(self, exc):
+        self.server.connections -= 1
+        for table_id in self.tables:
+            self.server.close_table(table_id)
+        self.tables.clear()
+
+    def data_received(self, data):
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()
+        if len(self.buffer) > MAX_LINE_BYTES or any(len(line) > MAX_LINE_BYTES for line in lines):
+            self.buffer = b""
+            self.transport.abort()
+            return
+        for line in lines:
+            self.server.handle(line.decode("ascii", "replace"), self.pending.append, self.tables)
+        # Everything the batch of messages produced goes out in one write.
+        if self.pending:
+            self.pending.append("")
+            self.transport.write("\n".join(self.pending).encode("ascii"))
+            self.pending.clear()
+
+async def report_stats(server, interval):
+    last_moves = server.moves
+    last_games = server.games_finished
+    last_time = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        stats = server.get_stats()
+        elapsed = now - last_time
+        print(f"{stats['connections']} connections, {stats['tables']} tables open, "
+              f"{(stats['moves'] - last_moves) / elapsed:.0f} moves/s, "
+              f"{(stats['games_finished'] - last_games) / elapsed:.1f} games/s", flush=True)
+        last_moves, last_games, last_time = stats["moves"], stats["games_finished"], now
+
+async def serve(host, port, max_rounds=None, stats_interval=STATS_INTERVAL, max_tables=MAX_TABLES_PER_CONNECTION):
+    server = TableServer(max_rounds, max_tables)
+    loop = asyncio.get_running_loop()
+    listener = await loop.create_server(lambda: ClientProtocol(server), host, port)
+    print(f"Serving Spades tables on {host}:{port}", flush=True)
+    if stats_interval > 0:
+        loop.create_task(report_stats(server, stats_interval))
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Spades tables for remote players over TCP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--max-rounds", type=int, help="end each game after this many rounds if nobody reached 500")
+    parser.add_argument("--max-tables", type=int, default=MAX_TABLES_PER_CONNECTION,
+                        help="tables one connection may have open at once")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL,
+                        help="seconds between throughput reports (0 to disable)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_rounds, args.stats_interval, args.max_tables))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
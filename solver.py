@@ -0,0 +1,319 @@
+import argparse
+import random
+import statistics
+import time
+from collections import OrderedDict
+
+from bitboard import (RANKS_PER_SUIT, SUIT_BITS, SUIT_MASKS, SPADES, FULL_DECK, card_index, index_suit,
+                      valid_moves, beating_cards, popcount)
+from rules import NUM_PLAYERS
+
+DEFAULT_TABLE_SIZE = 200000
+NUM_CARDS = RANKS_PER_SUIT * len(SUIT_MASKS)
+SUIT_SHIFTS = [suit * RANKS_PER_SUIT for suit in range(len(SUIT_MASKS))]
+
+# LIVE_RANKS[pattern] lists the ranks set in a one-suit bit pattern, highest first.
+LIVE_RANKS = [tuple(rank for rank in reversed(range(RANKS_PER_SUIT)) if pattern >> rank & 1)
+              for pattern in range(1 << RANKS_PER_SUIT)]
+# BEATEN_BY[index] is the mask of cards that take the trick from that card.
+BEATEN_BY = [beating_cards(FULL_DECK, index) for index in range(NUM_CARDS)]
+LEAD_ORDER = [-(index % RANKS_PER_SUIT) for index in range(NUM_CARDS)]
+DISCARD_ORDER = [index % RANKS_PER_SUIT * 2 + (index // RANKS_PER_SUIT == SPADES) for index in range(NUM_CARDS)]
+
+def split_bits(mask):
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
+
+class DoubleDummySolver:
+    """Exact trick counts for positions where all four hands are known.
+
+    The value searched is the number of the remaining tricks taken by team 0
+    (seats 0 and 2); team 1 takes the rest. Positions at the start of a trick are
+    kept in an LRU transposition table of at most table_size entries, each holding
+    the lower and upper bounds proven so far.
+    """
+
+    def __init__(self, table_size=DEFAULT_TABLE_SIZE):
+        self.table_size = table_size
+        self.table = OrderedDict()
+        self.nodes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.seconds = 0.0
+
+    def clear(self):
+        self.table.clear()
+
+    def solve(self, hands, seat, trick=(), spades_broken=False):
+        """Return (team 0 tricks, team 1 tricks) from the remaining cards.
+
+        hands are card masks indexed by seat, seat is the player to move and trick
+        lists the (seat, card index) pairs already played to the current trick.
+        """
+        hands = list(hands)
+        lead_suit = None
+        winner_index = -1
+        winner_seat = seat
+        for position, index in trick:
+            if lead_suit is None:
+                lead_suit = index_suit(index)
+                winner_index = index
+                winner_seat = position
+            elif beating_cards(1 << index, winner_index):
+                winner_index = index
+                winner_seat = position
+
+        remaining = max(popcount(hand) for hand in hands)
+        start = time.perf_counter()
+        # MTD(f): a series of null-window searches that close in on the exact value,
+        # each reusing the bounds the previous ones left in the table.
+        lower, upper = 0, remaining
+        value = (remaining + 1) // 2
+        while lower < upper:
+            beta = value + 1 if value == lower else value
+            if trick:
+                value = self.search(hands, seat, lead_suit, winner_index, winner_seat, len(trick),
+                                    spades_broken, beta - 1, beta)
+            else:
+                value = self.search_trick(hands, seat, spades_broken, beta - 1, beta)
+            if value < beta:
+                upper = value
+            else:
+                lower = value
+        self.seconds += time.perf_counter() - start
+        return lower, remaining - lower
+
+    def solve_engine(self, engine):
+        """Solve the live position of a rules.Engine in the playing state."""
+        hands = [p.index.mask for p in engine.players]
+        trick = [(p.position, card_index(card)) for p, card in engine.trick_pile]
+        return self.solve(hands, engine.current_player_idx, trick, engine.spades_broken)
+
+    def position_key(self, hands, leader, spades_broken):
+        # Only the order of the cards still out matters, so each suit is keyed by
+        # the seats holding its live cards from the top down. Positions that differ
+        # only in which small cards are already gone then share an entry.
+        key = [leader, spades_broken]
+        for shift in SUIT_SHIFTS:
+            h0 = hands[0] >> shift & SUIT_BITS
+            h1 = hands[1] >> shift & SUIT_BITS
+            h2 = hands[2] >> shift & SUIT_BITS
+            pattern = 1
+            for rank in LIVE_RANKS[(h0 | h1 | h2 | hands[3] >> shift) & SUIT_BITS]:
+                bit = 1 << rank
+                pattern = pattern << 2 | (0 if h0 & bit else 1 if h1 & bit else 2 if h2 & bit else 3)
+            key.append(pattern)
+        return tuple(key)
+
+    def search_trick(self, hands, leader, spades_broken, alpha, beta):
+        if not hands[leader] & (hands[leader] - 1):
+            return self.last_trick(hands, leader)
+
+        key = self.position_key(hands, leader, spades_broken)
+        self.lookups += 1
+        entry = self.table.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.table.move_to_end(key)
+            lower, upper = entry
+            if lower >= beta:
+                return lower
+            if upper <= alpha or lower == upper:
+                return upper
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+        else:
+            lower, upper = self.sure_trick_bounds(hands)
+            if lower >= beta:
+                return lower
+            if upper <= alpha:
+                return upper
+
+        value = self.search(hands, leader, None, -1, leader, 0, spades_broken, alpha, beta)
+        if value <= alpha:
+            upper = value
+        elif value >= beta:
+            lower = value
+        else:
+            lower = upper = value
+
+        self.table[key] = (lower, upper)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def sure_trick_bounds(self, hands):
+        # The top live spades held in a single hand each win a trick whenever they are played.
+        remaining = popcount(hands[0] | hands[1] | hands[2] | hands[3]) // NUM_PLAYERS
+        spades = [hand >> SPADES * RANKS_PER_SUIT & SUIT_BITS for hand in hands]
+        holder = None
+        run = 0
+        for rank in LIVE_RANKS[spades[0] | spades[1] | spades[2] | spades[3]]:
+            seat = 0 if spades[0] >> rank & 1 else 1 if spades[1] >> rank & 1 else 2 if spades[2] >> rank & 1 else 3
+            if holder is not None and seat != holder:
+                break
+            holder = seat
+            run += 1
+        if holder is None:
+            return 0, remaining
+        if holder % 2 == 0:
+            return run, remaining
+        return 0, remaining - run
+
+    def last_trick(self, hands, leader):
+        self.nodes += 1
+        winner_index = hands[leader].bit_length() - 1
+        winner_seat = leader
+        for offset in range(1, NUM_PLAYERS):
+            seat = (leader + offset) % NUM_PLAYERS
+            if BEATEN_BY[winner_index] & hands[seat]:
+                winner_index = hands[seat].bit_length() - 1
+                winner_seat = seat
+        return 1 - winner_seat % 2
+
+    def search(self, hands, seat, lead_suit, winner_index, winner_seat, trick_count, spades_broken, alpha, beta):
+        self.nodes += 1
+        if trick_count == NUM_PLAYERS:
+            won = 1 - winner_seat % 2
+            if not hands[winner_seat]:
+                return won
+            return won + self.search_trick(hands, winner_seat, spades_broken, alpha - won, beta - won)
+
+        maximizing = seat % 2 == 0
+        best = -1 if maximizing else RANKS_PER_SUIT + 1
+        next_seat = (seat + 1) % NUM_PLAYERS
+        for index in self.order_moves(hands, seat, lead_suit, winner_index, winner_seat, spades_broken):
+            bit = 1 << index
+            hands[seat] ^= bit
+            if lead_suit is None:
+                suit = index // RANKS_PER_SUIT
+                value = self.search(hands, next_seat, suit, index, seat, 1,
+                                    spades_broken or suit == SPADES, alpha, beta)
+            elif BEATEN_BY[winner_index] & bit:
+                value = self.search(hands, next_seat, lead_suit, index, seat, trick_count + 1,
+                                    spades_broken, alpha, beta)
+            else:
+                value = self.search(hands, next_seat, lead_suit, winner_index, winner_seat, trick_count + 1,
+                                    spades_broken, alpha, beta)
+            hands[seat] ^= bit
+
+            if maximizing:
+                if value > best:
+                    best = value
+                    alpha = max(alpha, value)
+            elif value < best:
+                best = value
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return best
+
+    def order_moves(self, hands, seat, lead_suit, winner_index, winner_seat, spades_broken):
+        hand = hands[seat]
+        moves = valid_moves(hand, lead_suit, spades_broken)
+        live = hands[0] | hands[1] | hands[2] | hands[3]
+        if winner_index >= 0:
+            live |= 1 << winner_index
+
+        # Cards with no live card between them are interchangeable; keep the highest of each run.
+        candidates = []
+        for shift in SUIT_SHIFTS:
+            suit_moves = moves >> shift & SUIT_BITS
+            if not suit_moves:
+                continue
+            held_above = False
+            for rank in LIVE_RANKS[live >> shift & SUIT_BITS]:
+                if suit_moves >> rank & 1:
+                    if not held_above:
+                        candidates.append(shift + rank)
+                    held_above = True
+                else:
+                    held_above = False
+
+        if lead_suit is None:
+            # Lead from the top down so winners are tried first.
+            candidates.sort(key=LEAD_ORDER.__getitem__)
+        elif winner_seat % 2 == seat % 2:
+            # Partner is winning: play low, keeping spades back.
+            candidates.sort(key=DISCARD_ORDER.__getitem__)
+        else:
+            # Win as cheaply as possible, otherwise throw the lowest card.
+            beats = BEATEN_BY[winner_index]
+            candidates.sort(key=lambda i: (not beats >> i & 1, DISCARD_ORDER[i]))
+        return candidates
+
+    def get_stats(self):
+        return {
+            "nodes": self.nodes,
+            "seconds": self.seconds,
+            "nodes_per_second": self.nodes / self.seconds if self.seconds else 0.0,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "table_entries": len(self.table),
+            "evictions": self.evictions,
+        }
+
+def deal_position(rng, tricks=RANKS_PER_SUIT):
+    # With 13 tricks this is the same deal bitboard.deal_masks makes from the rng.
+    order = split_bits(FULL_DECK)
+    rng.shuffle(order)
+    hands = [0] * NUM_PLAYERS
+    for i, index in enumerate(order[:tricks * NUM_PLAYERS]):
+        hands[i % NUM_PLAYERS] |= 1 << index
+    return hands
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_benchmark(num_deals, seed=None, tricks=RANKS_PER_SUIT, table_size=DEFAULT_TABLE_SIZE):
+    rng = random.Random(seed)
+    deals = [deal_position(rng, tricks) for _ in range(num_deals)]
+    solver = DoubleDummySolver(table_size)
+    times = []
+    results = []
+    for hands in deals:
+        solver.clear()
+        start = time.perf_counter()
+        results.append(solver.solve(hands, 1))
+        times.append(time.perf_counter() - start)
+
+    result = solver.get_stats()
+    result.update({
+        "deals": num_deals,
+        "tricks": tricks,
+        "results": results,
+        "p50": percentile(times, 0.5),
+        "p90": percentile(times, 0.9),
+        "p99": percentile(times, 0.99),
+        "max": max(times),
+        "mean": statistics.mean(times),
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve seeded deals double dummy and report timings")
+    parser.add_argument("--deals", type=int, default=10, help="number of seeded deals to solve")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the deals")
+    parser.add_argument("--tricks", type=int, default=RANKS_PER_SUIT, help="cards per hand (13 for full deals)")
+    parser.add_argument("--table-size", type=int, default=DEFAULT_TABLE_SIZE,
+                        help="transposition table capacity in positions")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.deals, args.seed, args.tricks, args.table_size)
+    print(f"Solved {result['deals']} deals of {result['tricks']} tricks (seed {args.seed})")
+    print(f"  Time to solve: p50 {result['p50'] * 1000:.1f} ms, p90 {result['p90'] * 1000:.1f} ms, "
+          f"p99 {result['p99'] * 1000:.1f} ms, max {result['max'] * 1000:.1f} ms")
+    print(f"  {result['nodes']} nodes ({result['nodes_per_second']:.0f} nodes/s), "
+          f"table hit rate {result['hit_rate']:.1%} of {result['lookups']} lookups, "
+          f"{result['evictions']} evictions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class AIThinker:
+    """Makes the computer players' decisions on a worker thread, away from the frame loop.
+
+    submit() takes a snapshot of the engine (rules.Engine.snapshot) and asks a
+    single worker thread for the bid or card of the seat to move; the frame loop
+    carries on drawing and collects the decision with take() once it is due.
+    The snapshot is never touched by the game again, and the cards it hands back
+    are the interned rules.CARDS, so a decision can be made on the live engine
+    as it is. The snapshot brings copies of the engine's card trackers (see
+    knowledge.Trackers), so the worker never replays the round. cancel() drops a
+    decision the game no longer wants (a new game, the menu, the window closing);
+    one that is already running cannot be stopped, but its result is thrown away.
+
+    Thinking time is measured on the worker for every decision. end_frame() is
+    called once per clock tick and counts the frames, and the frames missed,
+    during which a decision was outstanding. With threaded=False decisions are
+    made inside submit() on the calling thread, as the game used to, to compare.
+    """
+
+    def __init__(self, fps, threaded=True):
+        self.frame_ms = 1000.0 / fps
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai") if threaded else None
+        self.pending = None
+        self.busy = False
+
+        self.decisions = 0
+        self.cancelled = 0
+        self.think_seconds = 0.0
+        self.max_think_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.frames = 0
+        self.missed_frames = 0
+
+    def submit(self, engine):
+        self.cancel()
+        if self.executor is not None:
+            self.pending = self.executor.submit(self.think, engine.snapshot())
+        else:
+            self.pending = Future()
+            self.pending.set_result(self.think(engine.snapshot()))
+        self.busy = True
+
+    @staticmethod
+    def think(snapshot):
+        start = time.perf_counter()
+        decision = snapshot.decide()
+        return decision, time.perf_counter() - start
+
+    def is_pending(self):
+        return self.pending is not None
+
+    def is_ready(self):
+        return self.pending is not None and self.pending.done()
+
+    def take(self, block=False):
+        """The decision, once it is ready (or waiting for it, if block); otherwise None."""
+        if self.pending is None or not (block or self.pending.done()):
+            return None
+        start = time.perf_counter()
+        decision, seconds = self.pending.result()
+        self.wait_seconds += time.perf_counter() - start
+        self.pending = None
+        self.decisions += 1
+        self.think_seconds += seconds
+        self.max_think_seconds = max(self.max_think_seconds, seconds)
+        return decision
+
+    def cancel(self):
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+            self.cancelled += 1
+
+    def end_frame(self, tick_ms):
+        if self.busy:
+            self.frames += 1
+            self.missed_frames += max(0, round(tick_ms / self.frame_ms) - 1)
+        self.busy = self.pending is not None
+
+    def close(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        return {
+            "decisions": self.decisions,
+            "cancelled": self.cancelled,
+            "average_think_ms": self.think_seconds / self.decisions * 1000 if self.decisions else 0.0,
+            "max_think_ms": self.max_think_seconds * 1000,
+            "blocked_ms": self.wait_seconds * 1000,
+            "frames_waiting": self.frames,
+            "missed_frames": self.missed_frames,
+        }
@@ -0,0 +1,185 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import rules
+from bidtable import BidTablePolicy
+from knowledge import TrackingPolicy
+from montecarlo import MonteCarloPolicy
+from rules import NUM_PLAYERS, WINNING_SCORE, EVENT_ROUND_END
+
+POLICIES = dict(rules.POLICIES, **{policy.name: policy for policy in (MonteCarloPolicy, BidTablePolicy, TrackingPolicy)})
+
+Z_95 = 1.96
+SHARD_SIZE = 50
+
+def game_seed(base_seed, pair):
+    return (base_seed << 32) + pair
+
+def play_game(seed, policy_a, policy_b, a_team, max_rounds):
+    policies = [policy_a if seat % 2 == a_team else policy_b for seat in range(NUM_PLAYERS)]
+    engine = rules.Engine(seed=seed, max_rounds=max_rounds, policies=policies)
+    made = [0, 0]
+    bags = [0, 0]
+    bag_squares = [0, 0]
+
+    def on_event(event):
+        if event[0] == EVENT_ROUND_END:
+            for team in range(2):
+                team_players = [p for p in engine.players if p.team == team]
+                total_bid = sum(p.bid for p in team_players)
+                total_won = sum(p.tricks_won for p in team_players)
+                if total_won >= total_bid:
+                    made[team] += 1
+                    bags[team] += total_won - total_bid
+                    bag_squares[team] += (total_won - total_bid) ** 2
+
+    engine.listeners.append(on_event)
+    engine.start_game()
+    engine.play_to_end()
+
+    b_team = 1 - a_team
+    finished = max(engine.team_scores) >= WINNING_SCORE
+    return (engine.team_scores[a_team], engine.team_scores[b_team], engine.get_winning_team() == a_team,
+            finished, engine.rounds_played, made[a_team], made[b_team],
+            (bags[a_team], bag_squares[a_team]), (bags[b_team], bag_squares[b_team]))
+
+def play_shard(shard):
+    first_game, num_games, base_seed, name_a, name_b, max_rounds = shard
+    policy_a = POLICIES[name_a]()
+    policy_b = POLICIES[name_b]()
+    results = []
+    for game in range(first_game, first_game + num_games):
+        # Each deal sequence is played twice with the partnerships swapped.
+        pair, a_team = divmod(game, 2)
+        results.append(play_game(game_seed(base_seed, pair), policy_a, policy_b, a_team, max_rounds))
+    return results
+
+def make_shards(num_games, base_seed, name_a, name_b, max_rounds, shard_size=SHARD_SIZE):
+    shard_size += shard_size % 2
+    return [(first, min(shard_size, num_games - first), base_seed, name_a, name_b, max_rounds)
+            for first in range(0, num_games, shard_size)]
+
+class RunningStat:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def add(self, value):
+        self.merge(1, value, value * value)
+
+    def merge(self, count, total, total_squares):
+        self.count += count
+        self.total += total
+        self.total_squares += total_squares
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def interval(self):
+        if self.count < 2:
+            return 0.0
+        mean = self.mean()
+        variance = max(0.0, self.total_squares / self.count - mean * mean)
+        return Z_95 * math.sqrt(variance / self.count)
+
+def wilson_interval(successes, trials):
+    if not trials:
+        return 0.0, 0.0
+    p = successes / trials
+    denominator = 1 + Z_95 * Z_95 / trials
+    center = (p + Z_95 * Z_95 / (2 * trials)) / denominator
+    spread = Z_95 * math.sqrt(p * (1 - p) / trials + Z_95 * Z_95 / (4 * trials * trials)) / denominator
+    return center - spread, center + spread
+
+class TournamentResults:
+    def __init__(self, name_a, name_b):
+        self.name_a = name_a
+        self.name_b = name_b
+        self.games = 0
+        self.a_wins = 0
+        self.unfinished = 0
+        self.rounds = 0
+        self.margin = RunningStat()
+        self.made = [0, 0]
+        self.bags = [RunningStat(), RunningStat()]
+
+    def add(self, result):
+        a_score, b_score, a_won, finished, rounds, a_made, b_made, a_bags, b_bags = result
+        self.games += 1
+        self.a_wins += a_won
+        self.unfinished += not finished
+        self.rounds += rounds
+        self.margin.add(a_score - b_score)
+        self.made[0] += a_made
+        self.made[1] += b_made
+        self.bags[0].merge(rounds, *a_bags)
+        self.bags[1].merge(rounds, *b_bags)
+
+    def summary(self):
+        low, high = wilson_interval(self.a_wins, self.games)
+        lines = [
+            f"{self.games} games ({self.rounds} rounds, {self.unfinished} stopped at the round limit)",
+            f"  {self.name_a} win rate vs {self.name_b}: {self.a_wins / max(self.games, 1):.1%} "
+            f"(95% CI {low:.1%} - {high:.1%})",
+            f"  Average score margin: {self.margin.mean():+.1f} +/- {self.margin.interval():.1f}",
+        ]
+        for i, name in enumerate((self.name_a, self.name_b)):
+            made_low, made_high = wilson_interval(self.made[i], self.rounds)
+            lines.append(f"  {name}: bid made {self.made[i] / max(self.rounds, 1):.1%} "
+                         f"(95% CI {made_low:.1%} - {made_high:.1%}), "
+                         f"bags per round {self.bags[i].mean():.2f} +/- {self.bags[i].interval():.2f}")
+        return "\n".join(lines)
+
+def run_tournament(num_games, name_a, name_b, workers=1, seed=None, max_rounds=rules.SIMULATION_MAX_ROUNDS):
+    base_seed = seed if seed is not None else random.getrandbits(32)
+    shards = make_shards(num_games, base_seed, name_a, name_b, max_rounds)
+    results = TournamentResults(name_a, name_b)
+
+    start = time.perf_counter()
+    if workers <= 1:
+        for shard in shards:
+            for result in play_shard(shard):
+                results.add(result)
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for shard_results in pool.imap_unordered(play_shard, shards):
+                for result in shard_results:
+                    results.add(result)
+    results.seconds = time.perf_counter() - start
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Play AI variants against each other across a process pool")
+    parser.add_argument("--a", default="partner", choices=sorted(POLICIES), help="first AI variant")
+    parser.add_argument("--b", default="heuristic", choices=sorted(POLICIES), help="second AI variant")
+    parser.add_argument("--games", type=int, default=1000, help="number of games (played in seat-swapped pairs)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=1, help="base seed for the deals")
+    parser.add_argument("--max-rounds", type=int, default=rules.SIMULATION_MAX_ROUNDS,
+                        help="end a game after this many rounds if nobody reached 500")
+    parser.add_argument("--scaling", action="store_true",
+                        help="repeat the run with 1, 2, 4, ... workers and report the speedup")
+    args = parser.parse_args()
+
+    if args.scaling:
+        counts = sorted({2 ** i for i in range(args.workers.bit_length()) if 2 ** i <= args.workers} | {args.workers})
+        baseline = None
+        for count in counts:
+            results = run_tournament(args.games, args.a, args.b, count, args.seed, args.max_rounds)
+            rate = results.games / results.seconds
+            baseline = baseline or rate
+            print(f"{count:3d} workers: {rate:8.1f} games/s (speedup {rate / baseline:.2f}x)")
+        return
+
+    results = run_tournament(args.games, args.a, args.b, args.workers, args.seed, args.max_rounds)
+    print(results.summary())
+    print(f"  {results.seconds:.1f} s with {args.workers} workers "
+          f"({results.games / results.seconds:.1f} games/s, {results.rounds / results.seconds:.0f} rounds/s)")
+
+if __name__ == "__main__":
+    main()